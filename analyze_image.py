@@ -1,66 +1,246 @@
-from PIL import Image
-import sys
+"""
+Detect the square size of a grid-rendered image and build the CompressedImage
+grid that connect_glyphs/find_connections.py consumes.
+
+Detection works on the whole image with NumPy: horizontal/vertical colour
+changes give run lengths for every row and column. The most common run is
+checked against the column/row change profile (what fraction of changes
+lie on one lattice of that step, which also gives the grid offset); when it
+does not fit, its divisors and then an FFT autocorrelation of the profile
+are tried, so long same-colour runs cannot skew the estimate.
+
+Usage:
+    python analyze_image.py image.png                      # print the estimate
+    python analyze_image.py image.png --out grid.json      # also build the grid
+    python analyze_image.py image.png --out grid.grid --square 16 --reduce center
+    python analyze_image.py --check 200                    # detection self-check
+"""
+
+import argparse
+import os
+import tempfile
 from collections import Counter
 
-def detect_grid_size(image_path):
-    img = Image.open(image_path).convert('RGB')
-    width, height = img.size
-    pixels = img.load()
-
-    # Analyze a few rows and columns to find the most common run length
-    row_run_lengths = []
-    for y in [height // 4, height // 2, 3 * height // 4]:
-        current_run = 1
-        for x in range(1, width):
-            # Check if pixel matches previous pixel (with some tolerance)
-            p1 = pixels[x, y]
-            p2 = pixels[x-1, y]
-            if abs(p1[0]-p2[0]) < 10 and abs(p1[1]-p2[1]) < 10 and abs(p1[2]-p2[2]) < 10:
-                current_run += 1
-            else:
-                if current_run > 1:
-                    row_run_lengths.append(current_run)
-                current_run = 1
-        if current_run > 1:
-            row_run_lengths.append(current_run)
-
-    col_run_lengths = []
-    for x in [width // 4, width // 2, 3 * width // 4]:
-        current_run = 1
-        for y in range(1, height):
-            p1 = pixels[x, y]
-            p2 = pixels[x, y-1]
-            if abs(p1[0]-p2[0]) < 10 and abs(p1[1]-p2[1]) < 10 and abs(p1[2]-p2[2]) < 10:
-                current_run += 1
+import numpy as np
+from PIL import Image
+
+from connect_glyphs.grid_io import save_grid
+
+TOLERANCE = 10  # per-channel difference still treated as the same colour
+MIN_SQUARE = 6  # runs shorter than this are treated as noise/borders
+
+
+def _changes(pixels: np.ndarray, axis: int) -> np.ndarray:
+    """Boolean map of colour changes between uint8 neighbours along `axis`."""
+    # Signed difference: uint8 subtraction would wrap 0<->255 steps to 1/255
+    diff = np.abs(np.diff(pixels.astype(np.int16), axis=axis))
+    return (diff >= TOLERANCE).any(axis=-1)
+
+
+def run_lengths(changes: np.ndarray) -> np.ndarray:
+    """Lengths of all same-colour runs along the last axis of a change map."""
+    rows, cols = changes.shape
+    # A run starts at column 0 of every row and wherever the colour changes
+    starts = np.ones((rows, cols + 1), dtype=bool)
+    starts[:, 1:] = changes
+    idx = np.flatnonzero(starts)
+    return np.diff(np.append(idx, starts.size))
+
+
+def autocorr_period(profile: np.ndarray, min_period: int = MIN_SQUARE):
+    """
+    Period of a 1-D change profile via FFT autocorrelation. The smallest lag
+    reaching 80% of the best peak wins, so multiples of the square size do
+    not shadow it. Returns None when there is no usable peak.
+    """
+    n = profile.size
+    if n < 2 * min_period:
+        return None
+    centered = profile - profile.mean()
+    spectrum = np.fft.rfft(centered, 2 * n)
+    ac = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+    if ac[0] <= 0:
+        return None
+    lags = ac[min_period : n // 2] / ac[0]
+    if lags.size == 0 or lags.max() <= 0:
+        return None
+    return int(np.flatnonzero(lags >= 0.8 * lags.max())[0]) + min_period
+
+
+def lattice_score(profile: np.ndarray, period: int):
+    """
+    Fraction of colour changes that fall on one lattice of step `period`,
+    plus that lattice's offset. The true square size (and its divisors)
+    scores ~1.0; multiples of it do not.
+    """
+    total = profile.sum()
+    if total <= 0:
+        return 0.0, 0
+    # Profile index i is the boundary between pixels i and i+1
+    phase_mass = np.bincount((np.arange(profile.size) + 1) % period, weights=profile, minlength=period)
+    offset = int(phase_mass.argmax())
+    return float(phase_mass[offset] / total), offset
+
+
+def estimate_period(runs: np.ndarray, profile: np.ndarray):
+    """
+    Square size along one axis: the most common run length the change profile
+    confirms (or its largest confirmed divisor), else the autocorrelation
+    period. Returns (period, offset, score).
+    """
+    common = _common_runs(runs, profile.size + 1)
+    for run in common:
+        for period in (run // k for k in range(1, run // MIN_SQUARE + 1) if run % k == 0):
+            score, offset = lattice_score(profile, period)
+            if score >= 0.9:
+                return period, offset, score
+
+    period = autocorr_period(profile) or (common[0] if common else 1)
+    score, offset = lattice_score(profile, period)
+    return period, offset, score
+
+
+def _common_runs(runs: np.ndarray, length: int, top: int = 5):
+    """Most common significant run lengths, ignoring runs spanning the whole line."""
+    counts = np.bincount(runs, minlength=length + 1)
+    counts[:MIN_SQUARE] = 0
+    counts[length:] = 0
+    order = np.argsort(counts)[::-1][:top]
+    return [int(r) for r in order if counts[r] > 0]
+
+
+def detect_grid_size(image_path, verbose: bool = True):
+    """
+    Estimate square size, offset and grid dimensions of a grid image.
+
+    Returns a dict with est_w/est_h (square size per axis), offset_x/offset_y
+    and grid_w/grid_h.
+    """
+    return _detect(np.asarray(Image.open(image_path).convert('RGB')), verbose)
+
+
+def _detect(pixels: np.ndarray, verbose: bool):
+    height, width = pixels.shape[:2]
+
+    row_changes = _changes(pixels, axis=1)  # (H, W-1)
+    col_changes = _changes(pixels, axis=0)  # (H-1, W)
+    row_runs = run_lengths(row_changes)
+    col_runs = run_lengths(col_changes.T)
+
+    est_w, offset_x, score_w = estimate_period(row_runs, row_changes.sum(axis=0).astype(np.float64))
+    est_h, offset_y, score_h = estimate_period(col_runs, col_changes.sum(axis=1).astype(np.float64))
+    offset_x %= est_w
+    offset_y %= est_h
+    grid_w = (width - offset_x) // est_w
+    grid_h = (height - offset_y) // est_h
+
+    if verbose:
+        common_rows = Counter(row_runs[row_runs > 1].tolist()).most_common(5)
+        common_cols = Counter(col_runs[col_runs > 1].tolist()).most_common(5)
+        print(f"Image Dimensions: {width}x{height}")
+        print(f"Common Row Run Lengths: {common_rows}")
+        print(f"Common Col Run Lengths: {common_cols}")
+        print(f"Lattice fit: x={score_w:.2f} y={score_h:.2f}")
+        print(f"Estimated Square Size: {est_w}x{est_h} (offset {offset_x},{offset_y})")
+        print(f"Estimated Grid: {grid_w}x{grid_h}")
+
+    return {
+        "est_w": est_w,
+        "est_h": est_h,
+        "offset_x": offset_x,
+        "offset_y": offset_y,
+        "grid_w": grid_w,
+        "grid_h": grid_h,
+    }
+
+
+def run_checks(count: int, seed: int = 0):
+    """
+    Render random grids of pure colours (red/green/white/black/blue, the
+    extremes where channel differences are 255) and of random colours at
+    random square sizes and offsets, and require detection plus
+    build_compressed_image to recover the exact grid. Raises on the first
+    mismatch.
+    """
+    rng = np.random.default_rng(seed)
+    pure = np.array([(255, 0, 0), (0, 255, 0), (255, 255, 255), (0, 0, 0), (0, 0, 255)], dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "check.png")
+        for case in range(count):
+            gw, gh = rng.integers(4, 24, size=2)
+            square = int(rng.integers(MIN_SQUARE, 24))
+            if case % 2 == 0:
+                grid = pure[rng.integers(0, len(pure), size=(gh, gw))]
             else:
-                if current_run > 1:
-                    col_run_lengths.append(current_run)
-                current_run = 1
-        if current_run > 1:
-            col_run_lengths.append(current_run)
-
-    # Find most common run lengths
-    common_rows = Counter(row_run_lengths).most_common(5)
-    common_cols = Counter(col_run_lengths).most_common(5)
-    
-    print(f"Image Dimensions: {width}x{height}")
-    print(f"Common Row Run Lengths: {common_rows}")
-    print(f"Common Col Run Lengths: {common_cols}")
-
-    # Estimate square size (taking the most common significant run length)
-    # We filter out very small runs which might be noise or borders
-    significant_rows = [k for k, v in common_rows if k > 5]
-    significant_cols = [k for k, v in common_cols if k > 5]
-    
-    est_w = significant_rows[0] if significant_rows else 1
-    est_h = significant_cols[0] if significant_cols else 1
-    
-    print(f"Estimated Square Size: {est_w}x{est_h}")
-    
-    # Calculate grid dimensions
-    grid_w = width // est_w
-    grid_h = height // est_h
-    print(f"Estimated Grid: {grid_w}x{grid_h}")
+                grid = rng.integers(0, 256, size=(gh, gw, 3), dtype=np.uint8)
+            # Neighbouring squares must differ, or the lattice is ambiguous
+            grid[::2, ::2] = (255, 255, 255)
+            grid[1::2, 1::2] = (0, 0, 0)
+            pixels = np.repeat(np.repeat(grid, square, axis=0), square, axis=1)
+            Image.fromarray(pixels).save(path)
+
+            built, square_size = build_compressed_image(path)
+            if square_size != square or not np.array_equal(built, grid):
+                raise AssertionError(
+                    f"case {case}: {gw}x{gh} grid at square {square} detected as "
+                    f"{built.shape[1]}x{built.shape[0]} at square {square_size}"
+                )
+    print(f"[OK] {count} rendered grids recovered exactly")
+
+
+def build_compressed_image(image_path, square=None, offset=(0, 0), reduce="median", verbose=False):
+    """
+    Sample one representative colour per square with a block reduction.
+
+    Returns (grid, square_size) where grid is a (GridHeight, GridWidth, 3)
+    uint8 array in the layout find_connections consumes. `square` and
+    `offset` default to the detect_grid_size estimate.
+    """
+    pixels = np.asarray(Image.open(image_path).convert('RGB'))
+    if square is None:
+        info = _detect(pixels, verbose)
+        sq_w, sq_h = info["est_w"], info["est_h"]
+        offset = (info["offset_x"], info["offset_y"])
+    else:
+        sq_w = sq_h = square
+
+    ox, oy = offset
+    grid_w = (pixels.shape[1] - ox) // sq_w
+    grid_h = (pixels.shape[0] - oy) // sq_h
+    if grid_w <= 0 or grid_h <= 0:
+        raise ValueError(f"Square size {sq_w}x{sq_h} does not fit {image_path}")
+
+    blocks = pixels[oy : oy + grid_h * sq_h, ox : ox + grid_w * sq_w]
+    blocks = blocks.reshape(grid_h, sq_h, grid_w, sq_w, 3)
+
+    if reduce == "center":
+        grid = blocks[:, sq_h // 2, :, sq_w // 2]
+    elif reduce == "mean":
+        grid = blocks.mean(axis=(1, 3)).round()
+    elif reduce == "median":
+        grid = np.median(blocks, axis=(1, 3))
+    else:
+        raise ValueError(f"Unknown reduce mode: {reduce}")
+
+    # find_connections works with one SquareSize; non-square cells use the width
+    return np.ascontiguousarray(grid, dtype=np.uint8), sq_w
+
 
 if __name__ == "__main__":
-    detect_grid_size("image.png")
+    parser = argparse.ArgumentParser(description="Detect grid size and optionally build a CompressedImage grid.")
+    parser.add_argument("image", nargs="?", default="image.png", help="Grid-rendered image")
+    parser.add_argument("--out", default=None, help="Write the grid (.json, .png, .npy, .npz, .grid)")
+    parser.add_argument("--square", type=int, default=None, help="Square size in pixels (skip detection)")
+    parser.add_argument("--offset", nargs=2, type=int, default=[0, 0], metavar=("X", "Y"), help="Grid offset when --square is given")
+    parser.add_argument("--reduce", choices=["median", "mean", "center"], default="median", help="Per-square colour reduction")
+    parser.add_argument("--check", type=int, default=0, help="Run N detection checks on rendered grids and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        run_checks(args.check)
+    elif not args.out:
+        detect_grid_size(args.image)
+    else:
+        grid, square_size = build_compressed_image(args.image, args.square, tuple(args.offset), args.reduce, verbose=True)
+        save_grid(args.out, grid, square_size)
+        print(f"Saved {grid.shape[1]}x{grid.shape[0]} grid (square={square_size}) to {args.out}")
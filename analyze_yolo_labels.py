@@ -3,23 +3,53 @@ Quickly inspect YOLO label balance and box sizes across splits.
 
 Usage:
     python analyze_yolo_labels.py --data yolo_sld/data.yaml
+    python analyze_yolo_labels.py --data yolo_sld/data.yaml --imgsz 1600 --json stats.json
+    python analyze_yolo_labels.py --data yolo_sld/data.yaml --json - | jq .all.boxes_per_image
 
 Outputs:
-    - Images per split
+    - Images per split (image files; label caches are not counted), empty
+      images, images without a label file and labels without an image
     - Box counts per split
     - Per-class counts and % share
+    - Per-class and per-split percentiles of box width, height, side
+      (sqrt(w*h)) and aspect ratio in pixels after letterboxing to --imgsz,
+      and the fraction of tiny boxes (side < --tiny-px)
+    - Boxes-per-image histograms
+    - Class co-occurrence matrix (images containing both classes)
     - Suggested inverse-frequency weights (normalized)
+
+Labels come from the columnar label index (label_index.py), parsed across
+--workers processes; statistics are computed on its arrays. The index is
+kept in memory; --save-index also saves it as <root>/.label_index.npz. Image sizes are
+read from image headers (--square skips that and assumes square images).
 """
 
 import argparse
 import json
-from collections import Counter, defaultdict
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from label_index import LabelIndex, load_index
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+PERCENTILES = [5, 25, 50, 75, 95]
+HIST_EDGES = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+SIZE_CHUNK = 256  # image headers read per task
 
 
 def parse_args():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", type=str, default="yolo_sld/data.yaml", help="Path to data.yaml")
+    ap.add_argument("--imgsz", type=int, default=1600, help="Training image size the pixel statistics refer to")
+    ap.add_argument("--tiny-px", type=float, default=16, help="Boxes with sqrt(w*h) below this many pixels count as tiny")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes for label parsing and image headers")
+    ap.add_argument("--save-index", action="store_true", help="Persist the label index as .label_index.npz in the source dataset root")
+    ap.add_argument("--square", action="store_true", help="Assume square images instead of reading image sizes")
+    ap.add_argument("--json", type=str, default=None, help="Write all statistics as JSON to this path ('-' = stdout only)")
     return ap.parse_args()
 
 
@@ -59,87 +89,246 @@ def load_names(data_yaml: Path):
         return names
 
 
-def gather_labels(lbl_dir: Path, num_classes: int):
-    counts = Counter()
-    box_area = defaultdict(list)
-    total_images = 0
-    total_boxes = 0
+def scan_images(root: Path, splits) -> List[Tuple[str, str, Path]]:
+    """(split, stem, path) of every image file; label caches and other files are not images."""
+    found = []
+    for split in splits:
+        img_dir = root / "images" / split
+        if not img_dir.is_dir():
+            continue
+        with os.scandir(img_dir) as entries:
+            for entry in entries:
+                path = Path(entry.path)
+                if path.suffix.lower() in IMAGE_SUFFIXES and entry.is_file():
+                    found.append((split, path.stem, path))
+    return sorted(found)
 
-    if not lbl_dir.exists():
-        return counts, box_area, total_images, total_boxes
 
-    for lbl_file in sorted(lbl_dir.glob("*.txt")):
-        total_images += 1
-        if lbl_file.name.endswith(".cache"):
-            continue
-        with open(lbl_file, "r") as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) < 5:
-                    continue
-                try:
-                    cls = int(parts[0])
-                    w = float(parts[3])
-                    h = float(parts[4])
-                except ValueError:
-                    continue
-                if cls < 0 or cls >= num_classes:
-                    continue
-                counts[cls] += 1
-                total_boxes += 1
-                box_area[cls].append(w * h)
+def _read_sizes(paths: List[Path]) -> np.ndarray:
+    """(n, 2) width, height from image headers only; NaN for unreadable files."""
+    from PIL import Image
 
-    return counts, box_area, total_images, total_boxes
+    out = np.full((len(paths), 2), np.nan)
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as im:
+                out[i] = im.size
+        except OSError:
+            pass
+    return out
 
 
-def main():
-    args = parse_args()
-    data_yaml = Path(args.data)
-    if not data_yaml.exists():
-        raise SystemExit(f"data.yaml not found: {data_yaml}")
+def image_sizes(paths: List[Path], workers: int = 1) -> np.ndarray:
+    chunks = [paths[i : i + SIZE_CHUNK] for i in range(0, len(paths), SIZE_CHUNK)]
+    if not chunks:
+        return np.zeros((0, 2))
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            return np.concatenate(list(pool.map(_read_sizes, chunks)))
+    return np.concatenate([_read_sizes(chunk) for chunk in chunks])
 
-    names = load_names(data_yaml)
+
+def percentiles(values: np.ndarray):
+    """{"p5": .., "p50": .., ...} of `values`, or None when empty."""
+    if len(values) == 0:
+        return None
+    qs = np.percentile(values, PERCENTILES)
+    return {f"p{q}": round(float(v), 4) for q, v in zip(PERCENTILES, qs)}
+
+
+def count_histogram(counts: np.ndarray):
+    """Bin boxes-per-image counts at HIST_EDGES: {"0": n, "1": n, "2-4": n, ..., "500+": n}."""
+    hist, _ = np.histogram(counts, bins=HIST_EDGES + [np.inf])
+    labels = []
+    for lo, hi in zip(HIST_EDGES, HIST_EDGES[1:] + [None]):
+        if hi is None:
+            labels.append(f"{lo}+")
+        elif hi == lo + 1:
+            labels.append(str(lo))
+        else:
+            labels.append(f"{lo}-{hi - 1}")
+    return dict(zip(labels, hist.tolist()))
+
+
+def box_stats(w_px: np.ndarray, h_px: np.ndarray, area: np.ndarray, tiny_px: float):
+    """Size/aspect percentiles of a set of boxes, in letterboxed pixels at --imgsz."""
+    side = np.sqrt(w_px * h_px)
+    return {
+        "count": int(len(w_px)),
+        "mean_area": round(float(area.mean()), 6) if len(area) else 0.0,
+        "width_px": percentiles(w_px),
+        "height_px": percentiles(h_px),
+        "side_px": percentiles(side),
+        "aspect": percentiles(w_px / np.maximum(h_px, 1e-9)),
+        "tiny_frac": round(float((side < tiny_px).mean()), 4) if len(side) else 0.0,
+    }
+
+
+def compute_stats(index: LabelIndex, images, names, imgsz: int, tiny_px: float, scale: np.ndarray, splits):
+    """
+    All statistics as a JSON-ready dict with one entry per split plus "all".
+
+    `images` are scan_images() results; `scale` is the (F, 2) per-label-file
+    letterbox factor (W, H) / max(W, H), 1 where the image size is unknown.
+    """
     num_classes = len(names)
+    valid = (index.cls >= 0) & (index.cls < num_classes)
+    box_file = index.image_id[valid]
+    cls = index.cls[valid]
+    w_px = index.w[valid] * scale[box_file, 0] * imgsz
+    h_px = index.h[valid] * scale[box_file, 1] * imgsz
+    area = index.w[valid] * index.h[valid]
+    per_file = np.bincount(box_file, minlength=len(index))
 
-    root = data_yaml.parent
-    splits = ["train", "val", "test"]
+    file_split = index.splits
+    img_split = np.array([split for split, _, _ in images], dtype=str)
+    img_file = np.array([index.file_id(split, stem) for split, stem, _ in images], dtype=np.int64)
+    has_label = img_file >= 0
+    has_image = np.zeros(len(index), dtype=bool)
+    has_image[img_file[has_label]] = True
+    img_boxes = np.where(has_label, per_file[np.maximum(img_file, 0)], 0)
 
-    split_info = {}
-    class_totals = Counter()
-    class_area = defaultdict(list)
+    # Which classes appear in which label file
+    present = np.zeros((len(index), num_classes), dtype=np.int64)
+    present[box_file, cls] = 1
 
-    for split in splits:
-        lbl_dir = root / "labels" / split
-        counts, areas, n_img, n_box = gather_labels(lbl_dir, num_classes)
-        split_info[split] = {"images": n_img, "boxes": n_box, "counts": counts}
-        class_totals.update(counts)
-        for k, v in areas.items():
-            class_area[k].extend(v)
-
-    total_boxes = sum(class_totals.values())
+    out = {}
+    for split in list(splits) + ["all"]:
+        in_split = np.ones(len(index), dtype=bool) if split == "all" else file_split == split
+        img_mask = np.ones(len(images), dtype=bool) if split == "all" else img_split == split
+        box_mask = in_split[box_file]
+        split_cls = cls[box_mask]
+        counts = np.bincount(split_cls, minlength=num_classes)
+
+        class_stats = {}
+        for c, name in enumerate(names):
+            m = box_mask & (cls == c)
+            class_stats[name] = box_stats(w_px[m], h_px[m], area[m], tiny_px)
+
+        boxes_per_image = img_boxes[img_mask]
+        co = present[in_split].T @ present[in_split]
+        out[split] = {
+            "images": int(img_mask.sum()),
+            "label_files": int(in_split.sum()),
+            "empty_images": int((boxes_per_image == 0).sum()),
+            "missing_labels": int((img_mask & ~has_label).sum()),
+            "orphan_labels": int((in_split & ~has_image).sum()),
+            "boxes": int(box_mask.sum()),
+            "counts": dict(zip(names, counts.tolist())),
+            "boxes_per_image": {
+                "mean": round(float(boxes_per_image.mean()), 3) if len(boxes_per_image) else 0.0,
+                "max": int(boxes_per_image.max()) if len(boxes_per_image) else 0,
+                "hist": count_histogram(boxes_per_image),
+            },
+            "all_boxes": box_stats(w_px[box_mask], h_px[box_mask], area[box_mask], tiny_px),
+            "classes": class_stats,
+            "cooccurrence": co.tolist(),
+        }
+    return out
+
+
+def fmt_pct(p, key):
+    return f"{p[key]:8.1f}" if p else f"{'-':>8s}"
+
+
+def print_report(stats, names, splits, imgsz: int, tiny_px: float, weights):
     print(f"Loaded classes: {names}")
     for split in splits:
-        info = split_info[split]
+        info = stats[split]
         print(
-            f"{split:5s}: images={info['images']:5d} boxes={info['boxes']:6d}"
+            f"{split:5s}: images={info['images']:5d} boxes={info['boxes']:6d} "
+            f"empty={info['empty_images']:5d} no_label={info['missing_labels']:4d} "
+            f"orphan_labels={info['orphan_labels']:4d}"
         )
 
+    total = stats["all"]
     print("\nPer-class counts:")
     for cls_idx, name in enumerate(names):
-        cnt = class_totals.get(cls_idx, 0)
-        share = (cnt / total_boxes * 100) if total_boxes else 0
-        areas = class_area.get(cls_idx, [])
-        avg_area = sum(areas) / len(areas) if areas else 0.0
+        c = total["classes"][name]
+        share = (c["count"] / total["boxes"] * 100) if total["boxes"] else 0
+        print(f"{cls_idx:2d} {name:20s} count={c['count']:6d} share={share:5.2f}% avg_box_area={c['mean_area']:.4f}")
+
+    print(f"\nBox size at imgsz={imgsz} (side = sqrt(w*h) px, aspect = w/h), tiny = side < {tiny_px:g}px:")
+    print(f"{'':23s}{'side p5':>8s}{'p50':>8s}{'p95':>8s}{'asp p5':>8s}{'p50':>8s}{'p95':>8s}{'tiny%':>8s}")
+    rows = [(f"{i:2d} {n}", total["classes"][n]) for i, n in enumerate(names)]
+    for label, c in rows + [("   all", total["all_boxes"])]:
+        side, asp = c["side_px"], c["aspect"]
         print(
-            f"{cls_idx:2d} {name:20s} count={cnt:6d} share={share:5.2f}% avg_box_area={avg_area:.4f}"
+            f"{label[:22]:23s}{fmt_pct(side, 'p5')}{fmt_pct(side, 'p50')}{fmt_pct(side, 'p95')}"
+            f"{fmt_pct(asp, 'p5')}{fmt_pct(asp, 'p50')}{fmt_pct(asp, 'p95')}{c['tiny_frac'] * 100:8.2f}"
         )
 
-    if total_boxes:
+    print("\nBoxes per image:")
+    for split in splits + ["all"]:
+        bpi = stats[split]["boxes_per_image"]
+        hist = " ".join(f"{k}:{v}" for k, v in bpi["hist"].items() if v)
+        print(f"{split:5s}: mean={bpi['mean']:7.2f} max={bpi['max']:5d}  {hist}")
+
+    co = np.array(total["cooccurrence"])
+    pairs = [(co[i, j], i, j) for i in range(len(names)) for j in range(i + 1, len(names)) if co[i, j]]
+    if pairs:
+        print("\nMost frequent class pairs (images containing both):")
+        for n, i, j in sorted(pairs, reverse=True)[:10]:
+            print(f"{n:6d}  {names[i]} + {names[j]}")
+
+    if weights:
         print("\nSuggested inverse-frequency weights (normalized):")
-        inv = {i: 1.0 / max(class_totals.get(i, 1), 1) for i in range(num_classes)}
+        print(json.dumps(weights, indent=2))
+
+
+def main():
+    args = parse_args()
+    data_yaml = Path(args.data)
+    if not data_yaml.exists():
+        raise SystemExit(f"data.yaml not found: {data_yaml}")
+
+    names = load_names(data_yaml)
+    num_classes = len(names)
+
+    root = data_yaml.parent
+    splits = ["train", "val", "test"]
+
+    index = load_index(root, save=args.save_index, workers=args.workers)
+    images = scan_images(root, splits)
+
+    scale = np.ones((len(index), 2))
+    if not args.square:
+        paths = {(split, stem): path for split, stem, path in images}
+        rel = [Path(f) for f in index.files.tolist()]
+        fids = [i for i, r in enumerate(rel) if (r.parent.as_posix(), r.stem) in paths]
+        sizes = image_sizes([paths[(rel[i].parent.as_posix(), rel[i].stem)] for i in fids], args.workers)
+        known = ~np.isnan(sizes).any(axis=1)
+        sizes = sizes[known]
+        scale[np.array(fids, dtype=np.int64)[known]] = sizes / sizes.max(axis=1, keepdims=True)
+
+    stats = compute_stats(index, images, names, args.imgsz, args.tiny_px, scale, splits)
+
+    weights = {}
+    totals = stats["all"]["counts"]
+    if stats["all"]["boxes"]:
+        inv = {i: 1.0 / max(totals[names[i]], 1) for i in range(num_classes)}
         norm = sum(inv.values())
         weights = {names[i]: inv[i] / norm for i in range(num_classes)}
-        print(json.dumps(weights, indent=2))
+
+    report = {
+        "data": str(data_yaml),
+        "classes": names,
+        "imgsz": args.imgsz,
+        "tiny_px": args.tiny_px,
+        "square": args.square,
+        "percentiles": PERCENTILES,
+        "splits": {split: stats[split] for split in splits},
+        "all": stats["all"],
+        "weights": weights,
+    }
+    if args.json == "-":
+        print(json.dumps(report, indent=1))
+        return
+    print_report(stats, names, splits, args.imgsz, args.tiny_px, weights)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"[DONE] Wrote statistics → {args.json}")
 
 
 if __name__ == "__main__":
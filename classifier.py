@@ -0,0 +1,196 @@
+"""
+Shared ResNet-18 construction and fast-path options for train_model.py,
+eval.py and predict.py.
+
+All three scripts take the same opt-in flags (add_model_args):
+    --precision fp32|bf16|fp16|auto   autocast dtype; auto = fp16 on CUDA,
+                                      bf16 on CPU, fp32 on MPS
+    --channels-last                   NHWC memory format for model and batches
+    --compile                         torch.compile the model
+
+Run this file to time them on your hardware: every combination runs on a
+cached split (see image_cache.py), reporting inference and training-step
+throughput in images/s. Numerical parity with fp32 is covered by
+test_classifier.py (python -m pytest test_classifier.py).
+
+Usage:
+    python classifier.py --split test --batch 32
+    python classifier.py --split val --include-compile --train-steps 20
+"""
+
+import argparse
+import contextlib
+import itertools
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torchvision import models
+
+from image_cache import CACHE_DIR, IMG_SIZE, CachedImageFolder, build_cache, normalize_batch
+
+MODEL_PATH = "symbol_classifier.pth"
+PRECISIONS = ["fp32", "bf16", "fp16", "auto"]
+DTYPES = {"bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def pick_device() -> str:
+    return (
+        "mps"
+        if torch.backends.mps.is_available()
+        else "cuda"
+        if torch.cuda.is_available()
+        else "cpu"
+    )
+
+
+def add_model_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--precision", choices=PRECISIONS, default="fp32", help="Autocast precision (auto: fp16 on CUDA, bf16 on CPU)")
+    ap.add_argument("--channels-last", action="store_true", help="Use channels_last (NHWC) memory format")
+    ap.add_argument("--compile", action="store_true", help="Wrap the model in torch.compile")
+
+
+def resolve_precision(precision: str, device: str) -> str:
+    """Concrete precision for `device`; fp16 autocast is only offered on CUDA."""
+    if precision == "auto":
+        return {"cuda": "fp16", "cpu": "bf16"}.get(device, "fp32")
+    if precision == "fp16" and device != "cuda":
+        raise SystemExit("fp16 autocast needs CUDA; use --precision bf16 on CPU")
+    if precision == "bf16" and device == "mps":
+        raise SystemExit("bf16 autocast is not supported on MPS; use --precision fp32")
+    return precision
+
+
+def autocast(device: str, precision: str):
+    """Autocast context for a resolved precision (no-op for fp32)."""
+    if precision == "fp32":
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device, dtype=DTYPES[precision])
+
+
+def make_scaler(precision: str):
+    """Loss scaler for fp16 training; a pass-through for other precisions."""
+    try:
+        return torch.amp.GradScaler("cuda", enabled=precision == "fp16")
+    except AttributeError:  # torch < 2.3
+        return torch.cuda.amp.GradScaler(enabled=precision == "fp16")
+
+
+def build_model(
+    num_classes: int,
+    device: str,
+    pretrained: bool = False,
+    weights_path: str = None,
+    channels_last: bool = False,
+    compile: bool = False,
+) -> nn.Module:
+    """ResNet-18 with a `num_classes` head, optionally loaded from `weights_path`, on `device`."""
+    model = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1 if pretrained else None)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    if weights_path is not None:
+        model.load_state_dict(torch.load(weights_path, map_location=device))
+    model = model.to(device)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if compile:
+        model = torch.compile(model)
+    return model
+
+
+def unwrap(model: nn.Module) -> nn.Module:
+    """The original module behind DistributedDataParallel and torch.compile, so state_dict keys stay loadable."""
+    for attr in ("module", "_orig_mod"):
+        model = getattr(model, attr, model)
+    return model
+
+
+def prepare_batch(imgs, device: str, channels_last: bool = False):
+    """uint8 (B, 3, H, W) -> normalized float batch on `device` in the requested memory format."""
+    if channels_last:
+        imgs = imgs.contiguous(memory_format=torch.channels_last)
+    return normalize_batch(imgs, device)
+
+
+def _predict_all(model, batches, device, precision, channels_last):
+    preds = []
+    start = time.perf_counter()
+    with torch.no_grad(), autocast(device, precision):
+        for imgs, _ in batches:
+            preds.append(model(prepare_batch(imgs, device, channels_last)).argmax(dim=1).cpu())
+    if device == "cuda":
+        torch.cuda.synchronize()
+    return torch.cat(preds), time.perf_counter() - start
+
+
+def _train_rate(model, batches, device, precision, channels_last, steps):
+    """Images/s of `steps` optimizer steps on `model` (a throwaway copy)."""
+    model.train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+    criterion = nn.CrossEntropyLoss()
+    scaler = make_scaler(precision)
+    seen = 0
+    start = None
+    for i, (imgs, labels) in enumerate(itertools.islice(itertools.cycle(batches), steps + 1)):
+        if i == 1:  # first step warms up (and compiles)
+            if device == "cuda":
+                torch.cuda.synchronize()
+            start = time.perf_counter()
+        imgs, labels = prepare_batch(imgs, device, channels_last), labels.to(device)
+        optimizer.zero_grad()
+        with autocast(device, precision):
+            loss = criterion(model(imgs), labels)
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
+        if i >= 1:
+            seen += len(labels)
+    if device == "cuda":
+        torch.cuda.synchronize()
+    return seen / (time.perf_counter() - start) if start else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Throughput of the classifier fast paths.")
+    ap.add_argument("--model", default=MODEL_PATH, help="Trained weights")
+    ap.add_argument("--splits-dir", default="dataset/splits", help="Folder with ImageFolder splits")
+    ap.add_argument("--split", default="test", help="Split to time on")
+    ap.add_argument("--cache-dir", default=CACHE_DIR, help="Preprocessed image cache")
+    ap.add_argument("--batch", type=int, default=32, help="Batch size")
+    ap.add_argument("--include-compile", action="store_true", help="Also try torch.compile (slow to warm up)")
+    ap.add_argument("--train-steps", type=int, default=10, help="Optimizer steps timed per combination (0 = skip)")
+    args = ap.parse_args()
+
+    device = pick_device()
+    build_cache(os.path.join(args.splits_dir, args.split), args.cache_dir, args.split, IMG_SIZE, workers=os.cpu_count())
+    ds = CachedImageFolder(args.cache_dir, args.split)
+    targets = torch.as_tensor(ds.targets)
+    # Whole split in memory so only the model is timed
+    batches = [
+        (torch.stack([ds[i][0] for i in range(s, min(s + args.batch, len(ds)))]), targets[s : s + args.batch])
+        for s in range(0, len(ds), args.batch)
+    ]
+
+    fast = resolve_precision("auto", device)
+    precisions = ["fp32"] + ([fast] if fast != "fp32" else [])
+    compiles = [False, True] if args.include_compile else [False]
+
+    print(f"Device: {device}, {len(ds)} {args.split} images, batch {args.batch}")
+    print(f"{'precision':10s}{'layout':>14s}{'compile':>9s}{'infer img/s':>13s}{'train img/s':>13s}")
+    for precision, channels_last, compiled in itertools.product(precisions, [False, True], compiles):
+        model = build_model(len(ds.classes), device, weights_path=args.model, channels_last=channels_last, compile=compiled)
+        model.eval()
+        _predict_all(model, batches[:1], device, precision, channels_last)  # warm-up
+        _, elapsed = _predict_all(model, batches, device, precision, channels_last)
+        train = 0.0
+        if args.train_steps:
+            scratch = build_model(len(ds.classes), device, weights_path=args.model, channels_last=channels_last, compile=compiled)
+            train = _train_rate(scratch, batches, device, precision, channels_last, args.train_steps)
+
+        layout = "channels_last" if channels_last else "nchw"
+        print(f"{precision:10s}{layout:>14s}{str(compiled):>9s}{len(ds) / elapsed:13.1f}{train:13.1f}")
+    print("[DONE] Timed all combinations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Run find_connections over a directory of CompressedImage grids in parallel.
+
+Each grid gets its own outputs, so nothing is clobbered (grids sharing a stem
+use the full file name instead, e.g. a_json / a_png):
+    <out>/<stem>.graph.json
+    <out>/<stem>.png            (unless --no-render)
+    <out>/summary.json          (per-file glyph/edge counts, timings, errors)
+
+Usage:
+    python connect_glyphs/batch_connections.py grids/ --out connect_glyphs/output/batch \\
+        --workers 8 --render-scale 0.25
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+try:  # imported as connect_glyphs.batch_connections
+    from .find_connections import analyze_grid, render_visualization, write_graph
+    from .grid_io import BINARY_SUFFIXES, load_grid
+except ImportError:  # run as a script / with connect_glyphs/ on sys.path
+    from find_connections import analyze_grid, render_visualization, write_graph
+    from grid_io import BINARY_SUFFIXES, load_grid
+
+GRID_SUFFIXES = {".json", ".png", ".npy", ".npz"} | BINARY_SUFFIXES
+
+
+def process_grid(grid_path: str, out_dir: str, stem: str, square_size, render_scale: float) -> dict:
+    """Analyze one grid file and write its outputs; errors are reported, not raised."""
+    result = {"file": grid_path, "glyphs": 0, "edges": 0, "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    try:
+        grid, square_size = load_grid(grid_path, square_size)
+        glyphs, graph_output = analyze_grid(grid)
+        write_graph(graph_output, os.path.join(out_dir, f"{stem}.graph.json"))
+        if render_scale > 0:
+            render_visualization(
+                grid, glyphs, graph_output, os.path.join(out_dir, f"{stem}.png"), square_size, render_scale
+            )
+        result["glyphs"] = len(glyphs)
+        result["edges"] = sum(len(node["connections"]) for node in graph_output)
+    except Exception as exc:  # keep the batch going; the summary records the failure
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def collect_grids(input_dir: Path):
+    return sorted(p for p in input_dir.iterdir() if p.is_file() and p.suffix.lower() in GRID_SUFFIXES)
+
+
+def output_stems(grids):
+    """Use the file stem for outputs unless two grids share it (e.g. a.json + a.png)."""
+    stems = Counter(p.stem for p in grids)
+    return [p.stem if stems[p.stem] == 1 else p.name.replace(".", "_") for p in grids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch find_connections over a directory of grids.")
+    parser.add_argument("input_dir", help="Directory of grid files (.json, .png, .npy, .npz, .grid)")
+    parser.add_argument("--out", default="connect_glyphs/output/batch", help="Output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--square-size", type=int, default=None, help="Override SquareSize")
+    parser.add_argument("--render-scale", type=float, default=1.0, help="Scale of rendered PNGs")
+    parser.add_argument("--no-render", action="store_true", help="Only write graph JSON")
+    args = parser.parse_args()
+
+    input_dir = Path(args.input_dir)
+    if not input_dir.is_dir():
+        raise SystemExit(f"Input directory not found: {input_dir}")
+    os.makedirs(args.out, exist_ok=True)
+
+    grids = collect_grids(input_dir)
+    if not grids:
+        raise SystemExit(f"No grid files found in {input_dir}")
+    render_scale = 0.0 if args.no_render else args.render_scale
+    print(f"Processing {len(grids)} grids with {args.workers} workers...")
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(process_grid, str(p), args.out, stem, args.square_size, render_scale)
+            for p, stem in zip(grids, output_stems(grids))
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            res = future.result()
+            results.append(res)
+            status = f"ERROR {res['error']}" if res["error"] else f"glyphs={res['glyphs']} edges={res['edges']}"
+            print(f"[{done}/{len(grids)}] {Path(res['file']).name}: {status} ({res['seconds']:.2f}s)")
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda r: r["file"])
+    failed = [r for r in results if r["error"]]
+    summary = {
+        "files": len(results),
+        "failed": len(failed),
+        "glyphs": sum(r["glyphs"] for r in results),
+        "edges": sum(r["edges"] for r in results),
+        "wall_seconds": round(elapsed, 3),
+        "results": results,
+    }
+    summary_path = os.path.join(args.out, "summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"[DONE] {len(results) - len(failed)}/{len(results)} grids in {elapsed:.2f}s → {args.out}")
+    print(f"Saved summary to {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
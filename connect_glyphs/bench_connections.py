@@ -0,0 +1,342 @@
+"""
+Grid-scale benchmark and correctness checks for find_connections.
+
+Synthesizes CompressedImage grids (rectangular green glyphs joined by
+orthogonal red wires, with shade variations and stray wire stubs), then
+times each stage and compares the result with a simple union-find
+reference implementation:
+
+ - ingest     : load_grid from the chosen on-disk format
+ - labeling   : classify_grid + find_glyphs
+ - connection : find_graph
+ - rendering  : render_visualization at --render-scale
+
+`--check N` runs N randomized small grids through analyze_grid, the
+reference and IncrementalConnections (with random edit sequences), plus a
+save/load round trip through every grid format, and fails on the first
+mismatch. Run it before and after touching the glyph/wire code; the
+analyze_grid and naming properties also run under pytest
+(test_connections.py).
+
+Usage:
+    python connect_glyphs/bench_connections.py --sizes 100 500 1000 2000 4000
+    python connect_glyphs/bench_connections.py --sizes 1000 --glyphs 800 --wire-density 2 --format grid
+    python connect_glyphs/bench_connections.py --sizes 2000 --glyphs 20000 --max-side 6   # dense
+    python connect_glyphs/bench_connections.py --check 500
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:  # imported as connect_glyphs.bench_connections
+    from .find_connections import analyze_grid, classify_grid, find_glyphs, find_graph, generate_name, render_visualization
+    from .grid_io import load_grid, save_grid
+    from .incremental import IncrementalConnections
+except ImportError:  # run as a script / with connect_glyphs/ on sys.path
+    from find_connections import analyze_grid, classify_grid, find_glyphs, find_graph, generate_name, render_visualization
+    from grid_io import load_grid, save_grid
+    from incremental import IncrementalConnections
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+GREEN_SHADES = [(0, 255, 0), (128, 255, 128), (40, 200, 60)]
+RED_SHADES = [(255, 0, 0), (255, 128, 128), (255, 60, 60), (255, 220, 220)]
+BACKGROUND = (255, 255, 255)
+MAX_SIDE = 8  # largest glyph side in squares, independent of the grid size
+
+
+def synth_grid(width: int, height: int, glyphs: int, wire_density: float, seed: int = 0,
+               max_side: int = MAX_SIDE) -> np.ndarray:
+    """
+    Random (height, width, 3) grid with up to `glyphs` rectangles of at most
+    `max_side` squares per side and about `wire_density` wires per glyph.
+    Wires never overwrite glyph squares, so some end at or pass beside other
+    glyphs, as in real drawings. Fewer glyphs are placed when the grid runs
+    out of room; callers count the glyphs actually found.
+    """
+    rng = random.Random(seed)
+    grid = np.empty((height, width, 3), dtype=np.uint8)
+    grid[:] = BACKGROUND
+    occupied = np.zeros((height, width), dtype=bool)
+
+    boxes = []
+    for _ in range(glyphs * 4):
+        if len(boxes) >= glyphs:
+            break
+        gw, gh = rng.randint(1, max_side), rng.randint(1, max_side)
+        if gw >= width or gh >= height:
+            continue
+        x, y = rng.randrange(width - gw + 1), rng.randrange(height - gh + 1)
+        # Keep a one-square gap so glyphs stay separate components
+        if occupied[max(0, y - 1):y + gh + 1, max(0, x - 1):x + gw + 1].any():
+            continue
+        occupied[y:y + gh, x:x + gw] = True
+        grid[y:y + gh, x:x + gw] = rng.choice(GREEN_SHADES)
+        boxes.append((x, y, gw, gh))
+
+    def terminal(box):
+        x, y, gw, gh = box
+        side = rng.randrange(4)
+        if side == 0:
+            return x + rng.randrange(gw), y - 1
+        if side == 1:
+            return x + rng.randrange(gw), y + gh
+        if side == 2:
+            return x - 1, y + rng.randrange(gh)
+        return x + gw, y + rng.randrange(gh)
+
+    def draw(x1, y1, x2, y2, color):
+        xa, xb = sorted((x1, x2))
+        ya, yb = sorted((y1, y2))
+        xa, ya = max(xa, 0), max(ya, 0)
+        xb, yb = min(xb, width - 1), min(yb, height - 1)
+        if xa > xb or ya > yb:
+            return
+        region = grid[ya:yb + 1, xa:xb + 1]
+        region[~occupied[ya:yb + 1, xa:xb + 1]] = color
+
+    if len(boxes) >= 2:
+        for _ in range(int(len(boxes) * wire_density)):
+            # Wire to one of the nearest glyphs, like feeders in a drawing,
+            # so wires do not all cross and merge into one net
+            a = rng.choice(boxes)
+            nearest = sorted(boxes, key=lambda o: abs(o[0] - a[0]) + abs(o[1] - a[1]))[1:5]
+            b = rng.choice(nearest)
+            (x1, y1), (x2, y2) = terminal(a), terminal(b)
+            color = rng.choice(RED_SHADES)
+            # L-shaped orthogonal route
+            draw(x1, y1, x2, y1, color)
+            draw(x2, y1, x2, y2, color)
+
+    # Stray stubs that only touch one glyph (or none)
+    for _ in range(len(boxes) // 4):
+        x, y = rng.randrange(width), rng.randrange(height)
+        length = rng.randint(1, max_side)
+        if rng.random() < 0.5:
+            draw(x, y, x + length, y, rng.choice(RED_SHADES))
+        else:
+            draw(x, y, x, y + length, rng.choice(RED_SHADES))
+
+    return grid
+
+
+def reference_graph(grid: np.ndarray) -> list[dict]:
+    """
+    Deliberately simple reference: per-square classification with plain ints,
+    union-find over green and red squares, glyphs connected when one red
+    component touches both.
+    """
+    grid_h, grid_w = grid.shape[:2]
+    cells = grid.tolist()
+    kind = [["g" if g > r and g > b else "r" if r > g and r > b else "" for r, g, b in row] for row in cells]
+
+    parent = list(range(grid_w * grid_h))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for y in range(grid_h):
+        for x in range(grid_w):
+            k = kind[y][x]
+            if not k:
+                continue
+            if x + 1 < grid_w and kind[y][x + 1] == k:
+                parent[find(y * grid_w + x)] = find(y * grid_w + x + 1)
+            if y + 1 < grid_h and kind[y + 1][x] == k:
+                parent[find(y * grid_w + x)] = find((y + 1) * grid_w + x)
+
+    glyph_cells = {}
+    wire_glyphs = {}
+    for y in range(grid_h):
+        for x in range(grid_w):
+            if kind[y][x] == "g":
+                glyph_cells.setdefault(find(y * grid_w + x), []).append((x, y))
+            elif kind[y][x] == "r":
+                root = find(y * grid_w + x)
+                touching = wire_glyphs.setdefault(root, set())
+                for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if 0 <= nx < grid_w and 0 <= ny < grid_h and kind[ny][nx] == "g":
+                        touching.add(find(ny * grid_w + nx))
+
+    def sort_key(root):
+        pts = glyph_cells[root]
+        xs = [x for x, _ in pts]
+        ys = [y for _, y in pts]
+        first = min((y, x) for x, y in pts)
+        return ((min(ys) + max(ys)) // 2, (min(xs) + max(xs)) // 2, first)
+
+    order = sorted(glyph_cells, key=sort_key)
+    rank = {root: i for i, root in enumerate(order)}
+    neighbours = {root: set() for root in order}
+    for touching in wire_glyphs.values():
+        for a in touching:
+            neighbours[a].update(touching - {a})
+
+    graph = []
+    for i, root in enumerate(order):
+        cy, cx, _ = sort_key(root)
+        graph.append({
+            "name": generate_name(i),
+            "connections": sorted(generate_name(rank[t]) for t in neighbours[root] if rank[t] > i),
+            "center": {"X": cx, "Y": cy},
+        })
+    return graph
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(rss / (1024 * 1024) if os.uname().sysname == "Darwin" else rss / 1024, 1)
+
+
+class Stage:
+    """Time a block and, when tracing, its peak traced allocation."""
+
+    def __init__(self, report: dict, name: str, trace: bool):
+        self.report, self.name, self.trace = report, name, trace
+
+    def __enter__(self):
+        if self.trace:
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.report[f"{self.name}_s"] = round(time.perf_counter() - self.start, 4)
+        if self.trace:
+            self.report[f"{self.name}_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        return False
+
+
+def bench_one(size: int, glyphs: int, wire_density: float, seed: int, fmt: str, render_scale: float,
+              trace: bool, verify: bool, tmp_dir: str, max_side: int = MAX_SIDE) -> dict:
+    grid = synth_grid(size, size, glyphs, wire_density, seed, max_side)
+    path = os.path.join(tmp_dir, f"bench_{size}.{fmt}")
+    save_grid(path, grid, 16)
+    report = {"size": size, "glyphs_requested": glyphs, "max_side": max_side, "wire_density": wire_density,
+              "format": fmt, "file_mb": round(os.path.getsize(path) / 2**20, 3)}
+
+    with Stage(report, "ingest", trace):
+        loaded, square_size = load_grid(path)
+        loaded = np.asarray(loaded)
+    with Stage(report, "labeling", trace):
+        green, red = classify_grid(loaded)
+        found = find_glyphs(green, size, size)
+    with Stage(report, "connection", trace):
+        graph = find_graph(found, green, red, size, size)
+    if render_scale > 0:
+        with Stage(report, "rendering", trace):
+            render_visualization(loaded, found, graph, os.path.join(tmp_dir, f"bench_{size}.png"),
+                                 square_size, render_scale)
+
+    report["glyphs"] = len(found)
+    report["edges"] = sum(len(node["connections"]) for node in graph)
+    report["peak_rss_mb"] = peak_rss_mb()
+    if verify:
+        report["matches_reference"] = graph == reference_graph(grid)
+    return report
+
+
+def run_checks(count: int, seed: int):
+    """Randomized equivalence checks on small grids; raises on the first mismatch."""
+    rng = random.Random(seed)
+    colors = [BACKGROUND] + GREEN_SHADES + RED_SHADES + [(0, 0, 0), (0, 0, 255)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for case in range(count):
+            w, h = rng.randint(1, 24), rng.randint(1, 24)
+            if rng.random() < 0.5:
+                grid = synth_grid(w, h, rng.randint(0, 8), rng.uniform(0, 3), seed=rng.randrange(2**31), max_side=2)
+            else:
+                grid = np.array([[rng.choice(colors) for _ in range(w)] for _ in range(h)], dtype=np.uint8)
+
+            expected = reference_graph(grid)
+            _, graph = analyze_grid(grid)
+            if graph != expected:
+                raise AssertionError(f"case {case}: analyze_grid differs from reference")
+
+            for fmt in ("json", "png", "npy", "npz", "grid"):
+                path = os.path.join(tmp_dir, f"check.{fmt}")
+                save_grid(path, grid, 7)
+                loaded, square_size = load_grid(path, 7 if fmt == "npy" else None)
+                if square_size != 7 or not np.array_equal(loaded, grid):
+                    raise AssertionError(f"case {case}: {fmt} round trip changed the grid")
+
+            engine = IncrementalConnections(grid)
+            for step in range(5):
+                edits = [(rng.randrange(w), rng.randrange(h), rng.choice(colors)) for _ in range(rng.randint(1, 6))]
+                engine.apply_edits(edits)
+                for x, y, rgb in edits:
+                    grid[y, x] = rgb
+                if engine.graph() != reference_graph(grid):
+                    raise AssertionError(f"case {case} edit {step}: incremental graph differs from reference")
+
+    print(f"[OK] {count} randomized grids match the reference")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark find_connections on synthetic grids.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 500, 1000], help="Square grid sides")
+    parser.add_argument("--glyphs", type=int, default=None, help="Glyphs per grid (default: size^2 / 2500)")
+    parser.add_argument("--wire-density", type=float, default=1.5, help="Wires per glyph")
+    parser.add_argument("--max-side", type=int, default=MAX_SIDE, help="Largest glyph side in squares")
+    parser.add_argument("--format", default="grid", choices=["json", "png", "npy", "npz", "grid"], help="Ingest format")
+    parser.add_argument("--render-scale", type=float, default=0.25, help="Render scale (0 skips rendering)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="Per-stage tracemalloc peaks (slower)")
+    parser.add_argument("--no-verify", action="store_true", help="Skip the reference comparison")
+    parser.add_argument("--check", type=int, default=0, help="Run N randomized correctness checks and exit")
+    parser.add_argument("--json", default=None, help="Write the report to this path")
+    args = parser.parse_args()
+
+    if args.check:
+        run_checks(args.check, args.seed)
+        return
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    reports = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            glyphs = args.glyphs if args.glyphs is not None else max(2, size * size // 2500)
+            report = bench_one(size, glyphs, args.wire_density, args.seed, args.format, args.render_scale,
+                               args.trace_memory, not args.no_verify, tmp_dir, args.max_side)
+            reports.append(report)
+            stages = " ".join(
+                f"{name}={report[f'{name}_s']:.3f}s"
+                for name in ("ingest", "labeling", "connection", "rendering")
+                if f"{name}_s" in report
+            )
+            verdict = {True: "OK", False: "MISMATCH"}.get(report.get("matches_reference"), "unverified")
+            if report["glyphs"] < glyphs:
+                print(f"[WARN] {size}x{size}: placed {report['glyphs']} of {glyphs} requested glyphs")
+            print(f"[{size}x{size}] glyphs={report['glyphs']}/{glyphs} edges={report['edges']} {stages} "
+                  f"peak_rss={report['peak_rss_mb']}MB reference={verdict}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Saved report to {args.json}")
+
+    if any(r.get("matches_reference") is False for r in reports):
+        raise SystemExit("Graph differs from the reference implementation")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,13 @@ from PIL import Image, ImageDraw, ImageFilter, ImageFont
 from collections import deque
 import os
 
+import numpy as np
+
+try:  # imported as connect_glyphs.find_connections
+    from .grid_io import load_grid
+except ImportError:  # run as a script / with connect_glyphs/ on sys.path
+    from grid_io import load_grid
+
 class Point:
     def __init__(self, x, y):
         self.x = x
@@ -34,49 +41,35 @@ class Glyph:
         max_y = max(p.y for p in self.points)
         return Point((min_x + max_x) // 2, (min_y + max_y) // 2)
 
+# Written with & so they also work elementwise on NumPy channel arrays
 def is_green(r, g, b):
-    return g > r and g > b
+    return (g > r) & (g > b)
 
 def is_red(r, g, b):
-    return r > g and r > b
+    return (r > g) & (r > b)
 
 def generate_name(n):
-    # TODO: Replace with actual SLD symbol names with number suffix
-    # A, B, ..., Z, AA, AB, ...
+    # A, B, ..., Z, AA, ..., ZZ, AAA, ... (bijective base 26, no upper limit)
     letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    if n < 26:
-        return letters[n]
-    return letters[n // 26 - 1] + letters[n % 26]
+    name = ""
+    n += 1
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        name = letters[r] + name
+    return name
 
-def find_connections(json_path):
-    print(f"Loading grid data from {json_path}...")
-    try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        print(f"Error: {json_path} not found.")
-        return
+DIRS = [(0, 1), (0, -1), (1, 0), (-1, 0)]
 
-    # Parse CompressedImage struct
-    grid_w = data["GridWidth"]
-    grid_h = data["GridHeight"]
-    square_size = data["SquareSize"]
-    squares = data["Squares"]
-    
-    print(f"Grid size: {grid_w}x{grid_h}")
-    
-    # Reconstruct grid matrix
-    # TODO: will be passed as input
-    # grid[y][x] = (r, g, b)
-    grid = [[(0,0,0) for _ in range(grid_w)] for _ in range(grid_h)]
-    for y in range(grid_h):
-        for x in range(grid_w):
-            p = squares[y][x]
-            grid[y][x] = (p["R"], p["G"], p["B"])
+def classify_grid(grid: np.ndarray) -> tuple[list[list[bool]], list[list[bool]]]:
+    """Return (green, red) as nested lists indexed [y][x]."""
+    # Classify every square once; int16 avoids uint8 wrap-around in comparisons
+    r, g, b = (grid[..., c].astype(np.int16) for c in range(3))
+    return is_green(r, g, b).tolist(), is_red(r, g, b).tolist()
 
+def find_glyphs(green: list[list[bool]], grid_w: int, grid_h: int) -> list[Glyph]:
+    """Flood-fill green squares into glyphs, sorted and named top-left to bottom-right."""
     visited = set()
     glyphs = []
-    dirs = [(0, 1), (0, -1), (1, 0), (-1, 0)]
     
     # Find Glyphs
     for y in range(grid_h):
@@ -85,8 +78,7 @@ def find_connections(json_path):
             if p in visited:
                 continue
             
-            r, g, b = grid[y][x]
-            if is_green(r, g, b):
+            if green[y][x]:
                 # Found new glyph
                 glyph_points = []
                 queue = deque([p])
@@ -96,32 +88,31 @@ def find_connections(json_path):
                     curr = queue.popleft()
                     glyph_points.append(curr)
                     
-                    for dx, dy in dirs:
+                    for dx, dy in DIRS:
                         nx, ny = curr.x + dx, curr.y + dy
                         
                         if 0 <= nx < grid_w and 0 <= ny < grid_h:
-                            np = Point(nx, ny)
-                            if np not in visited:
-                                nr, ng, nb = grid[ny][nx]
-                                if is_green(nr, ng, nb):
-                                    visited.add(np)
-                                    queue.append(np)
+                            nbr = Point(nx, ny)
+                            if nbr not in visited:
+                                if green[ny][nx]:
+                                    visited.add(nbr)
+                                    queue.append(nbr)
                 
                 glyphs.append(Glyph(len(glyphs), glyph_points))
 
-    print(f"Found {len(glyphs)} Glyphs.")
-
     # Sort Glyphs (Top-Left to Bottom-Right)
     # Sort by Y then X of center
     glyphs.sort(key=lambda glyph: (glyph.center.y, glyph.center.x))
     
     # Assign Names
-    # TODO replace with actual SLD symbol names with number suffix
     for i, glyph in enumerate(glyphs):
         glyph.id = i
         glyph.name = generate_name(i)
 
-    # Find Connections
+    return glyphs
+
+def find_graph(glyphs: list[Glyph], green: list[list[bool]], red: list[list[bool]], grid_w: int, grid_h: int) -> list[dict]:
+    """Follow red wire squares out of every glyph and list the glyphs they reach."""
     # Map point to glyph ID
     point_to_glyph = {}
     for glyph in glyphs:
@@ -139,36 +130,34 @@ def find_connections(json_path):
         
         # Initialize with adjacent reds
         for p in glyph.points:
-            for dx, dy in dirs:
+            for dx, dy in DIRS:
                 nx, ny = p.x + dx, p.y + dy
                 if 0 <= nx < grid_w and 0 <= ny < grid_h:
-                    np = Point(nx, ny)
-                    nr, ng, nb = grid[ny][nx]
-                    if is_red(nr, ng, nb) and np not in visited_red:
-                        visited_red.add(np)
-                        queue.append(np)
+                    nbr = Point(nx, ny)
+                    if red[ny][nx] and nbr not in visited_red:
+                        visited_red.add(nbr)
+                        queue.append(nbr)
         
         while queue:
             curr = queue.popleft()
             
-            for dx, dy in dirs:
+            for dx, dy in DIRS:
                 nx, ny = curr.x + dx, curr.y + dy
                 if 0 <= nx < grid_w and 0 <= ny < grid_h:
-                    np = Point(nx, ny)
-                    nr, ng, nb = grid[ny][nx]
+                    nbr = Point(nx, ny)
                     
                     # Hit a Green Square?
-                    if is_green(nr, ng, nb):
-                        if np in point_to_glyph:
-                            target_id = point_to_glyph[np]
+                    if green[ny][nx]:
+                        if nbr in point_to_glyph:
+                            target_id = point_to_glyph[nbr]
                             if target_id != glyph.id:
                                 connections.add(target_id)
                         continue # Don't traverse through Green
                     
                     # Hit a Red Square?
-                    if is_red(nr, ng, nb) and np not in visited_red:
-                        visited_red.add(np)
-                        queue.append(np)
+                    if red[ny][nx] and nbr not in visited_red:
+                        visited_red.add(nbr)
+                        queue.append(nbr)
 
         # Filter connections (One Way: Target > Source)
         valid_connections = []
@@ -184,76 +173,107 @@ def find_connections(json_path):
             "center": {"X": glyph.center.x, "Y": glyph.center.y}
         })
 
-    # Output JSON
-    json_output_path = "connect_glyphs/output/graph.json"
-    image_output_path = "connect_glyphs/output/output.png"
+    return graph_output
+
+def analyze_grid(grid: np.ndarray) -> tuple[list[Glyph], list[dict]]:
+    """
+    Pure analysis of an in-memory (H, W, 3) grid; no printing or file I/O.
 
-    os.makedirs(os.path.dirname(json_output_path), exist_ok=True)
-    os.makedirs(os.path.dirname(image_output_path), exist_ok=True)
+    Returns (glyphs, graph_output) where graph_output is the list written to
+    graph.json.
+    """
+    grid_h, grid_w = grid.shape[:2]
+    green, red = classify_grid(grid)
+    glyphs = find_glyphs(green, grid_w, grid_h)
+    return glyphs, find_graph(glyphs, green, red, grid_w, grid_h)
 
-    with open(json_output_path, 'w') as f:
+def write_graph(graph_output: list[dict], output_path: str):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, 'w') as f:
         json.dump(graph_output, f, indent=2)
+
+def render_visualization(grid: np.ndarray, glyphs: list[Glyph], graph_output: list[dict], output_path: str, square_size: int, render_scale: float = 1.0):
+    """Reconstruct the grid image at `render_scale` x SquareSize and draw glyph highlights + names."""
+    # TODO: Maybe pass original image to avoid reconstructing
+    grid_h, grid_w = grid.shape[:2]
+    render_size = max(1, round(square_size * render_scale))
+    img = render_grid(grid, render_size)
+    mask = glyph_mask(glyphs, grid_w, grid_h)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    visualize(img, mask, graph_output, output_path, render_size, render_scale)
+
+def find_connections(json_path, square_size=None, render_scale=1.0, out_dir="connect_glyphs/output"):
+    print(f"Loading grid data from {json_path}...")
+    try:
+        # grid[y, x] = (r, g, b); accepts .json, .png, .npy, .npz and binary .grid
+        grid, square_size = load_grid(json_path, square_size)
+    except FileNotFoundError:
+        print(f"Error: {json_path} not found.")
+        return
+
+    grid_h, grid_w = grid.shape[:2]
+    print(f"Grid size: {grid_w}x{grid_h}")
+
+    glyphs, graph_output = analyze_grid(grid)
+    print(f"Found {len(glyphs)} Glyphs.")
+
+    # Output JSON
+    json_output_path = os.path.join(out_dir, "graph.json")
+    image_output_path = os.path.join(out_dir, "output.png")
+
+    write_graph(graph_output, json_output_path)
     print(f"Saved graph to {json_output_path}")
 
+    if render_scale <= 0:
+        print("Skipping visualization (render disabled).")
+        return graph_output
+
     # Visualize results
     print(f"Reconstructing image from grid data for visualization...")
-    
-    # Reconstruct image from grid for visualization output
-    # TODO: Maybe pass original image to avoid reconstructing
-    img = Image.new('RGB', (grid_w * square_size, grid_h * square_size))
-    pixels = img.load()
-    
-    for y in range(grid_h):
-        for x in range(grid_w):
-            r, g, b = grid[y][x]
-            # Fill the square
-            for dy in range(square_size):
-                for dx in range(square_size):
-                    px = x * square_size + dx
-                    py = y * square_size + dy
-                    pixels[px, py] = (r, g, b)
-
-    visualize(img, glyphs, graph_output, image_output_path, square_size)
-
-def visualize(img: Image, glyphs: list[Glyph], graph_data: list[dict], output_path: str, square_size: int):
-    # Create mask for highlights
-    mask = Image.new('L', img.size, 0)
-    draw_mask = ImageDraw.Draw(mask)
-    
-    for glyph in glyphs:
-        for p in glyph.points:
-            px = p.x * square_size
-            py = p.y * square_size
-            draw_mask.rectangle([px, py, px + square_size - 1, py + square_size - 1], fill=255)
-            
-    edges = mask.filter(ImageFilter.FIND_EDGES)
-    edges = edges.point(lambda p: 255 if p > 100 else 0)
-    
-    overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-    draw_overlay = ImageDraw.Draw(overlay)
-    
-    # Fill glyphs
+    render_visualization(grid, glyphs, graph_output, image_output_path, square_size, render_scale)
+    print(f"Saved visualization to {image_output_path}")
+    return graph_output
+
+def render_grid(grid: np.ndarray, square_size: int) -> Image.Image:
+    """Nearest-neighbour upscale of the (H, W, 3) grid to one block per square."""
+    pixels = np.repeat(np.repeat(np.asarray(grid, dtype=np.uint8), square_size, axis=0), square_size, axis=1)
+    return Image.fromarray(pixels, 'RGB')
+
+def glyph_mask(glyphs: list[Glyph], grid_w: int, grid_h: int) -> np.ndarray:
+    """Boolean (H, W) grid mask of all glyph squares."""
+    mask = np.zeros((grid_h, grid_w), dtype=bool)
     for glyph in glyphs:
-        for p in glyph.points:
-            px = p.x * square_size
-            py = p.y * square_size
-            draw_overlay.rectangle([px, py, px + square_size, py + square_size], fill=(0, 0, 255, 100))
-            
-    # Draw edges
-    solid_blue = Image.new('RGBA', img.size, (0, 0, 255, 255))
-    overlay.paste(solid_blue, (0, 0), edges)
-    
+        xs = [p.x for p in glyph.points]
+        ys = [p.y for p in glyph.points]
+        mask[ys, xs] = True
+    return mask
+
+def visualize(img: Image, mask: np.ndarray, graph_data: list[dict], output_path: str, square_size: int, font_scale: float = 1.0):
+    # Upscale the grid-level glyph mask to image pixels
+    mask_px = np.repeat(np.repeat(mask, square_size, axis=0), square_size, axis=1)
+    mask_img = Image.fromarray(mask_px.astype(np.uint8) * 255, 'L')
+
+    edges = np.asarray(mask_img.filter(ImageFilter.FIND_EDGES)) > 100
+
+    # Fill glyphs translucent blue, then draw edges solid blue
+    overlay = np.zeros(mask_px.shape + (4,), dtype=np.uint8)
+    overlay[mask_px] = (0, 0, 255, 100)
+    overlay[edges] = (0, 0, 255, 255)
+
     # Composite
     img = img.convert('RGBA')
-    result = Image.alpha_composite(img, overlay).convert('RGB')
-    
-    # Draw Labels
+    result = Image.alpha_composite(img, Image.fromarray(overlay, 'RGBA')).convert('RGB')
+
+    # Draw Labels (40px at full size, scaled with --render-scale)
     draw = ImageDraw.Draw(result)
+    font_size = max(8, round(40 * font_scale))
+    outline_range = 2
     try:
-        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 40)
+        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
     except IOError:
         print("Warning: DejaVuSans-Bold.ttf not found, falling back to default font.")
-        font = ImageFont.load_default(size=50)
+        font = ImageFont.load_default(size=font_size + 10)
              
 
     for node in graph_data:
@@ -270,22 +290,20 @@ def visualize(img: Image, glyphs: list[Glyph], graph_data: list[dict], output_pa
         tx = cx - text_w // 2
         ty = cy - text_h // 2
         
-        # Outline
-        outline_range = 2
-        for ox in range(-outline_range, outline_range + 1):
-            for oy in range(-outline_range, outline_range + 1):
-                 draw.text((tx + ox, ty + oy), name, font=font, fill="black")
-        
-        draw.text((tx, ty), name, font=font, fill="white")
+        # Single stroked draw instead of one call per outline offset
+        draw.text((tx, ty), name, font=font, fill="white", stroke_width=outline_range, stroke_fill="black")
         
     result.save(output_path)
-    print(f"Saved visualization to {output_path}")
 
 import argparse
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Find connections from grid JSON.")
-    parser.add_argument("json_path", help="Path to the CompressedImage JSON")
+    parser.add_argument("json_path", help="Path to the CompressedImage grid (.json, .png, .npy, .npz, .grid)")
+    parser.add_argument("--square-size", type=int, default=None, help="Override SquareSize (needed for .npy)")
+    parser.add_argument("--render-scale", type=float, default=1.0, help="Scale of output.png relative to SquareSize (e.g. 0.25)")
+    parser.add_argument("--no-render", action="store_true", help="Skip writing output.png")
+    parser.add_argument("--out-dir", default="connect_glyphs/output", help="Directory for graph.json and output.png")
     args = parser.parse_args()
     
-    find_connections(args.json_path)
+    find_connections(args.json_path, args.square_size, 0.0 if args.no_render else args.render_scale, args.out_dir)
@@ -0,0 +1,177 @@
+"""
+Read/write CompressedImage grids in several on-disk formats.
+
+find_connections originally only accepted the JSON "CompressedImage" struct
+(GridWidth, GridHeight, SquareSize and a Squares[y][x] = {"R","G","B"} matrix).
+That costs ~30 bytes per square plus a full json.load before any work starts.
+The loaders here return the grid as a (GridHeight, GridWidth, 3) uint8 array:
+
+ - .json        : original CompressedImage struct
+ - .png         : one pixel per square; SquareSize stored in a PNG text chunk
+ - .npy         : raw (H, W, 3) uint8 array (SquareSize passed separately)
+ - .npz         : arrays "squares" (H, W, 3) and "square_size"
+ - .grid / .bin : 20-byte header + raw RGB bytes, opened with np.memmap
+
+Binary header (little endian):
+    4s  magic "SDLG"
+    H   version (1)
+    H   header size in bytes
+    I   GridWidth
+    I   GridHeight
+    I   SquareSize
+followed by GridHeight * GridWidth * 3 uint8 values (row-major RGB).
+
+Usage (convert an existing JSON grid):
+    python connect_glyphs/grid_io.py grid.json grid.grid
+    python connect_glyphs/grid_io.py grid.json grid.png
+"""
+
+import argparse
+import json
+import struct
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+GRID_MAGIC = b"SDLG"
+GRID_VERSION = 1
+GRID_HEADER = struct.Struct("<4sHHIII")
+BINARY_SUFFIXES = {".grid", ".bin"}
+DEFAULT_SQUARE_SIZE = 1
+
+
+def _load_json(path: Path) -> Tuple[np.ndarray, int]:
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    grid_w = data["GridWidth"]
+    grid_h = data["GridHeight"]
+    squares = data["Squares"]
+
+    grid = np.zeros((grid_h, grid_w, 3), dtype=np.uint8)
+    for y in range(grid_h):
+        row = squares[y]
+        grid[y] = [(p["R"], p["G"], p["B"]) for p in row[:grid_w]]
+    return grid, int(data["SquareSize"])
+
+
+def _load_png(path: Path) -> Tuple[np.ndarray, Optional[int]]:
+    with Image.open(path) as img:
+        square_size = img.info.get("SquareSize")
+        grid = np.asarray(img.convert("RGB"))
+    return grid, int(square_size) if square_size else None
+
+
+def _load_npz(path: Path) -> Tuple[np.ndarray, Optional[int]]:
+    with np.load(path) as data:
+        grid = data["squares"]
+        square_size = int(data["square_size"]) if "square_size" in data else None
+    return grid, square_size
+
+
+def read_grid_header(path: Path) -> Tuple[int, int, int, int]:
+    """Return (grid_w, grid_h, square_size, header_size) of a binary grid file."""
+    with open(path, "rb") as f:
+        raw = f.read(GRID_HEADER.size)
+    if len(raw) < GRID_HEADER.size:
+        raise ValueError(f"{path}: truncated grid header")
+    magic, version, header_size, grid_w, grid_h, square_size = GRID_HEADER.unpack(raw)
+    if magic != GRID_MAGIC:
+        raise ValueError(f"{path}: not a grid file (bad magic {magic!r})")
+    if version != GRID_VERSION:
+        raise ValueError(f"{path}: unsupported grid version {version}")
+    return grid_w, grid_h, square_size, header_size
+
+
+def _load_binary(path: Path) -> Tuple[np.ndarray, int]:
+    grid_w, grid_h, square_size, header_size = read_grid_header(path)
+    grid = np.memmap(path, dtype=np.uint8, mode="r", offset=header_size, shape=(grid_h, grid_w, 3))
+    return grid, square_size
+
+
+def load_grid(path, square_size: Optional[int] = None) -> Tuple[np.ndarray, int]:
+    """
+    Load a grid as a (H, W, 3) uint8 array plus its SquareSize.
+
+    `square_size` overrides the value stored in the file (and is required for
+    formats that cannot carry it, otherwise DEFAULT_SQUARE_SIZE is used).
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        grid, stored = _load_json(path)
+    elif suffix == ".png":
+        grid, stored = _load_png(path)
+    elif suffix == ".npy":
+        grid, stored = np.load(path, mmap_mode="r"), None
+    elif suffix == ".npz":
+        grid, stored = _load_npz(path)
+    elif suffix in BINARY_SUFFIXES:
+        grid, stored = _load_binary(path)
+    else:
+        raise ValueError(f"Unsupported grid format: {path}")
+
+    if grid.ndim != 3 or grid.shape[2] != 3 or grid.dtype != np.uint8:
+        raise ValueError(f"{path}: expected (H, W, 3) uint8 grid, got {grid.shape} {grid.dtype}")
+
+    if square_size is None:
+        square_size = stored if stored else DEFAULT_SQUARE_SIZE
+    return grid, int(square_size)
+
+
+def save_grid(path, grid: np.ndarray, square_size: int):
+    """Write a (H, W, 3) uint8 grid; the format is picked from the file suffix."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    grid = np.ascontiguousarray(grid, dtype=np.uint8)
+    grid_h, grid_w = grid.shape[:2]
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if suffix == ".json":
+        squares = [
+            [{"R": int(r), "G": int(g), "B": int(b)} for r, g, b in row]
+            for row in grid.tolist()
+        ]
+        data = {
+            "GridWidth": grid_w,
+            "GridHeight": grid_h,
+            "SquareSize": square_size,
+            "Squares": squares,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+    elif suffix == ".png":
+        info = PngInfo()
+        info.add_text("SquareSize", str(square_size))
+        Image.fromarray(grid, "RGB").save(path, pnginfo=info)
+    elif suffix == ".npy":
+        np.save(path, grid)
+    elif suffix == ".npz":
+        np.savez(path, squares=grid, square_size=np.int32(square_size))
+    elif suffix in BINARY_SUFFIXES:
+        header = GRID_HEADER.pack(GRID_MAGIC, GRID_VERSION, GRID_HEADER.size, grid_w, grid_h, square_size)
+        with open(path, "wb") as f:
+            f.write(header)
+            f.write(grid.tobytes())
+    else:
+        raise ValueError(f"Unsupported grid format: {path}")
+
+
+def convert_grid(src, dst, square_size: Optional[int] = None):
+    grid, square_size = load_grid(src, square_size)
+    save_grid(dst, grid, square_size)
+    return grid.shape[1], grid.shape[0], square_size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a CompressedImage grid between formats.")
+    parser.add_argument("src", help="Input grid (.json, .png, .npy, .npz, .grid)")
+    parser.add_argument("dst", help="Output grid; format picked from the suffix")
+    parser.add_argument("--square-size", type=int, default=None, help="Override SquareSize")
+    args = parser.parse_args()
+
+    grid_w, grid_h, square_size = convert_grid(args.src, args.dst, args.square_size)
+    print(f"Converted {args.src} -> {args.dst} ({grid_w}x{grid_h}, square={square_size})")
@@ -0,0 +1,231 @@
+"""
+Incremental glyph connectivity for interactively edited grids.
+
+find_connections re-parses the grid and re-runs every BFS after each edit.
+IncrementalConnections keeps the glyph (green) and wire (red) labelings and
+the glyph <-> wire incidence between calls. apply_edits() relabels only the
+components that touch a changed cell (which handles splits and merges) and
+patches the incidence for those components; untouched components are never
+revisited. graph() then returns exactly what find_connections.analyze_grid
+would produce for the current grid.
+
+Two glyphs are connected when some wire component is adjacent to both,
+which is what the per-glyph red BFS in find_graph computes.
+
+Usage (apply an edit list and write the resulting graph):
+    python connect_glyphs/incremental.py grid.json edits.json --out graph.json
+
+edits.json is a list of {"X", "Y", "R", "G", "B"} squares.
+"""
+
+import argparse
+import json
+from collections import deque
+from typing import Iterable
+
+import numpy as np
+
+try:  # imported as connect_glyphs.incremental
+    from .find_connections import DIRS, Glyph, Point, classify_grid, generate_name, is_green, is_red, write_graph
+    from .grid_io import load_grid
+except ImportError:  # run as a script / with connect_glyphs/ on sys.path
+    from find_connections import DIRS, Glyph, Point, classify_grid, generate_name, is_green, is_red, write_graph
+    from grid_io import load_grid
+
+OTHER, GREEN, RED = 0, 1, 2
+
+
+def square_kind(r: int, g: int, b: int) -> int:
+    if is_green(r, g, b):
+        return GREEN
+    if is_red(r, g, b):
+        return RED
+    return OTHER
+
+
+class Component:
+    __slots__ = ("kind", "cells", "center", "first")
+
+    def __init__(self, kind: int, cells: list[tuple[int, int]]):
+        self.kind = kind
+        self.cells = cells
+        xs = [x for x, _ in cells]
+        ys = [y for _, y in cells]
+        # Same center as Glyph._calculate_center
+        self.center = ((min(xs) + max(xs)) // 2, (min(ys) + max(ys)) // 2)
+        # Raster-order discovery position, the tie-break of the stable sort in find_glyphs
+        self.first = min((y, x) for x, y in cells)
+
+
+class IncrementalConnections:
+    def __init__(self, grid: np.ndarray):
+        self.grid = np.array(grid, dtype=np.uint8)
+        self.grid_h, self.grid_w = self.grid.shape[:2]
+
+        green, red = classify_grid(self.grid)
+        self.kind = [
+            [GREEN if gr else RED if rd else OTHER for gr, rd in zip(green_row, red_row)]
+            for green_row, red_row in zip(green, red)
+        ]
+        # label[y][x] = component key (0 = no component)
+        self.label = [[0] * self.grid_w for _ in range(self.grid_h)]
+        self.components: dict[int, Component] = {}
+        # Bipartite glyph <-> wire incidence, keyed by component key
+        self.adjacent: dict[int, set[int]] = {}
+        self._next_key = 1
+
+        seeds = [
+            (x, y) for y in range(self.grid_h) for x in range(self.grid_w) if self.kind[y][x] != OTHER
+        ]
+        self._relabel(seeds)
+
+    def _flood(self, x: int, y: int) -> int:
+        kind = self.kind[y][x]
+        key = self._next_key
+        self._next_key += 1
+
+        self.label[y][x] = key
+        cells = []
+        queue = deque([(x, y)])
+        while queue:
+            cx, cy = queue.popleft()
+            cells.append((cx, cy))
+            for dx, dy in DIRS:
+                nx, ny = cx + dx, cy + dy
+                if 0 <= nx < self.grid_w and 0 <= ny < self.grid_h:
+                    if self.label[ny][nx] == 0 and self.kind[ny][nx] == kind:
+                        self.label[ny][nx] = key
+                        queue.append((nx, ny))
+
+        self.components[key] = Component(kind, cells)
+        return key
+
+    def _relabel(self, seeds: Iterable[tuple[int, int]]) -> list[int]:
+        """Label every unlabeled non-OTHER seed, then link the new components."""
+        new_keys = []
+        for x, y in seeds:
+            if self.label[y][x] == 0 and self.kind[y][x] != OTHER:
+                new_keys.append(self._flood(x, y))
+
+        for key in new_keys:
+            comp = self.components[key]
+            touching = set()
+            for cx, cy in comp.cells:
+                for dx, dy in DIRS:
+                    nx, ny = cx + dx, cy + dy
+                    if 0 <= nx < self.grid_w and 0 <= ny < self.grid_h:
+                        other = self.label[ny][nx]
+                        if other and other != key and self.kind[ny][nx] != comp.kind:
+                            touching.add(other)
+            self.adjacent[key] = touching
+            for other in touching:
+                self.adjacent.setdefault(other, set()).add(key)
+        return new_keys
+
+    def _remove(self, key: int) -> list[tuple[int, int]]:
+        comp = self.components.pop(key)
+        for x, y in comp.cells:
+            self.label[y][x] = 0
+        for other in self.adjacent.pop(key, ()):
+            self.adjacent[other].discard(key)
+        return comp.cells
+
+    def apply_edits(self, edits: Iterable[tuple[int, int, tuple[int, int, int]]]) -> dict:
+        """
+        Recolor squares given as (x, y, (r, g, b)) and update the labelings.
+
+        Only components containing or (for the new color) adjoining a changed
+        square are rebuilt, so the cost scales with the edited components
+        rather than the grid. Returns counts of what was touched.
+        """
+        # Later edits of the same square win
+        final = {(x, y): rgb for x, y, rgb in edits}
+
+        changed = []
+        for (x, y), rgb in final.items():
+            r, g, b = (int(c) for c in rgb)
+            self.grid[y, x] = (r, g, b)
+            new_kind = square_kind(r, g, b)
+            if new_kind != self.kind[y][x]:
+                changed.append((x, y, new_kind))
+
+        affected = set()
+        for x, y, new_kind in changed:
+            if self.label[y][x]:
+                affected.add(self.label[y][x])
+            if new_kind == OTHER:
+                continue
+            # Same-kind neighbours may merge through this square
+            for dx, dy in DIRS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < self.grid_w and 0 <= ny < self.grid_h:
+                    other = self.label[ny][nx]
+                    if other and self.components[other].kind == new_kind:
+                        affected.add(other)
+
+        for x, y, new_kind in changed:
+            self.kind[y][x] = new_kind
+
+        seeds = [(x, y) for x, y, _ in changed]
+        for key in affected:
+            seeds.extend(self._remove(key))
+        new_keys = self._relabel(seeds)
+
+        return {"changed": len(changed), "removed": len(affected), "added": len(new_keys)}
+
+    def _sorted_glyph_keys(self) -> list[int]:
+        keys = [key for key, comp in self.components.items() if comp.kind == GREEN]
+        comps = self.components
+        keys.sort(key=lambda k: (comps[k].center[1], comps[k].center[0], comps[k].first))
+        return keys
+
+    def graph(self) -> list[dict]:
+        """Return the graph_output list find_connections would write for the current grid."""
+        order = self._sorted_glyph_keys()
+        rank = {key: i for i, key in enumerate(order)}
+
+        graph_output = []
+        for i, key in enumerate(order):
+            targets = set()
+            for wire in self.adjacent.get(key, ()):
+                targets.update(self.adjacent[wire])
+
+            connections = sorted(generate_name(rank[t]) for t in targets if rank[t] > i)
+            cx, cy = self.components[key].center
+            graph_output.append({
+                "name": generate_name(i),
+                "connections": connections,
+                "center": {"X": cx, "Y": cy},
+            })
+        return graph_output
+
+    def glyphs(self) -> list[Glyph]:
+        """Current glyphs as find_connections.Glyph objects (e.g. for render_visualization)."""
+        glyphs = []
+        for i, key in enumerate(self._sorted_glyph_keys()):
+            glyph = Glyph(i, [Point(x, y) for x, y in self.components[key].cells])
+            glyph.name = generate_name(i)
+            glyphs.append(glyph)
+        return glyphs
+
+
+def load_edits(path: str) -> list[tuple[int, int, tuple[int, int, int]]]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    return [(e["X"], e["Y"], (e["R"], e["G"], e["B"])) for e in data]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply square edits to a grid and recompute connections incrementally.")
+    parser.add_argument("grid_path", help="Path to the CompressedImage grid")
+    parser.add_argument("edits_path", help="JSON list of {X, Y, R, G, B} edits")
+    parser.add_argument("--out", default="connect_glyphs/output/graph.json", help="Output graph JSON")
+    args = parser.parse_args()
+
+    grid, _ = load_grid(args.grid_path)
+    engine = IncrementalConnections(grid)
+    stats = engine.apply_edits(load_edits(args.edits_path))
+    print(f"Applied edits: {stats}")
+
+    write_graph(engine.graph(), args.out)
+    print(f"Saved graph to {args.out}")
@@ -0,0 +1,50 @@
+"""
+Property tests for find_connections: randomized grids must give the same
+graph as the union-find reference in bench_connections.py.
+
+Usage:
+    python -m pytest connect_glyphs/test_connections.py -q
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+try:  # imported as connect_glyphs.test_connections
+    from .bench_connections import BACKGROUND, GREEN_SHADES, RED_SHADES, reference_graph, synth_grid
+    from .find_connections import analyze_grid, generate_name
+except ImportError:  # run as a script / with connect_glyphs/ on sys.path
+    from bench_connections import BACKGROUND, GREEN_SHADES, RED_SHADES, reference_graph, synth_grid
+    from find_connections import analyze_grid, generate_name
+
+COLORS = [BACKGROUND] + GREEN_SHADES + RED_SHADES + [(0, 0, 0), (0, 0, 255)]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_synthetic_grid_matches_reference(seed):
+    rng = random.Random(seed)
+    w, h = rng.randint(1, 24), rng.randint(1, 24)
+    grid = synth_grid(w, h, rng.randint(0, 8), rng.uniform(0, 3), seed=seed, max_side=2)
+    assert analyze_grid(grid)[1] == reference_graph(grid)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_colour_grid_matches_reference(seed):
+    rng = random.Random(seed)
+    w, h = rng.randint(1, 24), rng.randint(1, 24)
+    grid = np.array([[rng.choice(COLORS) for _ in range(w)] for _ in range(h)], dtype=np.uint8)
+    assert analyze_grid(grid)[1] == reference_graph(grid)
+
+
+@pytest.mark.parametrize(
+    "n, name",
+    [(0, "A"), (25, "Z"), (26, "AA"), (27, "AB"), (701, "ZZ"), (702, "AAA"), (18277, "ZZZ"), (18278, "AAAA")],
+)
+def test_generate_name_boundaries(n, name):
+    assert generate_name(n) == name
+
+
+def test_generate_name_unique():
+    names = [generate_name(n) for n in range(20000)]
+    assert len(set(names)) == len(names)
@@ -1,48 +1,46 @@
+import argparse
 import os
 import torch
-from torchvision import datasets, transforms, models
+from torchvision import datasets, transforms
 from torch.utils.data import DataLoader
 from sklearn.metrics import confusion_matrix, classification_report
 from tqdm import tqdm
 
+from classifier import MODEL_PATH, add_model_args, autocast, build_model, pick_device, prepare_batch, resolve_precision
+from image_cache import IMG_SIZE
+
 DATASET_DIR = "dataset/splits"
-DEVICE = (
-    "mps"
-    if torch.backends.mps.is_available()
-    else "cuda"
-    if torch.cuda.is_available()
-    else "cpu"
-)
-MODEL_PATH = "symbol_classifier.pth"
+DEVICE = pick_device()
 
-IMAGENET_MEAN = [0.485, 0.456, 0.406]
-IMAGENET_STD = [0.229, 0.224, 0.225]
+parser = argparse.ArgumentParser(description="Classification report and confusion matrix on the test split.")
+add_model_args(parser)
+args = parser.parse_args()
+precision = resolve_precision(args.precision, DEVICE)
 
-print("Using device:", DEVICE)
+print("Using device:", DEVICE, f"({precision})")
 
+# Same pixels as training; normalization happens per batch in prepare_batch
 transform = transforms.Compose(
     [
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD),
+        transforms.Resize((IMG_SIZE, IMG_SIZE)),
+        transforms.PILToTensor(),
     ]
 )
 
 test_ds = datasets.ImageFolder(os.path.join(DATASET_DIR, "test"), transform)
 test_loader = DataLoader(test_ds, batch_size=32, shuffle=False)
 
-model = models.resnet18(weights=None)
-model.fc = torch.nn.Linear(model.fc.in_features, len(test_ds.classes))
-model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
-model.to(DEVICE)
+model = build_model(
+    len(test_ds.classes), DEVICE, weights_path=MODEL_PATH, channels_last=args.channels_last, compile=args.compile
+)
 model.eval()
 
 all_preds = []
 all_labels = []
 
-with torch.no_grad():
+with torch.no_grad(), autocast(DEVICE, precision):
     for imgs, labels in tqdm(test_loader, desc="Evaluating"):
-        imgs, labels = imgs.to(DEVICE), labels.to(DEVICE)
+        imgs, labels = prepare_batch(imgs, DEVICE, args.channels_last), labels.to(DEVICE)
 
         outputs = model(imgs)
         preds = outputs.argmax(dim=1)
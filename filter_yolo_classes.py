@@ -13,13 +13,34 @@ Notes:
 - By default, drops images that end up with zero boxes after filtering; use --keep-empty
   if you want to retain them as background-only images.
 - Avoids PyYAML dependency by parsing names from data.yaml manually.
+- Labels are read through the label index (label_index.py); the source is
+  left untouched unless --save-index persists it as <src>/.label_index.npz.
+- --link hardlink|symlink|reflink|auto makes the result a zero-copy view:
+  images are linked to the source, only the remapped labels are written,
+  and <dst>/view.json records the source (see yolo_views.py).
+- Image copies/links and label writes run on --workers threads (at most
+  --max-inflight outstanding), which hides per-file latency on network or
+  cloud-synced storage; results are consumed in order, so counts, shards
+  and manifests are the same as with --workers 1.
+- --shards DIR writes the result as tar shards + index (see yolo_shards.py)
+  instead of image/label folders under --dst.
 """
 
 import argparse
 import shutil
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+from label_index import LabelIndex, label_tokens, load_index
+from yolo_shards import SHARD_BYTES, ShardWriter
+from yolo_views import LINK_MODES, Linker, write_manifest
+
+IO_WORKERS = 8
+PROGRESS_SECONDS = 5.0
+
 
 def parse_args():
     ap = argparse.ArgumentParser()
@@ -39,8 +60,14 @@ def parse_args():
     ap.add_argument(
         "--clear",
         action="store_true",
-        help="Remove destination folder if it exists",
+        help="Remove the destination (--dst or --shards) folder if it exists",
     )
+    ap.add_argument("--workers", type=int, default=IO_WORKERS, help="I/O threads for image copies and label writes (1 = serial)")
+    ap.add_argument("--max-inflight", type=int, default=None, help="Outstanding file operations (default 4 x --workers)")
+    ap.add_argument("--link", choices=LINK_MODES, default="copy", help="How images reach --dst (non-copy modes make a view)")
+    ap.add_argument("--shards", type=str, default=None, help="Write tar shards here instead of --dst folders")
+    ap.add_argument("--save-index", action="store_true", help="Persist the label index as .label_index.npz in the source dataset root")
+    ap.add_argument("--shard-bytes", type=float, default=SHARD_BYTES, help="Target size of each tar shard")
     return ap.parse_args()
 
 
@@ -80,58 +107,143 @@ def ensure_dirs(dst: Path, splits: List[str], clear: bool):
         (dst / "labels" / split).mkdir(parents=True, exist_ok=True)
 
 
+def filter_lines(split: str, stem: str, index: LabelIndex, id_map: Dict[int, int]) -> List[str]:
+    """
+    Remapped label lines of labels/<split>/<stem>.txt, keeping only classes
+    in id_map. The index picks the rows; the kept rows' four box tokens
+    are copied from the file text unchanged.
+    """
+    fid = index.file_id(split, stem)
+    if fid < 0:
+        return []
+    classes = index.cls[index.rows(fid)].tolist()
+    if not any(c in id_map for c in classes):
+        return []
+    with open(index.label_path(fid), "r") as f:
+        tokens = label_tokens(f.read())
+    if len(tokens) != len(classes):
+        raise RuntimeError(f"{index.label_path(fid)} changed while filtering; run again")
+    return [
+        f"{id_map[old_cls]} " + " ".join(parts[1:5])
+        for old_cls, parts in zip(classes, tokens)
+        if old_cls in id_map
+    ]
+
+
+def write_sample(img_path: Path, new_lines: List[str], dst_img: Path, dst_lbl: Path, linker: Linker = None) -> int:
+    """Copy (or link) one image and write its filtered label; returns the image size in bytes."""
+    if linker is not None:
+        linker.place(img_path, dst_img / img_path.name)
+    else:
+        shutil.copy2(img_path, dst_img / img_path.name)
+    with open(dst_lbl / f"{img_path.stem}.txt", "w") as f:
+        for ln in new_lines:
+            f.write(ln + "\n")
+    return img_path.stat().st_size
+
+
+def _run_now(fn, *args) -> Future:
+    """Serial stand-in for pool.submit."""
+    fut = Future()
+    fut.set_result(fn(*args))
+    return fut
+
+
+class Progress:
+    """Periodic "[split] done/total" lines with image and byte throughput."""
+
+    def __init__(self, label: str, total: int, interval: float = PROGRESS_SECONDS):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.bytes = 0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, n_bytes: int):
+        self.done += 1
+        self.bytes += n_bytes
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            print(f"[{self.label}] {self.done}/{self.total} images {self.rate()}")
+
+    def rate(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return f"{self.done / elapsed:.1f} img/s, {self.bytes / elapsed / 1e6:.1f} MB/s"
+
+
 def copy_filtered(
     split: str,
     src_img: Path,
-    src_lbl: Path,
+    index: LabelIndex,
     dst_img: Path,
     dst_lbl: Path,
     id_map: Dict[int, int],
     keep_empty: bool,
+    writer: ShardWriter = None,
+    linker: Linker = None,
+    workers: int = 1,
+    max_inflight: int = None,
 ) -> Tuple[int, int]:
-    """Return (images_kept, boxes_kept)."""
+    """
+    Return (images_kept, boxes_kept). With `writer`, samples go into shards instead of dst_img/dst_lbl.
+
+    Labels are filtered up front from the index; the image copies/links and
+    label writes (or image reads for shards) then run on `workers` threads
+    with at most `max_inflight` outstanding. Results are consumed in image
+    order, so counts and shard contents match a serial run.
+    """
     if not src_img.exists():
         return 0, 0
 
-    kept_images = 0
-    kept_boxes = 0
-
     images = sorted(
         [p for p in src_img.iterdir() if p.suffix.lower() in [".png", ".jpg", ".jpeg"]]
     )
-
+    plan = []
     for img_path in images:
-        lbl_path = src_lbl / f"{img_path.stem}.txt"
-        new_lines = []
-
-        if lbl_path.exists():
-            with open(lbl_path, "r") as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) < 5:
-                        continue
-                    try:
-                        old_cls = int(parts[0])
-                    except ValueError:
-                        continue
-                    if old_cls not in id_map:
-                        continue
-                    new_cls = id_map[old_cls]
-                    coords = parts[1:5]
-                    new_lines.append(f"{new_cls} " + " ".join(coords))
-
-        if not new_lines and not keep_empty:
-            continue
-
-        # Copy image + write filtered label
-        shutil.copy2(img_path, dst_img / img_path.name)
-        with open(dst_lbl / f"{img_path.stem}.txt", "w") as f:
-            for ln in new_lines:
-                f.write(ln + "\n")
+        new_lines = filter_lines(split, img_path.stem, index, id_map)
+        if new_lines or keep_empty:
+            plan.append((img_path, new_lines))
+
+    progress = Progress(split, len(plan))
+    max_inflight = max_inflight or 4 * workers
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    submit = pool.submit if pool is not None else _run_now
+    pending = deque()
+    kept_images = 0
+    kept_boxes = 0
 
+    def finish():
+        nonlocal kept_images, kept_boxes
+        img_path, new_lines, fut = pending.popleft()
+        if writer is not None:
+            data = fut.result()
+            label_text = "".join(ln + "\n" for ln in new_lines)
+            writer.write(f"{split}/{img_path.stem}", data, img_path.suffix, label_text)
+            progress.update(len(data))
+        else:
+            progress.update(fut.result())
         kept_images += 1
         kept_boxes += len(new_lines)
 
+    try:
+        for img_path, new_lines in plan:
+            if writer is not None:
+                fut = submit(img_path.read_bytes)
+            else:
+                fut = submit(write_sample, img_path, new_lines, dst_img, dst_lbl, linker)
+            pending.append((img_path, new_lines, fut))
+            while len(pending) >= max_inflight:
+                finish()
+        while pending:
+            finish()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    if plan:
+        print(f"[{split}] {kept_images} images in {time.perf_counter() - progress.start:.2f}s ({progress.rate()})")
     return kept_images, kept_boxes
 
 
@@ -169,24 +281,40 @@ def main():
     id_map = {name_to_idx[c]: i for i, c in enumerate(args.classes)}
 
     splits = ["train", "val", "test"]
-    ensure_dirs(dst, splits, args.clear)
+    writer = None
+    linker = Linker(args.link)
+    if args.shards:
+        # Same existing-destination/--clear rule, so old shards never mix in
+        dst = Path(args.shards)
+        ensure_dirs(dst, [], args.clear)
+        writer = ShardWriter(dst, int(args.shard_bytes))
+    else:
+        ensure_dirs(dst, splits, args.clear)
+
+    index = load_index(src, save=args.save_index)
 
     total_images = 0
     total_boxes = 0
     for split in splits:
         src_img = src / "images" / split
-        src_lbl = src / "labels" / split
         dst_img = dst / "images" / split
         dst_lbl = dst / "labels" / split
 
         kept_i, kept_b = copy_filtered(
-            split, src_img, src_lbl, dst_img, dst_lbl, id_map, args.keep_empty
+            split, src_img, index, dst_img, dst_lbl, id_map, args.keep_empty, writer, linker,
+            args.workers, args.max_inflight,
         )
         total_images += kept_i
         total_boxes += kept_b
         print(f"[{split}] kept images={kept_i} boxes={kept_b}")
 
+    if writer is not None:
+        writer.close()
     write_data_yaml(dst, args.classes)
+    if writer is None and args.link != "copy":
+        params = {"classes": args.classes, "keep_empty": args.keep_empty}
+        write_manifest(dst, src, "filter_yolo_classes", params, linker)
+        print(f"View images: {linker.counts()}")
     print(f"[DONE] Wrote filtered dataset → {dst}")
     print(f"Total images: {total_images}, boxes: {total_boxes}")
 
@@ -1,11 +1,65 @@
+"""
+Generate synthetic single-line diagrams (YOLO images + labels) by pasting
+symbol PNGs from dataset/classes_9 onto blank canvases.
+
+Every image draws from its own RNG seeded from (--seed, image index), so the
+output of image N does not depend on which worker renders it, how many
+workers there are, or which other images were generated in the same run.
+That makes runs reproducible, resumable and shardable:
+
+Usage:
+    python generator.py                                  # 6000 images, all cores
+    python generator.py --num-images 20000 --seed 7 --workers 16
+    python generator.py --resume                         # fill in missing indices only
+    python generator.py --shard 0 4                      # indices with idx % 4 == 0
+    python generator.py --shards yolo_sld_shards         # ~1 GB tar shards, see yolo_shards.py
+
+Images and labels are written to temp files and renamed into place, so an
+interrupted run never leaves a half-written PNG for --resume to trust.
+
+Symbols go through a per-worker SpriteCache: each PNG is decoded and
+alpha-trimmed once, and resized+rotated variants are kept in a byte-bounded
+LRU keyed by (symbol, size, angle). Scales are drawn as before and
+snapped to SCALE_STEP, so with ROTATION_ANGLES fixed there are only a few
+hundred variants per symbol and most pastes are a dictionary lookup.
+
+Placement is collision-aware: a position is redrawn up to --place-attempts
+times until the candidate box's IoU with every symbol already pasted is at
+most --max-overlap; symbols that never fit are dropped instead of piling
+onto others. An OccupancyGrid of OCCUPANCY_CELL-pixel cells with a
+summed-area table tells in O(1) whether a candidate touches anything at
+all, so the exact box-by-box IoU runs only for candidates that do.
+
+Layout mode (--layout) draws wired single-line diagrams instead: horizontal
+buses with feeders hanging from them, each feeder a series chain of
+unrotated symbols joined by orthogonal wires between their top and bottom
+terminals, optionally tied down to the next bus. Next to the YOLO labels it
+writes ground truth to <out-labels>/../../truth/<split>/<idx>.json:
+
+    symbols      id, cls_id, name, bbox, center, terminals (pixels)
+    segments     every drawn wire/bus as x1, y1, x2, y2 (+ net), the same
+                 shape line_trace.py emits, so traced lines can be scored
+    nets         connected terminal sets ([symbol id, "top"|"bottom"], buses)
+    connections  symbol pairs sharing a net (the symbol-to-symbol netlist)
+
+    python generator.py --layout --num-images 2000 --buses 3 --feeders 6 --chain 3
+"""
+
+import argparse
+import io
+import json
+import math
 import os
 import random
-import json
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
 from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
 import numpy as np
 
+from yolo_shards import SHARD_BYTES, ShardWriter
+
 # -------------------------------------------------
 # CONFIG
 # -------------------------------------------------
@@ -18,42 +72,196 @@ MIN_SYMBOLS = 5
 MAX_SYMBOLS = 25
 CANVAS_SIZES = [(1024, 1024), (1280, 720), (720, 1280)]
 ROTATION_ANGLES = [-45, -30, -15, 0, 15, 30, 45]
+SCALE_RANGE = (0.4, 1.5)
+SCALE_STEP = 0.05     # sprite scales are snapped to this grid so variants can be cached
+SPRITE_CACHE_MB = 256 # per worker
+OCCUPANCY_CELL = 8    # pixels per occupancy-grid cell
+MAX_OVERLAP = 0.1     # max IoU of a new symbol's box with any pasted box
+PLACE_ATTEMPTS = 20   # positions tried per symbol before it is dropped
+LAYOUT_BUSES = 2      # layout mode: max buses per drawing
+LAYOUT_FEEDERS = 5    # layout mode: max feeders per bus
+LAYOUT_CHAIN = 3      # layout mode: max symbols in series on one feeder
+LAYOUT_TIE_PROB = 0.2 # layout mode: chance a feeder ends on the next bus down
 # Optional: up-weight rare classes (e.g., {"bus_tie_breaker": 3.0, "load_arrow": 2.0})
 CLASS_SAMPLING_WEIGHTS = None
+MASTER_SEED = 0
+CHUNK_SIZE = 16       # images per task sent to a worker
 
-# Ensure output dirs exist
-OUT_IMAGES.mkdir(parents=True, exist_ok=True)
-OUT_LABELS.mkdir(parents=True, exist_ok=True)
-
-# Load class map
-with open(CLASSES_JSON, "r") as f:
-    CLASS_MAP = json.load(f)
-
-CLASS_NAMES = list(CLASS_MAP.keys())
-CLASS_NAME_TO_ID = CLASS_MAP
 
 # -------------------------------------------------
-# Load all class images into memory
+# Symbol library
 # -------------------------------------------------
-print("[*] Scanning symbol images...")
-symbol_images = {}
-
-for class_name in CLASS_NAMES:
-    folder = CLASS_DIR / class_name
-    if folder.exists():
-        pngs = list(folder.glob("*.png"))
-        if pngs:
-            symbol_images[class_name] = pngs
+def load_class_map(classes_json=CLASSES_JSON):
+    with open(classes_json, "r") as f:
+        return json.load(f)
+
+
+def scan_symbols(class_dir: Path, class_names):
+    """Map class name -> sorted list of symbol PNGs (classes without files are skipped)."""
+    symbol_images = {}
+    for class_name in class_names:
+        folder = class_dir / class_name
+        if folder.exists():
+            # Sorted so a seed picks the same file on every filesystem
+            pngs = sorted(folder.glob("*.png"))
+            if pngs:
+                symbol_images[class_name] = pngs
+    return symbol_images
+
+
+class SymbolLibrary:
+    """Everything a worker needs to compose diagrams; cheap to pickle."""
+
+    def __init__(self, class_map, symbol_images, class_weights=CLASS_SAMPLING_WEIGHTS):
+        self.class_map = class_map
+        self.symbol_images = symbol_images
+        self.sample_classes = list(symbol_images.keys())
+        self.sample_weights = None
+        if class_weights:
+            self.sample_weights = [class_weights.get(cls, 1.0) for cls in self.sample_classes]
+
+    @classmethod
+    def from_dir(cls, classes_json=CLASSES_JSON, class_dir=CLASS_DIR, class_weights=CLASS_SAMPLING_WEIGHTS):
+        class_map = load_class_map(classes_json)
+        return cls(class_map, scan_symbols(Path(class_dir), list(class_map.keys())), class_weights)
+
+
+class SpriteCache:
+    """
+    Decoded, alpha-trimmed symbols plus an LRU of resized/rotated variants.
+
+    Base sprites are kept for the life of the cache (the library is small);
+    variants are evicted least-recently-used once they exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = SPRITE_CACHE_MB * 2**20):
+        self.max_bytes = max_bytes
+        self.bases = {}
+        self.variants = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def base(self, path: Path) -> Image.Image:
+        sprite = self.bases.get(path)
+        if sprite is None:
+            with Image.open(path) as img:
+                sprite = img.convert("RGBA")
+            bbox = sprite.getchannel("A").getbbox()
+            if bbox:
+                sprite = sprite.crop(bbox)
+            sprite.load()
+            self.bases[path] = sprite
+        return sprite
+
+    def variant(self, path: Path, size, angle) -> Image.Image:
+        """`path` resized to `size` (w, h) and rotated by `angle` (expanded)."""
+        key = (path, size, angle)
+        sprite = self.variants.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.variants.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        sprite = self.base(path).resize(size, Image.LANCZOS).rotate(angle, expand=True)
+        self.variants[key] = sprite
+        self.nbytes += sprite.width * sprite.height * 4
+        while self.nbytes > self.max_bytes and len(self.variants) > 1:
+            _, old = self.variants.popitem(last=False)
+            self.nbytes -= old.width * old.height * 4
+        return sprite
+
+
+def quantize_scale(scale: float) -> float:
+    return max(SCALE_STEP, round(scale / SCALE_STEP) * SCALE_STEP)
+
+
+class OccupancyGrid:
+    """
+    Pasted symbol boxes with a max-IoU query against them.
+
+    A coarse bitmap of cells with a summed-area table answers "does the
+    candidate touch any pasted box?" in O(1) (boxes are snapped outward to
+    cell boundaries, so contact is over-, never under-reported). Only
+    candidates that do are compared with the pasted boxes exactly.
+    """
+
+    def __init__(self, width: int, height: int, cell: int = OCCUPANCY_CELL):
+        self.cell = cell
+        self.occupied = np.zeros((math.ceil(height / cell), math.ceil(width / cell)), dtype=np.int32)
+        self.integral = np.zeros((self.occupied.shape[0] + 1, self.occupied.shape[1] + 1), dtype=np.int32)
+        self.boxes = np.zeros((0, 4), dtype=np.int64)  # x1, y1, x2, y2 in pixels
+
+    def _cells(self, x: int, y: int, w: int, h: int):
+        c = self.cell
+        return y // c, -(-(y + h) // c), x // c, -(-(x + w) // c)
+
+    def touches(self, x: int, y: int, w: int, h: int) -> bool:
+        y1, y2, x1, x2 = self._cells(x, y, w, h)
+        s = self.integral
+        return s[y2, x2] - s[y1, x2] - s[y2, x1] + s[y1, x1] > 0
+
+    def max_iou(self, x: int, y: int, w: int, h: int) -> float:
+        """Largest IoU of the box with any pasted box (0 when it touches none)."""
+        if not self.touches(x, y, w, h):
+            return 0.0
+        b = self.boxes
+        iw = np.clip(np.minimum(x + w, b[:, 2]) - np.maximum(x, b[:, 0]), 0, None)
+        ih = np.clip(np.minimum(y + h, b[:, 3]) - np.maximum(y, b[:, 1]), 0, None)
+        inter = iw * ih
+        union = w * h + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - inter
+        return float((inter / union).max())
+
+    def add(self, x: int, y: int, w: int, h: int):
+        y1, y2, x1, x2 = self._cells(x, y, w, h)
+        block = self.occupied[y1:y2, x1:x2]
+        # Only the table entries below/right of the box change: add the
+        # running sums of the newly covered cells there
+        delta = (1 - block).cumsum(axis=0).cumsum(axis=1)
+        block[:] = 1
+        bh, bw = delta.shape
+        region = self.integral[y1 + 1 :, x1 + 1 :]
+        region[:bh, :bw] += delta
+        region[bh:, :bw] += delta[-1]
+        region[:bh, bw:] += delta[:, -1:]
+        region[bh:, bw:] += delta[-1, -1]
+        self.boxes = np.vstack([self.boxes, [[x, y, x + w, y + h]]])
+
+
+class Placement(NamedTuple):
+    max_overlap: float = MAX_OVERLAP
+    attempts: int = PLACE_ATTEMPTS
+    cell: int = OCCUPANCY_CELL
+
+
+def place_symbol(rng: random.Random, occupancy: OccupancyGrid, max_x: int, max_y: int, w: int, h: int, placement: Placement):
+    """Top-left corner for a w x h symbol within the attempt budget, or None."""
+    for _ in range(placement.attempts):
+        x = rng.randint(0, max_x)
+        y = rng.randint(0, max_y)
+        if occupancy.max_iou(x, y, w, h) <= placement.max_overlap:
+            occupancy.add(x, y, w, h)
+            return x, y
+    return None
+
+
+class Layout(NamedTuple):
+    buses: int = LAYOUT_BUSES
+    feeders: int = LAYOUT_FEEDERS
+    chain: int = LAYOUT_CHAIN
+    tie_prob: float = LAYOUT_TIE_PROB
+
+
+def image_seed(master_seed: int, idx: int, epoch: int = 0) -> int:
+    """
+    Independent, stable seed for image `idx` of a run seeded with `master_seed`.
+
+    Epoch 0 is the on-disk dataset; later epochs (streaming) get fresh images.
+    """
+    key = (idx,) if epoch == 0 else (idx, epoch)
+    return int(np.random.SeedSequence(master_seed, spawn_key=key).generate_state(1)[0])
 
-print(f"[OK] Loaded {len(symbol_images)} symbol classes")
-
-# Precompute class list + weights for sampling
-sample_classes = list(symbol_images.keys())
-sample_weights = None
-if CLASS_SAMPLING_WEIGHTS:
-    sample_weights = [CLASS_SAMPLING_WEIGHTS.get(cls, 1.0) for cls in sample_classes]
-
-usage_counts = Counter()
 
 # -------------------------------------------------
 # Helper: paste symbol and return bounding box
@@ -71,40 +279,46 @@ def paste_symbol(canvas, symbol_img, x, y, angle):
 # -------------------------------------------------
 # Helper: random line noise
 # -------------------------------------------------
-def add_random_lines(draw, width, height, count=5):
+def add_random_lines(draw, width, height, count=5, rng=random):
     for _ in range(count):
-        x1, y1 = random.randint(0, width), random.randint(0, height)
-        x2, y2 = random.randint(0, width), random.randint(0, height)
+        x1, y1 = rng.randint(0, width), rng.randint(0, height)
+        x2, y2 = rng.randint(0, width), rng.randint(0, height)
         draw.line([(x1, y1), (x2, y2)],
                   fill=(0,0,0),
-                  width=random.randint(1, 3))
+                  width=rng.randint(1, 3))
 
 # -------------------------------------------------
-# MAIN synthetic generation
+# One synthetic diagram
 # -------------------------------------------------
-print(f"[*] Generating {NUM_IMAGES} synthetic diagrams...")
+def compose_diagram(rng: random.Random, library: SymbolLibrary, sprites: SpriteCache = None, placement: Placement = Placement()):
+    """
+    Draw one diagram using only `rng` for randomness.
 
-for idx in range(NUM_IMAGES):
+    Returns (RGB canvas, YOLO label rows, Counter of pasted classes).
+    """
+    if sprites is None:
+        sprites = SpriteCache()
 
-    W, H = random.choice(CANVAS_SIZES)
+    W, H = rng.choice(CANVAS_SIZES)
     canvas = Image.new("RGBA", (W, H), (255, 255, 255, 255))
     draw = ImageDraw.Draw(canvas)
+    occupancy = OccupancyGrid(W, H, placement.cell)
 
-    num_symbols = random.randint(MIN_SYMBOLS, MAX_SYMBOLS)
+    num_symbols = rng.randint(MIN_SYMBOLS, MAX_SYMBOLS)
     labels = []
+    usage = Counter()
 
-    chosen_classes = random.choices(sample_classes, weights=sample_weights, k=num_symbols)
+    chosen_classes = rng.choices(library.sample_classes, weights=library.sample_weights, k=num_symbols)
 
     for cls in chosen_classes:
-        symbol_path = random.choice(symbol_images[cls])
-        symbol_img = Image.open(symbol_path).convert("RGBA")
-        usage_counts[cls] += 1
+        symbol_path = rng.choice(library.symbol_images[cls])
+        symbol_img = sprites.base(symbol_path)
 
         # ------------------------------
         # SAFE RESIZE BLOCK (Fixes crash)
         # ------------------------------
-        # initial random scale
-        scale = random.uniform(0.4, 1.5)
+        # initial random scale, snapped so the variant can come from the cache
+        scale = quantize_scale(rng.uniform(*SCALE_RANGE))
         new_w = int(symbol_img.width * scale)
         new_h = int(symbol_img.height * scale)
 
@@ -118,11 +332,9 @@ for idx in range(NUM_IMAGES):
         if new_w <= 0 or new_h <= 0:
             continue
 
-        symbol_img = symbol_img.resize((new_w, new_h), Image.LANCZOS)
-
-        # rotation
-        angle = random.choice(ROTATION_ANGLES)
-        rotated = symbol_img.rotate(angle, expand=True)
+        # resize + rotation (cached per (symbol, size, angle))
+        angle = rng.choice(ROTATION_ANGLES)
+        rotated = sprites.variant(symbol_path, (new_w, new_h), angle)
 
         rw, rh = rotated.size
 
@@ -139,17 +351,20 @@ for idx in range(NUM_IMAGES):
         if max_x <= 0 or max_y <= 0:
             continue
 
-        x = random.randint(0, max_x)
-        y = random.randint(0, max_y)
+        spot = place_symbol(rng, occupancy, max_x, max_y, rw, rh, placement)
+        if spot is None:
+            continue
+        x, y = spot
 
         # paste & compute bbox
         canvas.paste(rotated, (x, y), rotated)
+        usage[cls] += 1
 
         cx = x + rw / 2
         cy = y + rh / 2
 
         labels.append((
-            CLASS_NAME_TO_ID[cls],
+            library.class_map[cls],
             cx / W,
             cy / H,
             rw / W,
@@ -157,29 +372,367 @@ for idx in range(NUM_IMAGES):
         ))
 
     # background noise
-    add_random_lines(draw, W, H, count=random.randint(1, 8))
+    add_random_lines(draw, W, H, count=rng.randint(1, 8), rng=rng)
 
     # enhancements
     canvas = canvas.convert("RGB")
-    canvas = ImageEnhance.Contrast(canvas).enhance(random.uniform(0.9, 1.1))
-    canvas = canvas.filter(ImageFilter.GaussianBlur(random.uniform(0, 1.0)))
+    canvas = ImageEnhance.Contrast(canvas).enhance(rng.uniform(0.9, 1.1))
+    canvas = canvas.filter(ImageFilter.GaussianBlur(rng.uniform(0, 1.0)))
+
+    return canvas, labels, usage
+
 
-    # save
-    img_path = OUT_IMAGES / f"{idx:05}.png"
-    canvas.save(img_path, "PNG")
+# -------------------------------------------------
+# Layout mode: buses, feeders and wiring with ground truth
+# -------------------------------------------------
+def orthogonal_route(p, q):
+    """Wire from p down to q: straight if aligned, else a vertical-horizontal-vertical jog."""
+    (x1, y1), (x2, y2) = p, q
+    if x1 == x2:
+        return [(x1, y1, x2, y2)]
+    ym = (y1 + y2) // 2
+    return [(x1, y1, x1, ym), (x1, ym, x2, ym), (x2, ym, x2, y2)]
+
+
+def compose_layout(rng: random.Random, library: SymbolLibrary, sprites: SpriteCache = None, layout: Layout = Layout()):
+    """
+    Draw one wired diagram using only `rng` for randomness.
+
+    Returns (RGB canvas, YOLO label rows, Counter of pasted classes, truth dict).
+    """
+    if sprites is None:
+        sprites = SpriteCache()
+
+    W, H = rng.choice(CANVAS_SIZES)
+    canvas = Image.new("RGBA", (W, H), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(canvas)
+    margin = int(0.05 * min(W, H))
+    wire_w = rng.randint(2, 3)
+
+    n_buses = rng.randint(1, layout.buses)
+    band_h = (H - 2 * margin) / n_buses
+    bus_y = [int(margin + b * band_h + 0.1 * band_h) for b in range(n_buses)]
 
-    # labels
-    txt_path = OUT_LABELS / f"{idx:05}.txt"
-    with open(txt_path, "w") as f:
-        for row in labels:
-            f.write(" ".join(str(x) for x in row) + "\n")
+    # Union-find over pins: ("bus", b) and (symbol id, 0=top / 1=bottom)
+    parent = {}
 
-    if idx % 100 == 0:
-        print(f"[{idx}/{NUM_IMAGES}]")
+    def find(pin):
+        parent.setdefault(pin, pin)
+        while parent[pin] != pin:
+            parent[pin] = parent[parent[pin]]
+            pin = parent[pin]
+        return pin
 
-print("[DONE] Synthetic dataset generated!")
+    def union(a, b):
+        parent[find(a)] = find(b)
 
-# Simple histogram to verify sampling biases
-print("\nClass usage histogram (symbols pasted):")
-for cls in sorted(usage_counts.keys()):
-    print(f"  {cls:20s} {usage_counts[cls]}")
+    wires = []  # (x1, y1, x2, y2, pin on that net)
+    for b, y in enumerate(bus_y):
+        wires.append((margin, y, W - margin, y, ("bus", b)))
+        find(("bus", b))
+
+    symbols = []
+    sprites_to_paste = []
+    labels = []
+    usage = Counter()
+
+    for b in range(n_buses):
+        y_top = bus_y[b]
+        y_bottom = bus_y[b + 1] if b + 1 < n_buses else H - margin
+        n_feeders = rng.randint(1, layout.feeders)
+        slot_w = (W - 2 * margin) / n_feeders
+
+        for f in range(n_feeders):
+            slot_cx = margin + (f + 0.5) * slot_w
+            chain = rng.randint(1, layout.chain)
+            tie = b + 1 < n_buses and rng.random() < layout.tie_prob
+            cell_h = (y_bottom - y_top) / (chain + 1)
+
+            prev_pin = ("bus", b)
+            prev_pt = None
+            for k in range(chain):
+                cls = rng.choices(library.sample_classes, weights=library.sample_weights, k=1)[0]
+                symbol_path = rng.choice(library.symbol_images[cls])
+                base = sprites.base(symbol_path)
+
+                # Random scale as in compose_diagram, capped to the feeder's slot
+                scale = quantize_scale(rng.uniform(*SCALE_RANGE))
+                scale = min(scale, 0.6 * slot_w / base.width, 0.7 * cell_h / base.height)
+                w, h = int(base.width * scale), int(base.height * scale)
+                if w < 4 or h < 4:
+                    break
+
+                cx = int(slot_cx + rng.uniform(-0.15, 0.15) * slot_w)
+                cy = int(y_top + (k + 1) * cell_h)
+                x0, y0 = cx - w // 2, cy - h // 2
+                sprite = sprites.variant(symbol_path, (w, h), 0)
+                sprites_to_paste.append((sprite, x0, y0))
+
+                sid = len(symbols)
+                top, bottom = (cx, y0), (cx, y0 + h)
+                symbols.append({
+                    "id": sid,
+                    "cls_id": library.class_map[cls],
+                    "name": cls,
+                    "bbox": [x0, y0, x0 + w, y0 + h],
+                    "center": [x0 + w / 2, y0 + h / 2],
+                    "terminals": [list(top), list(bottom)],
+                })
+                labels.append((library.class_map[cls], (x0 + w / 2) / W, (y0 + h / 2) / H, w / W, h / H))
+                usage[cls] += 1
+
+                start = (cx, y_top) if prev_pt is None else prev_pt
+                for seg in orthogonal_route(start, top):
+                    wires.append((*seg, prev_pin))
+                union(prev_pin, (sid, 0))
+                find((sid, 1))
+                prev_pin, prev_pt = (sid, 1), bottom
+
+            if tie and prev_pt is not None:
+                wires.append((prev_pt[0], prev_pt[1], prev_pt[0], bus_y[b + 1], prev_pin))
+                union(prev_pin, ("bus", b + 1))
+
+    for x1, y1, x2, y2, _ in wires:
+        draw.line([(x1, y1), (x2, y2)], fill=(0, 0, 0), width=wire_w)
+    for sprite, x0, y0 in sprites_to_paste:
+        canvas.paste(sprite, (x0, y0), sprite)
+
+    # Nets: every connected pin group that joins at least two things
+    groups = {}
+    for pin in parent:
+        groups.setdefault(find(pin), []).append(pin)
+    net_of = {}
+    nets = []
+    for root, pins in groups.items():
+        if len(pins) < 2:
+            continue
+        net_of[root] = len(nets)
+        nets.append({
+            "id": len(nets),
+            "buses": sorted(p[1] for p in pins if p[0] == "bus"),
+            "pins": sorted([p[0], "top" if p[1] == 0 else "bottom"] for p in pins if p[0] != "bus"),
+        })
+
+    connections = set()
+    for net in nets:
+        ids = sorted({sid for sid, _ in net["pins"]})
+        for i, a in enumerate(ids):
+            for c in ids[i + 1 :]:
+                connections.add((a, c))
+
+    segments = [
+        {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "length": abs(x2 - x1) + abs(y2 - y1), "net": net_of.get(find(pin))}
+        for x1, y1, x2, y2, pin in wires
+    ]
+    truth = {
+        "width": W,
+        "height": H,
+        "symbols": symbols,
+        "segments": segments,
+        "nets": nets,
+        "connections": [list(pair) for pair in sorted(connections)],
+    }
+
+    # enhancements (no noise lines: every stroke in a layout is ground truth)
+    canvas = canvas.convert("RGB")
+    canvas = ImageEnhance.Contrast(canvas).enhance(rng.uniform(0.9, 1.1))
+    canvas = canvas.filter(ImageFilter.GaussianBlur(rng.uniform(0, 1.0)))
+
+    return canvas, labels, usage, truth
+
+
+def render_sample(idx: int, master_seed: int, library: SymbolLibrary, sprites: SpriteCache = None, placement: Placement = Placement(), layout: Layout = None):
+    """(canvas, labels, usage, truth) for image `idx`; truth is None outside layout mode."""
+    rng = random.Random(image_seed(master_seed, idx))
+    if layout is not None:
+        return compose_layout(rng, library, sprites, layout)
+    return (*compose_diagram(rng, library, sprites, placement), None)
+
+
+def truth_path(idx: int, out_labels: Path) -> Path:
+    """yolo_sld/labels/train -> yolo_sld/truth/train/<idx>.json"""
+    return out_labels.parent.parent / "truth" / out_labels.name / f"{idx:05}.json"
+
+
+def write_truth(truth: dict, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(truth, f)
+    os.replace(tmp, path)
+
+
+def output_paths(idx: int, out_images: Path, out_labels: Path):
+    return out_images / f"{idx:05}.png", out_labels / f"{idx:05}.txt"
+
+
+def format_labels(labels) -> str:
+    return "".join(" ".join(str(x) for x in row) + "\n" for row in labels)
+
+
+def encode_sample(canvas, labels):
+    """(PNG bytes, label text) for writing into a shard."""
+    buf = io.BytesIO()
+    canvas.save(buf, "PNG")
+    return buf.getvalue(), format_labels(labels)
+
+
+def write_sample(canvas, labels, img_path: Path, txt_path: Path):
+    """Write label then image via temp files, so a present PNG implies a complete sample."""
+    tmp_txt = txt_path.with_name(txt_path.name + ".tmp")
+    with open(tmp_txt, "w") as f:
+        f.write(format_labels(labels))
+    os.replace(tmp_txt, txt_path)
+
+    tmp_img = img_path.with_name(img_path.name + ".tmp")
+    canvas.save(tmp_img, "PNG")
+    os.replace(tmp_img, img_path)
+
+
+def generate_one(idx: int, library: SymbolLibrary, master_seed: int, out_images: Path, out_labels: Path, sprites: SpriteCache = None, placement: Placement = Placement(), layout: Layout = None) -> Counter:
+    canvas, labels, usage, truth = render_sample(idx, master_seed, library, sprites, placement, layout)
+    if truth is not None:
+        write_truth(truth, truth_path(idx, out_labels))
+    write_sample(canvas, labels, *output_paths(idx, out_images, out_labels))
+    return usage
+
+
+# -------------------------------------------------
+# Worker pool plumbing: the library is sent once per worker, not per task,
+# and each worker keeps its own sprite cache across tasks
+# -------------------------------------------------
+_WORKER_LIBRARY = None
+_WORKER_SPRITES = None
+
+
+def _init_worker(library: SymbolLibrary, sprite_cache_mb: int = SPRITE_CACHE_MB):
+    global _WORKER_LIBRARY, _WORKER_SPRITES
+    _WORKER_LIBRARY = library
+    _WORKER_SPRITES = SpriteCache(sprite_cache_mb * 2**20)
+
+
+def generate_chunk(indices, master_seed: int, out_images: Path, out_labels: Path, placement: Placement = Placement(), to_shards: bool = False, layout: Layout = None):
+    """
+    Render `indices` and return (usage Counter, samples). Samples are
+    (idx, png_bytes, label_text) for the parent to write into shards when
+    `to_shards` is set; otherwise images are written here and samples is empty.
+    Layout ground truth is always written here as small JSON files.
+    """
+    usage = Counter()
+    samples = []
+    for idx in indices:
+        if to_shards:
+            canvas, labels, used, truth = render_sample(idx, master_seed, _WORKER_LIBRARY, _WORKER_SPRITES, placement, layout)
+            if truth is not None:
+                write_truth(truth, truth_path(idx, out_labels))
+            samples.append((idx, *encode_sample(canvas, labels)))
+        else:
+            used = generate_one(idx, _WORKER_LIBRARY, master_seed, out_images, out_labels, _WORKER_SPRITES, placement, layout)
+        usage.update(used)
+    return usage, samples
+
+
+def pending_indices(indices, out_images: Path, out_labels: Path):
+    """Indices whose image or label file is missing."""
+    pending = []
+    for idx in indices:
+        img_path, txt_path = output_paths(idx, out_images, out_labels)
+        if not (img_path.exists() and txt_path.exists()):
+            pending.append(idx)
+    return pending
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Generate synthetic YOLO diagrams from symbol PNGs.")
+    ap.add_argument("--num-images", type=int, default=NUM_IMAGES, help="Total images in the dataset (indices 0..N-1)")
+    ap.add_argument("--seed", type=int, default=MASTER_SEED, help="Master seed; image N always gets the same sub-seed")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (1 = run in-process)")
+    ap.add_argument("--resume", action="store_true", help="Skip indices whose image and label already exist")
+    ap.add_argument("--shard", nargs=2, type=int, default=None, metavar=("K", "N"), help="Only generate indices with idx %% N == K")
+    ap.add_argument("--sprite-cache-mb", type=int, default=SPRITE_CACHE_MB, help="Per-worker budget for cached symbol variants")
+    ap.add_argument("--max-overlap", type=float, default=MAX_OVERLAP, help="Max IoU of a new symbol's box with any pasted box (1 = no collision check)")
+    ap.add_argument("--place-attempts", type=int, default=PLACE_ATTEMPTS, help="Positions tried per symbol before dropping it")
+    ap.add_argument("--layout", action="store_true", help="Draw buses/feeders with wiring and write ground-truth JSON")
+    ap.add_argument("--buses", type=int, default=LAYOUT_BUSES, help="Layout mode: max buses per drawing")
+    ap.add_argument("--feeders", type=int, default=LAYOUT_FEEDERS, help="Layout mode: max feeders per bus")
+    ap.add_argument("--chain", type=int, default=LAYOUT_CHAIN, help="Layout mode: max symbols in series per feeder")
+    ap.add_argument("--tie-prob", type=float, default=LAYOUT_TIE_PROB, help="Layout mode: chance a feeder ties to the next bus")
+    ap.add_argument("--classes-json", default=CLASSES_JSON, help="Class name -> id map")
+    ap.add_argument("--class-dir", default=str(CLASS_DIR), help="Folder with one subfolder of PNGs per class")
+    ap.add_argument("--out-images", default=str(OUT_IMAGES), help="Output image folder")
+    ap.add_argument("--out-labels", default=str(OUT_LABELS), help="Output label folder")
+    ap.add_argument("--shards", default=None, help="Write tar shards here instead of image/label files (keys <split>/<idx>)")
+    ap.add_argument("--shard-bytes", type=float, default=SHARD_BYTES, help="Target size of each tar shard")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    out_images = Path(args.out_images)
+    out_labels = Path(args.out_labels)
+    if args.shards and args.resume:
+        raise SystemExit("--resume works on image/label folders, not --shards")
+    if not args.shards:
+        out_images.mkdir(parents=True, exist_ok=True)
+        out_labels.mkdir(parents=True, exist_ok=True)
+
+    print("[*] Scanning symbol images...")
+    library = SymbolLibrary.from_dir(args.classes_json, args.class_dir)
+    print(f"[OK] Loaded {len(library.symbol_images)} symbol classes")
+
+    indices = list(range(args.num_images))
+    if args.shard:
+        k, n = args.shard
+        indices = indices[k::n]
+    if args.resume:
+        todo = pending_indices(indices, out_images, out_labels)
+        print(f"[*] Resuming: {len(indices) - len(todo)} of {len(indices)} images already on disk")
+        indices = todo
+
+    print(f"[*] Generating {len(indices)} synthetic diagrams with {args.workers} workers...")
+    placement = Placement(args.max_overlap, args.place_attempts)
+    layout = Layout(args.buses, args.feeders, args.chain, args.tie_prob) if args.layout else None
+    chunks = [indices[i : i + CHUNK_SIZE] for i in range(0, len(indices), CHUNK_SIZE)]
+    usage_counts = Counter()
+    done = 0
+
+    pool = None
+    if args.workers > 1:
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(library, args.sprite_cache_mb))
+        mapper = pool.map
+    else:
+        _init_worker(library, args.sprite_cache_mb)
+        mapper = map
+
+    # Shard keys use the split folder name, e.g. "train/00042"
+    writer = ShardWriter(args.shards, int(args.shard_bytes)) if args.shards else None
+    to_shards = writer is not None
+
+    try:
+        n = len(chunks)
+        results = mapper(generate_chunk, chunks, [args.seed] * n, [out_images] * n, [out_labels] * n, [placement] * n, [to_shards] * n, [layout] * n)
+        for chunk, (usage, samples) in zip(chunks, results):
+            usage_counts.update(usage)
+            for idx, png, label_text in samples:
+                writer.write(f"{out_images.name}/{idx:05}", png, ".png", label_text)
+            done += len(chunk)
+            if done % 100 < len(chunk) or done == len(indices):
+                print(f"[{done}/{len(indices)}]")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if writer is not None:
+            writer.close()
+
+    print("[DONE] Synthetic dataset generated!")
+    if indices:
+        print(f"Symbols per image: {sum(usage_counts.values()) / len(indices):.1f}")
+
+    # Simple histogram to verify sampling biases
+    print("\nClass usage histogram (symbols pasted this run):")
+    for cls in sorted(usage_counts.keys()):
+        print(f"  {cls:20s} {usage_counts[cls]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Preprocessed, memory-mapped image cache for the ResNet-18 symbol classifier.
+
+train_model.py used to decode every PNG and resize it to 224x224 on every
+epoch. build_cache() does that once per split (across --workers processes)
+and stores the result next to the splits:
+
+    <cache>/<split>.npy          (N, 3, 224, 224) uint8, CHW, opened with mmap
+    <cache>/<split>.labels.npy   (N,) int64 class index
+    <cache>/<split>.json         classes, size and every source file's mtime/size
+
+Images are listed, decoded (RGB) and resized (bilinear) exactly like
+torchvision's ImageFolder + Resize((224, 224)), so the cached pixels are the
+ones the old transform produced before ToTensor. A split is rebuilt only when
+its file list, a file's mtime/size or the image size changes.
+
+CachedImageFolder serves uint8 tensors from the memmap; normalize_batch()
+converts a whole batch to normalized float on the training device.
+
+Usage (build or refresh the cache ahead of training):
+    python image_cache.py dataset/splits --cache dataset/cache --workers 8
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    import torch
+    from torch.utils.data import Dataset
+except ImportError:  # building the cache only needs NumPy and PIL
+    torch = None
+    Dataset = object
+
+CACHE_DIR = "dataset/cache"
+IMG_SIZE = 224
+SPLITS = ["train", "val", "test"]
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+# torchvision.datasets.folder.IMG_EXTENSIONS
+IMG_EXTENSIONS = (".jpg", ".jpeg", ".png", ".ppm", ".bmp", ".pgm", ".tif", ".tiff", ".webp")
+CHUNK = 64  # images decoded per task
+
+
+def scan_folder(split_dir: Path) -> Tuple[List[str], List[Tuple[str, int]]]:
+    """Classes and (path, class index) samples in ImageFolder order."""
+    classes = sorted(entry.name for entry in os.scandir(split_dir) if entry.is_dir())
+    samples = []
+    for idx, name in enumerate(classes):
+        for root, _, fnames in sorted(os.walk(split_dir / name, followlinks=True)):
+            for fname in sorted(fnames):
+                if fname.lower().endswith(IMG_EXTENSIONS):
+                    samples.append((os.path.join(root, fname), idx))
+    return classes, samples
+
+
+def load_resized(path: str, size: int = IMG_SIZE) -> np.ndarray:
+    """(3, size, size) uint8, as ImageFolder's loader + Resize((size, size)) produce it."""
+    with open(path, "rb") as f:
+        img = Image.open(f).convert("RGB")
+    img = img.resize((size, size), Image.BILINEAR)
+    return np.asarray(img).transpose(2, 0, 1)
+
+
+def _fill_chunk(out_path: str, start: int, paths: List[str], size: int) -> int:
+    images = np.load(out_path, mmap_mode="r+")
+    for i, path in enumerate(paths):
+        images[start + i] = load_resized(path, size)
+    images.flush()
+    return len(paths)
+
+
+def _file_stats(samples) -> List[List]:
+    stats = []
+    for path, label in samples:
+        st = os.stat(path)
+        stats.append([path, label, st.st_mtime_ns, st.st_size])
+    return stats
+
+
+def build_cache(split_dir, cache_dir, split: str, size: int = IMG_SIZE, workers: int = 1, verbose: bool = True) -> Path:
+    """Create or refresh <cache_dir>/<split>.npy from <split_dir>; returns the array path."""
+    split_dir, cache_dir = Path(split_dir), Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    out_path = cache_dir / f"{split}.npy"
+    meta_path = cache_dir / f"{split}.json"
+
+    classes, samples = scan_folder(split_dir)
+    meta = {"version": 1, "size": size, "classes": classes, "files": _file_stats(samples)}
+    if out_path.exists() and meta_path.exists():
+        with open(meta_path, "r") as f:
+            if json.load(f) == meta:
+                return out_path
+
+    start = time.perf_counter()
+    tmp = cache_dir / f"{split}.tmp.npy"
+    images = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.uint8, shape=(len(samples), 3, size, size))
+    del images  # workers reopen it; only the header had to exist
+
+    paths = [path for path, _ in samples]
+    chunks = [(i, paths[i : i + CHUNK]) for i in range(0, len(paths), CHUNK)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = [pool.submit(_fill_chunk, str(tmp), i, chunk, size) for i, chunk in chunks]
+            for fut in futures:
+                fut.result()
+    else:
+        for i, chunk in chunks:
+            _fill_chunk(str(tmp), i, chunk, size)
+
+    os.replace(tmp, out_path)
+    np.save(cache_dir / f"{split}.labels.npy", np.array([label for _, label in samples], dtype=np.int64))
+    # Metadata goes last: its presence marks the cache as complete
+    meta_tmp = cache_dir / f"{split}.json.tmp"
+    with open(meta_tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_tmp, meta_path)
+    if verbose:
+        print(f"[CACHE] {split}: {len(samples)} images → {out_path} in {time.perf_counter() - start:.1f}s")
+    return out_path
+
+
+class CachedImageFolder(Dataset):
+    """
+    Map-style dataset over a cached split: (uint8 (3, H, W) tensor, class index).
+
+    Has ImageFolder's `classes` and `targets`. The memmap is opened lazily
+    in each process, so DataLoader workers share the page cache instead of
+    copying the array.
+    """
+
+    def __init__(self, cache_dir, split: str):
+        cache_dir = Path(cache_dir)
+        with open(cache_dir / f"{split}.json", "r") as f:
+            meta = json.load(f)
+        self.path = cache_dir / f"{split}.npy"
+        self.classes = meta["classes"]
+        self.class_to_idx = {name: i for i, name in enumerate(self.classes)}
+        self.targets = np.load(cache_dir / f"{split}.labels.npy")
+        self._images = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx: int):
+        if self._images is None:
+            self._images = np.load(self.path, mmap_mode="r")
+        return torch.from_numpy(np.array(self._images[idx])), int(self.targets[idx])
+
+
+_stats = {}
+
+
+def normalize_batch(imgs, device):
+    """uint8 (B, 3, H, W) batch -> ImageNet-normalized float32 on `device`, in one pass."""
+    if device not in _stats:
+        mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1) * 255
+        std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1) * 255
+        _stats[device] = (mean, std)
+    mean, std = _stats[device]
+    imgs = imgs.to(device, non_blocking=True).float()
+    return imgs.sub_(mean).div_(std)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build the preprocessed image cache for train_model.py.")
+    ap.add_argument("splits_dir", nargs="?", default="dataset/splits", help="Folder with train/val/test ImageFolder splits")
+    ap.add_argument("--cache", default=CACHE_DIR, help="Cache directory")
+    ap.add_argument("--size", type=int, default=IMG_SIZE, help="Square image size")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="Decode processes (1 = in-process)")
+    args = ap.parse_args()
+
+    for split in SPLITS:
+        split_dir = Path(args.splits_dir) / split
+        if not split_dir.is_dir():
+            print(f"[WARN] Missing split folder: {split_dir}")
+            continue
+        path = build_cache(split_dir, args.cache, split, args.size, args.workers)
+        images = np.load(path, mmap_mode="r")
+        print(f"{split:5s}: {images.shape[0]:6d} images, {images.nbytes / 1e6:.1f} MB")
+    print(f"[DONE] Cache at {args.cache}")
+
+
+if __name__ == "__main__":
+    main()
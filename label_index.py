@@ -0,0 +1,333 @@
+"""
+Columnar index of a YOLO dataset's label files.
+
+Every tool used to re-open and re-parse each labels/<split>/*.txt line by
+line. LabelIndex parses them once into flat NumPy columns and keeps them in
+<root>/.label_index.npz together with each file's mtime and size:
+
+    files     (F,)   "train/abc.txt" paths relative to <root>/labels
+    mtimes    (F,)   st_mtime_ns        sizes (F,) st_size
+    offsets   (F+1,) rows of file f are offsets[f]:offsets[f + 1]
+    image_id  (N,)   file index of every box
+    cls       (N,)   int32 class id
+    cx cy w h (N,)   float64 YOLO coordinates (exact parsed values)
+    conf      (N,)   float32 confidence, NaN when the line has none
+
+load_index() stats the label folders and reparses only files whose mtime
+or size changed; files moved between splits (same name, size and mtime)
+reuse their rows. Malformed lines (fewer than 5 fields, non-numeric
+values) are skipped, as the tools did before. Large (re)parses are spread
+over worker processes in chunks of PARSE_CHUNK files.
+
+Only this script writes the index file by default. Tools that merely read
+the dataset (analyze_yolo_labels.py, filter_yolo_classes.py,
+split_yolo_dataset.py, tile_yolo_images.py) keep it in memory unless given
+--save-index, so they never modify the source root on their own. Saves go
+through a unique temp file, so concurrent writers cannot clobber each
+other's half-written index.
+
+Usage (build or refresh, then summarize):
+    python label_index.py yolo_sld
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+INDEX_NAME = ".label_index.npz"
+INDEX_VERSION = 1
+SPLITS = ["train", "val", "test"]
+PARSE_CHUNK = 512  # label files per parse task
+COLUMNS = ["image_id", "cls", "cx", "cy", "w", "h", "conf"]
+DTYPES = {
+    "image_id": np.int32,
+    "cls": np.int32,
+    "cx": np.float64,
+    "cy": np.float64,
+    "w": np.float64,
+    "h": np.float64,
+    "conf": np.float32,
+}
+
+
+def _valid_lines(text: str) -> Iterator[Tuple[List[str], int, Tuple[float, ...]]]:
+    """(tokens, cls, (cx, cy, w, h, conf)) of every well-formed line, in file order."""
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        try:
+            cls = int(parts[0])
+            cx, cy, w, h = (float(v) for v in parts[1:5])
+            conf = float(parts[5]) if len(parts) > 5 else float("nan")
+        except ValueError:
+            continue
+        yield parts, cls, (cx, cy, w, h, conf)
+
+
+def parse_label_text(text: str) -> Tuple[List[int], List[Tuple[float, ...]]]:
+    """Parse YOLO label text into class ids and (cx, cy, w, h, conf) rows."""
+    classes, rows = [], []
+    for _, cls, row in _valid_lines(text):
+        classes.append(cls)
+        rows.append(row)
+    return classes, rows
+
+
+def label_tokens(text: str) -> List[List[str]]:
+    """
+    Original whitespace-split tokens of the lines the index keeps, one list
+    per index row, so tools can rewrite rows without reformatting numbers.
+    """
+    return [parts for parts, _, _ in _valid_lines(text)]
+
+
+def _parse_chunk(paths: List[Path]):
+    """Parse label files into (per-file counts, cls, (n, 5) rows) arrays."""
+    counts, classes, rows = [], [], []
+    for path in paths:
+        with open(path, "r") as f:
+            c, r = parse_label_text(f.read())
+        counts.append(len(c))
+        classes.extend(c)
+        rows.extend(r)
+    return (
+        np.array(counts, dtype=np.int64),
+        np.array(classes, dtype=np.int32),
+        np.array(rows, dtype=np.float64).reshape(-1, 5),
+    )
+
+
+def parse_files(paths: List[Path], workers: int = 1) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (cls, (k, 5) [cx, cy, w, h, conf]) arrays for every path, in order.
+    With workers > 1 chunks of PARSE_CHUNK files are parsed in separate processes.
+    """
+    chunks = [paths[i : i + PARSE_CHUNK] for i in range(0, len(paths), PARSE_CHUNK)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(_parse_chunk, chunks))
+    else:
+        results = [_parse_chunk(chunk) for chunk in chunks]
+
+    out = []
+    for counts, classes, rows in results:
+        bounds = np.cumsum(counts)[:-1]
+        out.extend(zip(np.split(classes, bounds), np.split(rows, bounds)))
+    return out
+
+
+def scan_labels(lbl_root: Path, splits=SPLITS) -> Dict[str, Tuple[int, int]]:
+    """rel path -> (mtime_ns, size) for every label file under lbl_root/<split>."""
+    found = {}
+    for split in splits:
+        ldir = lbl_root / split
+        if not ldir.is_dir():
+            continue
+        with os.scandir(ldir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    st = entry.stat()
+                    found[f"{split}/{entry.name}"] = (st.st_mtime_ns, st.st_size)
+    return found
+
+
+class LabelIndex:
+    def __init__(self, root: Path, files, mtimes, sizes, offsets, columns: Dict[str, np.ndarray]):
+        self.root = Path(root)
+        self.files = np.asarray(files, dtype=str)
+        self.mtimes = np.asarray(mtimes, dtype=np.int64)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.image_id = columns["image_id"]
+        self.cls = columns["cls"]
+        self.cx = columns["cx"]
+        self.cy = columns["cy"]
+        self.w = columns["w"]
+        self.h = columns["h"]
+        self.conf = columns["conf"]
+        self._pos = {rel: i for i, rel in enumerate(self.files.tolist())}
+
+    @classmethod
+    def empty(cls, root: Path):
+        columns = {c: np.zeros(0, dtype) for c, dtype in DTYPES.items()}
+        return cls(root, [], [], [], [0], columns)
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def num_boxes(self) -> int:
+        return len(self.cls)
+
+    @property
+    def splits(self) -> np.ndarray:
+        """Split name of every file."""
+        return np.array([rel.split("/", 1)[0] for rel in self.files.tolist()], dtype=str)
+
+    def file_id(self, split: str, stem: str) -> int:
+        """Index of labels/<split>/<stem>.txt, or -1 when there is no such file."""
+        return self._pos.get(f"{split}/{stem}.txt", -1)
+
+    def rows(self, file_id: int) -> slice:
+        return slice(int(self.offsets[file_id]), int(self.offsets[file_id + 1]))
+
+    def boxes(self, split: str, stem: str) -> np.ndarray:
+        """(k, 5) float64 [cls, cx, cy, w, h] of one label file (empty if missing)."""
+        fid = self.file_id(split, stem)
+        if fid < 0:
+            return np.zeros((0, 5), dtype=np.float64)
+        r = self.rows(fid)
+        return np.stack([self.cls[r], self.cx[r], self.cy[r], self.w[r], self.h[r]], axis=1).astype(np.float64)
+
+    def label_path(self, file_id: int) -> Path:
+        return self.root / "labels" / self.files[file_id]
+
+    def save(self, path: Path = None):
+        path = path or self.root / INDEX_NAME
+        # Unique per writer: two tools indexing one root never share a temp file
+        fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    version=np.int32(INDEX_VERSION),
+                    files=self.files,
+                    mtimes=self.mtimes,
+                    sizes=self.sizes,
+                    offsets=self.offsets,
+                    **{c: getattr(self, c) for c in COLUMNS},
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, root: Path, path: Path = None):
+        path = path or Path(root) / INDEX_NAME
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"{path}: unsupported index version")
+            columns = {c: data[c] for c in COLUMNS}
+            return cls(root, data["files"], data["mtimes"], data["sizes"], data["offsets"], columns)
+
+
+def _build(root: Path, files, stats, parsed_by_rel, reuse_from: LabelIndex, reuse_map) -> LabelIndex:
+    """Assemble a new index; rows come from `parsed_by_rel` or are copied from `reuse_from`."""
+    counts = np.zeros(len(files), dtype=np.int64)
+    pieces = {c: [] for c in COLUMNS if c != "image_id"}
+    for i, rel in enumerate(files):
+        if rel in parsed_by_rel:
+            classes, arr = parsed_by_rel[rel]
+            pieces["cls"].append(classes)
+            for j, c in enumerate(("cx", "cy", "w", "h")):
+                pieces[c].append(arr[:, j])
+            pieces["conf"].append(arr[:, 4].astype(np.float32))
+            counts[i] = len(classes)
+        else:
+            r = reuse_from.rows(reuse_map[rel])
+            for c in pieces:
+                pieces[c].append(getattr(reuse_from, c)[r])
+            counts[i] = r.stop - r.start
+
+    offsets = np.zeros(len(files) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    columns = {c: np.concatenate(v) if v else np.zeros(0, DTYPES[c]) for c, v in pieces.items()}
+    columns["image_id"] = np.repeat(np.arange(len(files), dtype=np.int32), counts)
+    return LabelIndex(
+        root,
+        files,
+        [stats[rel][0] for rel in files],
+        [stats[rel][1] for rel in files],
+        offsets,
+        columns,
+    )
+
+
+def load_index(root, splits=SPLITS, save: bool = False, verbose: bool = False, workers: int = 1) -> LabelIndex:
+    """
+    Load <root>/.label_index.npz, reparse label files of `splits` that
+    changed since it was written (across `workers` processes), and (with
+    `save`) persist the refreshed index. Rows of splits that are not
+    scanned are carried over as they were, so a partial refresh never
+    discards the rest of the index.
+    """
+    root = Path(root)
+    start = time.perf_counter()
+    try:
+        old = LabelIndex.load(root)
+    except (FileNotFoundError, KeyError, ValueError, OSError):
+        old = LabelIndex.empty(root)
+
+    stats = scan_labels(root / "labels", splits)
+    old_stats = {
+        rel: (int(m), int(s), i)
+        for i, (rel, m, s) in enumerate(zip(old.files.tolist(), old.mtimes.tolist(), old.sizes.tolist()))
+    }
+    # Splits outside this scan keep their old rows instead of being dropped
+    scanned = set(splits)
+    for rel, (mtime, size, _) in old_stats.items():
+        if rel.split("/", 1)[0] not in scanned:
+            stats[rel] = (mtime, size)
+    files = sorted(stats)
+    # Files moved between splits keep name, size and mtime
+    by_identity = {(rel.split("/", 1)[1], m, s): i for rel, (m, s, i) in old_stats.items()}
+
+    reuse_map = {}
+    to_parse = []
+    for rel in files:
+        mtime, size = stats[rel]
+        prev = old_stats.get(rel)
+        if prev is not None and prev[:2] == (mtime, size):
+            reuse_map[rel] = prev[2]
+            continue
+        moved = by_identity.get((rel.split("/", 1)[1], mtime, size))
+        if moved is not None:
+            reuse_map[rel] = moved
+        else:
+            to_parse.append(rel)
+
+    parsed = dict(zip(to_parse, parse_files([root / "labels" / rel for rel in to_parse], workers)))
+    unchanged = len(files) == len(old) and not to_parse and all(
+        reuse_map[rel] == i for i, rel in enumerate(files)
+    )
+    index = old if unchanged else _build(root, files, stats, parsed, old, reuse_map)
+
+    if save and not unchanged:
+        try:
+            index.save()
+        except OSError as exc:  # read-only dataset: still usable, just not persisted
+            print(f"[WARN] Could not save label index: {exc}")
+    if verbose:
+        print(
+            f"[INDEX] {len(index)} label files, {index.num_boxes} boxes "
+            f"({len(to_parse)} parsed) in {time.perf_counter() - start:.2f}s"
+        )
+    return index
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build or refresh the columnar label index of a YOLO dataset.")
+    ap.add_argument("root", help="Dataset root containing labels/<split>/")
+    ap.add_argument("--splits", nargs="*", default=SPLITS, help="Splits to index")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="Parser processes (1 = in-process)")
+    args = ap.parse_args()
+
+    index = load_index(args.root, args.splits, save=True, verbose=True, workers=args.workers)
+    splits = index.splits
+    for split in args.splits:
+        mask = splits == split
+        n_boxes = int(np.diff(index.offsets)[mask].sum())
+        print(f"{split:5s}: files={int(mask.sum()):6d} boxes={n_boxes:7d}")
+    print(f"[DONE] Index at {Path(args.root) / INDEX_NAME}")
+
+
+if __name__ == "__main__":
+    main()
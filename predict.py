@@ -1,17 +1,16 @@
 import argparse
 import json
 import torch
-import torch.nn as nn
-from torchvision import transforms, models
+from torchvision import transforms
 from PIL import Image
 
+from classifier import MODEL_PATH, add_model_args, autocast, build_model, pick_device, prepare_batch, resolve_precision
+from image_cache import IMG_SIZE
+
 # --------------------------
 # Configuration
 # --------------------------
-MODEL_PATH = "symbol_classifier.pth"
 CLASSES_PATH = "classes.json"
-IMAGENET_MEAN = [0.485, 0.456, 0.406]
-IMAGENET_STD = [0.229, 0.224, 0.225]
 
 # --------------------------
 # Load class labels
@@ -20,46 +19,35 @@ with open(CLASSES_PATH, "r") as f:
     idx_to_class = {int(k): v for k, v in json.load(f).items()}
 
 # --------------------------
-# Image transform
+# Image transform (normalized in prepare_batch)
 # --------------------------
 transform = transforms.Compose(
     [
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+        transforms.Resize((IMG_SIZE, IMG_SIZE)),
+        transforms.PILToTensor(),
     ]
 )
 
 
-def load_model():
-    device = (
-        "mps"
-        if torch.backends.mps.is_available()
-        else "cuda"
-        if torch.cuda.is_available()
-        else "cpu"
-    )
+def load_model(channels_last=False, compile=False):
+    device = pick_device()
     print(f"Using device: {device}")
 
-    model = models.resnet18(weights=None)
-    model.fc = nn.Linear(model.fc.in_features, len(idx_to_class))
-
-    state = torch.load(MODEL_PATH, map_location=device)
-    model.load_state_dict(state)
-    model = model.to(device)
+    model = build_model(len(idx_to_class), device, weights_path=MODEL_PATH, channels_last=channels_last, compile=compile)
     model.eval()
     return model, device
 
 
-def predict(image_path):
-    model, device = load_model()
+def predict(image_path, precision="fp32", channels_last=False, compile=False):
+    model, device = load_model(channels_last, compile)
+    precision = resolve_precision(precision, device)
 
     img = Image.open(image_path).convert("RGB")
-    img_t = transform(img).unsqueeze(0).to(device)
+    img_t = prepare_batch(transform(img).unsqueeze(0), device, channels_last)
 
-    with torch.no_grad():
+    with torch.no_grad(), autocast(device, precision):
         outputs = model(img_t)
-        probs = torch.softmax(outputs, dim=1)[0]
+        probs = torch.softmax(outputs.float(), dim=1)[0]
 
     # Top-5 predictions
     top5_prob, top5_idx = torch.topk(probs, 5)
@@ -81,6 +69,7 @@ def predict(image_path):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("image", help="Path to an image")
+    add_model_args(parser)
     args = parser.parse_args()
 
-    predict(args.image)
+    predict(args.image, args.precision, args.channels_last, args.compile)
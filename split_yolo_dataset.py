@@ -8,27 +8,41 @@ Notes:
 - Works even if you already have data in train/val/test; it rebuilds splits
   from all available images and matching labels.
 - Labels are moved alongside images; any missing label files are reported.
+- --view DST --link hardlink|symlink|reflink|auto also leaves the dataset
+  untouched and builds the new split at DST as a zero-copy view: images
+  are linked, labels copied, and DST/view.json records the source.
+- --in-place re-splits without staging copies: the assignment is computed
+  first, the renames it needs are written to <root>/_split_journal.json,
+  and only files whose split changes are moved. The assignment depends
+  only on file names and the seed, so re-running is a no-op. If a run is
+  interrupted, finish it with --recover forward or undo it with
+  --recover back.
+- --shards DIR leaves the dataset untouched and writes the new split as tar
+  shards + index instead (see yolo_shards.py).
+- Labels are found through the label index (label_index.py), which is only
+  written to <root>/.label_index.npz with --save-index.
 """
 
 import argparse
+import json
+import os
 import random
 import shutil
 from pathlib import Path
 from typing import Dict, List
 
+from label_index import load_index
+from yolo_shards import SHARD_BYTES, ShardWriter
+from yolo_views import LINK_MODES, Linker, write_manifest
+
 SPLITS = ["train", "val", "test"]
+JOURNAL_NAME = "_split_journal.json"
 
 
-def build_label_index(lbl_root: Path) -> Dict[str, Path]:
-    """Return stem -> label path across all current label splits."""
-    index: Dict[str, Path] = {}
-    for split in SPLITS:
-        ldir = lbl_root / split
-        if not ldir.exists():
-            continue
-        for lbl in ldir.glob("*.txt"):
-            index[lbl.stem] = lbl
-    return index
+def build_label_index(lbl_root: Path, save: bool = False) -> Dict[str, Path]:
+    """Return stem -> label path across all current label splits (from the label index)."""
+    index = load_index(lbl_root.parent, SPLITS, save=save)
+    return {Path(rel).stem: lbl_root / rel for rel in index.files.tolist()}
 
 
 def collect_images(img_root: Path) -> List[Path]:
@@ -44,9 +58,125 @@ def collect_images(img_root: Path) -> List[Path]:
     return imgs
 
 
-def main(root: Path, val_ratio: float, test_ratio: float, seed: int):
+def write_shards(assignments, label_index: Dict[str, Path], out_dir: Path, max_bytes: int):
+    """Write (split, image) assignments as shards keyed <split>/<stem>."""
+    with ShardWriter(out_dir, max_bytes) as writer:
+        for split, img_path in assignments:
+            lbl_path = label_index.get(img_path.stem)
+            if lbl_path and lbl_path.exists():
+                label_text = lbl_path.read_text()
+            else:
+                print(f"[WARN] Missing label for {img_path.name}")
+                label_text = ""
+            writer.write(f"{split}/{img_path.stem}", img_path.read_bytes(), img_path.suffix, label_text)
+
+
+def write_view(assignments, label_index: Dict[str, Path], root: Path, view: Path, link: str, params: dict):
+    """Build the split at `view`: linked images, copied labels and a view.json manifest."""
+    if view.exists():
+        raise SystemExit(f"View destination exists: {view}")
+    for split in SPLITS:
+        (view / "images" / split).mkdir(parents=True, exist_ok=True)
+        (view / "labels" / split).mkdir(parents=True, exist_ok=True)
+
+    linker = Linker(link)
+    for split, img_path in assignments:
+        linker.place(img_path, view / "images" / split / img_path.name)
+        lbl_path = label_index.get(img_path.stem)
+        if lbl_path and lbl_path.exists():
+            shutil.copy2(lbl_path, view / "labels" / split / f"{img_path.stem}.txt")
+        else:
+            print(f"[WARN] Missing label for {img_path.name}")
+
+    if (root / "data.yaml").exists():
+        shutil.copy2(root / "data.yaml", view / "data.yaml")
+    write_manifest(view, root, "split_yolo_dataset", params, linker)
+    return linker.counts()
+
+
+def plan_moves(assignments, label_index: Dict[str, Path], root: Path) -> List[List[str]]:
+    """[src, dst] renames (relative to root) for files whose split changes."""
+    moves = []
+    for split, img_path in assignments:
+        dst_img = root / "images" / split / img_path.name
+        if img_path != dst_img:
+            moves.append([img_path.relative_to(root).as_posix(), dst_img.relative_to(root).as_posix()])
+        lbl_path = label_index.get(img_path.stem)
+        if lbl_path is None:
+            print(f"[WARN] Missing label for {img_path.name}")
+            continue
+        dst_lbl = root / "labels" / split / f"{img_path.stem}.txt"
+        if lbl_path != dst_lbl:
+            moves.append([lbl_path.relative_to(root).as_posix(), dst_lbl.relative_to(root).as_posix()])
+    return moves
+
+
+def write_journal(root: Path, moves: List[List[str]], params: dict):
+    """Durably record the plan before the first rename."""
+    tmp = root / (JOURNAL_NAME + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"params": params, "moves": moves}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, root / JOURNAL_NAME)
+
+
+def apply_moves(root: Path, moves: List[List[str]], reverse: bool = False) -> int:
+    """
+    Perform (or with `reverse`, undo) journaled renames. Each move's state
+    is read off the filesystem, so this is safe to repeat after a crash:
+    finished moves are skipped. Returns the number of renames done now.
+    """
+    done = 0
+    for src, dst in (reversed(moves) if reverse else moves):
+        if reverse:
+            src, dst = dst, src
+        src_path, dst_path = root / src, root / dst
+        if src_path.exists() and not dst_path.exists():
+            dst_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src_path, dst_path)
+            done += 1
+        elif src_path.exists() and dst_path.exists():
+            raise SystemExit(f"Both {src} and {dst} exist; resolve by hand, then --recover again")
+        elif not dst_path.exists():
+            raise SystemExit(f"Neither {src} nor {dst} exists")
+    return done
+
+
+def check_moves(root: Path, moves: List[List[str]]):
+    """Refuse to start if any destination is already taken, so every rename is order-independent."""
+    for src, dst in moves:
+        if (root / dst).exists():
+            raise SystemExit(f"Cannot move {src}: {dst} already exists (duplicate stem across splits?)")
+
+
+def remove_caches(lbl_root: Path):
+    # Remove stale YOLO caches if present
+    for cache in lbl_root.glob("*.cache"):
+        cache.unlink()
+    for cache in (lbl_root / "train").glob("*.cache"):
+        cache.unlink()
+
+
+def recover(root: Path, direction: str):
+    journal = root / JOURNAL_NAME
+    if not journal.exists():
+        raise SystemExit(f"No journal at {journal}; nothing to recover.")
+    with open(journal, "r") as f:
+        moves = json.load(f)["moves"]
+    done = apply_moves(root, moves, reverse=direction == "back")
+    journal.unlink()
+    remove_caches(root / "labels")
+    print(f"[DONE] Rolled {direction}: {done} renames ({len(moves)} in journal)")
+
+
+def main(root: Path, val_ratio: float, test_ratio: float, seed: int, shards: Path = None, shard_bytes: int = SHARD_BYTES, view: Path = None, link: str = "hardlink", in_place: bool = False, save_index: bool = False):
     if val_ratio + test_ratio >= 1.0:
         raise ValueError("val + test ratio must be < 1.0")
+    if sum([in_place, view is not None, shards is not None]) > 1:
+        raise SystemExit("--in-place, --view and --shards are alternative outputs; pass only one.")
+    if (root / JOURNAL_NAME).exists():
+        raise SystemExit(f"Interrupted re-split found ({root / JOURNAL_NAME}); run with --recover forward or --recover back.")
 
     img_root = root / "images"
     lbl_root = root / "labels"
@@ -55,8 +185,11 @@ def main(root: Path, val_ratio: float, test_ratio: float, seed: int):
     if not all_imgs:
         raise SystemExit(f"No images found under {img_root}/* to split.")
 
-    label_index = build_label_index(lbl_root)
+    label_index = build_label_index(lbl_root, save_index)
 
+    if in_place:
+        # Independent of where files currently sit, so a re-run moves nothing
+        all_imgs.sort(key=lambda p: p.name)
     random.seed(seed)
     random.shuffle(all_imgs)
 
@@ -68,6 +201,40 @@ def main(root: Path, val_ratio: float, test_ratio: float, seed: int):
     test_imgs = all_imgs[n_val : n_val + n_test]
     train_imgs = all_imgs[n_val + n_test :]
 
+    assignments = [("train", p) for p in train_imgs] + [("val", p) for p in val_imgs] + [("test", p) for p in test_imgs]
+
+    if in_place:
+        moves = plan_moves(assignments, label_index, root)
+        check_moves(root, moves)
+        write_journal(root, moves, {"val": val_ratio, "test": test_ratio, "seed": seed})
+        apply_moves(root, moves)
+        (root / JOURNAL_NAME).unlink()
+        remove_caches(lbl_root)
+        print(
+            f"[DONE] Split {n} images → "
+            f"{len(train_imgs)} train / {len(val_imgs)} val / {len(test_imgs)} test ({len(moves)} files moved)"
+        )
+        return
+
+    if view is not None:
+        params = {"val": val_ratio, "test": test_ratio, "seed": seed}
+        counts = write_view(assignments, label_index, root, view, link, params)
+        print(
+            f"[DONE] Split {n} images → "
+            f"{len(train_imgs)} train / {len(val_imgs)} val / {len(test_imgs)} test in view {view} {counts}"
+        )
+        return
+
+    if shards is not None:
+        write_shards(assignments, label_index, shards, shard_bytes)
+        if (root / "data.yaml").exists():
+            shutil.copy2(root / "data.yaml", shards / "data.yaml")
+        print(
+            f"[DONE] Split {n} images → "
+            f"{len(train_imgs)} train / {len(val_imgs)} val / {len(test_imgs)} test in shards {shards}"
+        )
+        return
+
     # Temporary staging area
     tmp_root = root / "_split_tmp"
     if tmp_root.exists():
@@ -112,11 +279,7 @@ def main(root: Path, val_ratio: float, test_ratio: float, seed: int):
 
     shutil.rmtree(tmp_root)
 
-    # Remove stale YOLO caches if present
-    for cache in lbl_root.glob("*.cache"):
-        cache.unlink()
-    for cache in (lbl_root / "train").glob("*.cache"):
-        cache.unlink()
+    remove_caches(lbl_root)
 
     print(
         f"[DONE] Split {n} images → "
@@ -130,6 +293,32 @@ if __name__ == "__main__":
     parser.add_argument("--val", type=float, default=0.15, help="Validation ratio")
     parser.add_argument("--test", type=float, default=0.15, help="Test ratio")
     parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    # One output mode at most; without any, the split is rebuilt via a staging copy
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--in-place", action="store_true", help="Re-split by journaled renames of only the files that change split")
+    mode.add_argument("--recover", choices=["forward", "back"], default=None, help="Finish or undo an interrupted --in-place run")
+    mode.add_argument("--view", type=str, default=None, help="Build the split as a linked view here (dataset left as is)")
+    mode.add_argument("--shards", type=str, default=None, help="Write the split as tar shards here (dataset left as is)")
+    parser.add_argument("--link", choices=LINK_MODES, default=None, help="How --view images reference the source (default hardlink)")
+    parser.add_argument("--shard-bytes", type=float, default=SHARD_BYTES, help="Target size of each tar shard")
+    parser.add_argument("--save-index", action="store_true", help="Persist the label index as .label_index.npz in the dataset root")
     args = parser.parse_args()
+    if args.link is not None and args.view is None:
+        parser.error("--link only applies to --view")
 
-    main(root=Path(args.root), val_ratio=args.val, test_ratio=args.test, seed=args.seed)
+    if args.recover:
+        recover(Path(args.root), args.recover)
+        raise SystemExit(0)
+
+    main(
+        root=Path(args.root),
+        val_ratio=args.val,
+        test_ratio=args.test,
+        seed=args.seed,
+        shards=Path(args.shards) if args.shards else None,
+        shard_bytes=int(args.shard_bytes),
+        view=Path(args.view) if args.view else None,
+        link=args.link or "hardlink",
+        in_place=args.in_place,
+        save_index=args.save_index,
+    )
@@ -0,0 +1,228 @@
+"""
+Synthetic single-line diagrams as in-memory datasets, so training can draw
+fresh samples instead of reading back the PNGs generator.py writes.
+
+Both datasets render with generator.compose_diagram and seed every sample
+from (seed, index, epoch) alone, so the result does not depend on the
+DataLoader worker that produces it. Epoch 0 reproduces exactly what
+`python generator.py --seed S` writes to disk; call set_epoch() to get a
+new set of diagrams each epoch.
+
+ - SyntheticDiagrams      : map-style (len = --num-images), works with shuffle/samplers
+ - SyntheticDiagramStream : iterable, splits indices across workers (and ranks)
+
+Each sample is (HxWx3 uint8 array, (k, 5) float32 YOLO labels [cls, cx, cy, w, h])
+unless a transform(image, labels) is given. Canvases come in several
+CANVAS_SIZES; Letterbox(size) scales and pads every sample to one square
+size. collate_yolo batches samples the way YOLO trainers expect (images
+stacked, labels prefixed with the batch index); samples of different sizes
+are padded with white at the bottom/right to the largest in the batch.
+
+Usage (throughput check, no files written):
+    python synthetic_dataset.py --count 200 --workers 4 --class-dir dataset/classes_9
+
+    from torch.utils.data import DataLoader
+    from synthetic_dataset import Letterbox, SyntheticDiagrams, collate_yolo
+    ds = SyntheticDiagrams(length=6000, seed=0, transform=Letterbox(1024))
+    loader = DataLoader(ds, batch_size=16, shuffle=True, num_workers=8, collate_fn=collate_yolo)
+    for epoch in range(epochs):
+        ds.set_epoch(epoch)
+        ...
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+from PIL import Image
+
+from generator import (
+    CLASS_DIR,
+    CLASSES_JSON,
+    MASTER_SEED,
+    NUM_IMAGES,
+    SPRITE_CACHE_MB,
+    Placement,
+    SpriteCache,
+    SymbolLibrary,
+    compose_diagram,
+    image_seed,
+)
+
+try:
+    from torch.utils.data import Dataset, IterableDataset, get_worker_info
+except ImportError:  # rendering and iteration work without torch; DataLoader needs it
+    Dataset = IterableDataset = object
+
+    def get_worker_info():
+        return None
+
+
+class _SyntheticBase:
+    def __init__(
+        self,
+        length: int = NUM_IMAGES,
+        seed: int = MASTER_SEED,
+        classes_json=CLASSES_JSON,
+        class_dir=CLASS_DIR,
+        placement: Placement = Placement(),
+        transform=None,
+        sprite_cache_mb: int = SPRITE_CACHE_MB,
+    ):
+        self.length = length
+        self.seed = seed
+        self.epoch = 0
+        self.library = SymbolLibrary.from_dir(classes_json, class_dir)
+        self.placement = placement
+        self.transform = transform
+        self.sprite_cache_mb = sprite_cache_mb
+        # Built lazily in each process, never shipped to DataLoader workers
+        self._sprites = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_sprites"] = None
+        return state
+
+    def set_epoch(self, epoch: int):
+        """Select the diagram set; with persistent workers call it before building the iterator."""
+        self.epoch = epoch
+
+    def render(self, idx: int):
+        if self._sprites is None:
+            self._sprites = SpriteCache(self.sprite_cache_mb * 2**20)
+        rng = random.Random(image_seed(self.seed, idx, self.epoch))
+        canvas, labels, _ = compose_diagram(rng, self.library, self._sprites, self.placement)
+
+        image = np.asarray(canvas)
+        labels = np.asarray(labels, dtype=np.float32).reshape(-1, 5)
+        if self.transform is not None:
+            return self.transform(image, labels)
+        return image, labels
+
+
+class SyntheticDiagrams(_SyntheticBase, Dataset):
+    """Map-style dataset: sample `idx` is always the same diagram for a given seed and epoch."""
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx: int):
+        if not 0 <= idx < self.length:
+            raise IndexError(idx)
+        return self.render(idx)
+
+
+class SyntheticDiagramStream(_SyntheticBase, IterableDataset):
+    """
+    Iterable dataset over indices 0..length-1 (length=None streams forever).
+
+    Indices are dealt round-robin across (rank, worker) pairs, so no two
+    DataLoader workers or DDP ranks ever render the same diagram.
+    """
+
+    def __init__(self, *args, rank: int = 0, world_size: int = 1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rank = rank
+        self.world_size = world_size
+
+    def __len__(self):
+        if self.length is None:
+            raise TypeError("infinite SyntheticDiagramStream has no length")
+        return self.length
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker_id, num_workers = (info.id, info.num_workers) if info is not None else (0, 1)
+        shard = self.rank * num_workers + worker_id
+        num_shards = self.world_size * num_workers
+
+        idx = shard
+        while self.length is None or idx < self.length:
+            yield self.render(idx)
+            idx += num_shards
+
+
+class Letterbox:
+    """
+    Transform: scale a sample to fit `size` x `size` (aspect kept) and pad
+    it centred with `fill`, moving the YOLO labels along. A class rather
+    than a closure so DataLoader workers can pickle it.
+    """
+
+    def __init__(self, size: int = 1024, fill: int = 255):
+        self.size = size
+        self.fill = fill
+
+    def __call__(self, image: np.ndarray, labels: np.ndarray):
+        H, W = image.shape[:2]
+        scale = self.size / max(W, H)
+        new_w, new_h = round(W * scale), round(H * scale)
+        pad_x, pad_y = (self.size - new_w) // 2, (self.size - new_h) // 2
+
+        out = np.full((self.size, self.size, 3), self.fill, dtype=np.uint8)
+        if (new_w, new_h) != (W, H):
+            image = np.asarray(Image.fromarray(image).resize((new_w, new_h), Image.BILINEAR))
+        out[pad_y : pad_y + new_h, pad_x : pad_x + new_w] = image
+
+        labels = labels.copy()
+        labels[:, [1, 3]] *= new_w / self.size
+        labels[:, [2, 4]] *= new_h / self.size
+        labels[:, 1] += pad_x / self.size
+        labels[:, 2] += pad_y / self.size
+        return out, labels
+
+
+def collate_yolo(batch):
+    """
+    Batch samples to (B, 3, H, W) float [0, 1] images and (N, 6) labels
+    [batch_idx, cls, cx, cy, w, h]. Smaller images are padded with white at
+    the bottom/right to the batch's largest H and W, and their labels are
+    renormalized to the padded size.
+    """
+    import torch
+
+    max_h = max(img.shape[0] for img, _ in batch)
+    max_w = max(img.shape[1] for img, _ in batch)
+    images = torch.full((len(batch), 3, max_h, max_w), 255, dtype=torch.uint8)
+    labels = []
+    for i, (img, lbl) in enumerate(batch):
+        h, w = img.shape[:2]
+        images[i, :, :h, :w] = torch.from_numpy(np.ascontiguousarray(img)).permute(2, 0, 1)
+        lbl = torch.from_numpy(np.array(lbl, dtype=np.float32).reshape(-1, 5))
+        lbl[:, [1, 3]] *= w / max_w
+        lbl[:, [2, 4]] *= h / max_h
+        labels.append(torch.cat([torch.full((len(lbl), 1), i, dtype=torch.float32), lbl], dim=1))
+    return images.float().div_(255), torch.cat(labels)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Render synthetic diagrams in memory and report throughput.")
+    ap.add_argument("--count", type=int, default=100, help="Samples to render")
+    ap.add_argument("--workers", type=int, default=0, help="DataLoader workers (0 = in-process, no torch needed)")
+    ap.add_argument("--seed", type=int, default=MASTER_SEED, help="Master seed")
+    ap.add_argument("--epoch", type=int, default=0, help="Epoch (0 = same diagrams as generator.py)")
+    ap.add_argument("--classes-json", default=CLASSES_JSON, help="Class name -> id map")
+    ap.add_argument("--class-dir", default=str(CLASS_DIR), help="Folder with one subfolder of PNGs per class")
+    args = ap.parse_args()
+
+    stream = SyntheticDiagramStream(length=args.count, seed=args.seed, classes_json=args.classes_json, class_dir=args.class_dir)
+    stream.set_epoch(args.epoch)
+    if args.workers > 0:
+        from torch.utils.data import DataLoader
+
+        samples = DataLoader(stream, batch_size=None, num_workers=args.workers)
+    else:
+        samples = stream
+
+    start = time.perf_counter()
+    boxes = 0
+    for _, labels in samples:
+        boxes += len(labels)
+    elapsed = time.perf_counter() - start
+    print(f"[DONE] {args.count} diagrams, {boxes} boxes in {elapsed:.2f}s ({args.count / elapsed:.1f} img/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Numerical parity of the classifier fast paths (classifier.py) with fp32.
+
+A seeded, randomly initialised ResNet-18 runs one fixed batch; its logits
+under channels_last and under the device's autocast precision (bf16 on
+CPU, fp16 on CUDA) must stay within tolerance of the fp32 NCHW logits.
+Throughput is measured separately with `python classifier.py`.
+
+Usage:
+    python -m pytest test_classifier.py -q
+"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from classifier import autocast, build_model, pick_device, prepare_batch, resolve_precision  # noqa: E402
+from image_cache import IMG_SIZE  # noqa: E402
+
+SEED = 0
+NUM_CLASSES = 8
+BATCH = 4
+LAYOUT_TOL = 1e-3  # fp32 channels_last: only the summation order changes
+AUTOCAST_TOL = 0.05  # bf16/fp16, relative to the largest fp32 logit
+
+
+def _logits(device: str, precision: str = "fp32", channels_last: bool = False):
+    torch.manual_seed(SEED)
+    model = build_model(NUM_CLASSES, device, channels_last=channels_last).eval()
+    gen = torch.Generator().manual_seed(SEED)
+    imgs = torch.randint(0, 256, (BATCH, 3, IMG_SIZE, IMG_SIZE), dtype=torch.uint8, generator=gen)
+    with torch.no_grad(), autocast(device, precision):
+        return model(prepare_batch(imgs, device, channels_last)).float().cpu()
+
+
+@pytest.fixture(scope="module")
+def device():
+    return pick_device()
+
+
+@pytest.fixture(scope="module")
+def reference(device):
+    return _logits(device)
+
+
+def _relative_error(logits, reference):
+    return ((logits - reference).abs().max() / reference.abs().max()).item()
+
+
+def test_channels_last_matches_fp32(device, reference):
+    assert _relative_error(_logits(device, channels_last=True), reference) <= LAYOUT_TOL
+
+
+@pytest.mark.parametrize("channels_last", [False, True])
+def test_autocast_matches_fp32(device, reference, channels_last):
+    precision = resolve_precision("auto", device)
+    if precision == "fp32":
+        pytest.skip(f"no autocast precision on {device}")
+    assert _relative_error(_logits(device, precision, channels_last), reference) <= AUTOCAST_TOL
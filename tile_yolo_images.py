@@ -5,17 +5,88 @@ This is helpful when SLD sheets are very large (e.g., 7000x5000) and symbols are
 
 Example:
     python tile_yolo_images.py --root yolo_sld --out yolo_sld_tiled \\
-        --tile 1024 1024 --stride 1024 1024 --min-frac 0.1 --keep-empty
+        --tile 1024 1024 --stride 1024 1024 --min-frac 0.1 --keep-empty --workers 8
+
+Images are spread across --workers processes. Inside each worker, label
+clipping is one NumPy operation over all (tile, box) pairs, and PNG
+encoding/writing runs on a small thread pool so it overlaps with cropping
+the next tiles.
+Labels come from the label index (label_index.py), kept in memory unless
+--save-index persists it as <root>/.label_index.npz.
+
+Virtual tiling (no tile files, only <out>/manifest.jsonl):
+    python tile_yolo_images.py --root yolo_sld --out yolo_sld_virtual --virtual \\
+        --tile 1024 1024 --stride 768 768
+
+Only image headers and label files are read, so changing --tile, --stride or
+--min-frac rebuilds the manifest in seconds. VirtualTiles serves the crops
+on demand from decoded source images held in a bounded LRU:
+
+    from tile_yolo_images import VirtualTiles
+    tiles = VirtualTiles("yolo_sld_virtual/manifest.jsonl", split="train")
+    pixels, labels = tiles[0]  # (h, w, 3) uint8 view, (k, 5) [cls, cx, cy, w, h]
+
+Huge sheets (--sheet-cache DIR):
+    python tile_yolo_images.py --root yolo_sld --out yolo_sld_tiled --sheet-cache .sheet_cache \\
+        --decode-workers 1 --workers 8
+
+Each sheet is decoded once, in a separate pass limited to --decode-workers
+processes, into a raw .npy under DIR (grayscale when the source is
+grayscale or its RGB channels are identical, as with most line art).
+Tiling workers then slice tiles straight out of np.load(mmap_mode="r"),
+so their memory stays bounded by the tiles in flight rather than the sheet
+size. Grayscale sheets produce grayscale tiles. VirtualTiles accepts the
+same sheet_cache directory.
+
+Ink-aware selection (--min-ink FRAC):
+    python tile_yolo_images.py --root yolo_sld --out yolo_sld_tiled --min-ink 0.002 \\
+        --hard-neg-ratio 0.3 --blank-keep 0.02
+
+Dark-pixel counts are summed once per sheet into blocks that tile both the
+stride and tile size, and an integral image over those blocks gives every
+tile's ink fraction in O(1). When that block (gcd of tile and stride) is
+under MIN_INK_BLOCK pixels, e.g. tile 1000 / stride 999, the integral would
+be nearly per-pixel, so ink is instead summed per tile column range from
+row strips. Tiles with labels are always kept; unlabeled
+tiles with at least FRAC ink ("hard negatives": lines but no symbols) are
+kept with probability --hard-neg-ratio, and blank tiles with
+--blank-keep. Sampling is seeded per image, so reruns pick the same tiles.
+Adding --keep-empty keeps every inked unlabeled tile (as --hard-neg-ratio 1)
+while blank tiles still follow --blank-keep, so --min-ink 0.002 --keep-empty
+is inference-time tiling that drops whitespace-only tiles.
+
+Sharded output (--shards DIR): tiles and labels go into ~1 GB tar shards
+with an index (see yolo_shards.py) instead of one file pair per tile.
 """
 
 import argparse
+import hashlib
+import io
+import json
 import math
+import os
 import shutil
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, NamedTuple, Tuple
 
+import numpy as np
 from PIL import Image
 
+from label_index import load_index
+from yolo_shards import SHARD_BYTES, ShardWriter
+
+WRITE_THREADS = 2  # encoder threads per worker (PIL releases the GIL while encoding)
+MAX_PENDING_WRITES = 32  # bounds memory held by cropped tiles awaiting encode
+CHUNK_SIZE = 4  # images per worker task
+MANIFEST_NAME = "manifest.jsonl"
+GRAY_MODES = {"1", "L", "LA"}
+DECODE_STRIP_ROWS = 1024  # rows converted/written per step when filling a sheet cache
+MIN_INK_BLOCK = 8  # smallest block side for the ink integral image
+
 
 def parse_args():
     ap = argparse.ArgumentParser()
@@ -24,17 +95,28 @@ def parse_args():
     ap.add_argument("--tile", nargs=2, type=int, metavar=("W", "H"), default=[1024, 1024], help="Tile width height")
     ap.add_argument("--stride", nargs=2, type=int, metavar=("SX", "SY"), default=None, help="Stride (defaults to tile size)")
     ap.add_argument("--min-frac", type=float, default=0.1, help="Minimum fraction of original box area to keep after clipping")
-    ap.add_argument("--keep-empty", action="store_true", help="Keep tiles even if they have no labels")
+    ap.add_argument("--keep-empty", action="store_true", help="Keep tiles even if they have no labels (with --min-ink: every inked one)")
     ap.add_argument("--clear", action="store_true", help="Remove output root if it already exists")
     ap.add_argument("--splits", nargs="*", default=["train", "val", "test"], help="Splits to process")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (1 = in-process)")
+    ap.add_argument("--save-index", action="store_true", help="Persist the label index as .label_index.npz in the source dataset root")
+    ap.add_argument("--virtual", action="store_true", help="Write only a tile manifest (no tile images/labels)")
+    ap.add_argument("--sheet-cache", type=str, default=None, help="Decode each sheet once into memory-mapped .npy files here")
+    ap.add_argument("--decode-workers", type=int, default=1, help="Processes decoding sheets into --sheet-cache")
+    ap.add_argument("--shards", type=str, default=None, help="Write tiles into tar shards here instead of --out folders")
+    ap.add_argument("--shard-bytes", type=float, default=SHARD_BYTES, help="Target size of each tar shard")
+    ap.add_argument("--min-ink", type=float, default=None, help="Enable ink-aware selection: min dark-pixel fraction of a non-blank tile")
+    ap.add_argument("--dark-thresh", type=int, default=128, help="Gray level below which a pixel counts as ink")
+    ap.add_argument("--hard-neg-ratio", type=float, default=0.25, help="Fraction of unlabeled inked tiles kept (with --min-ink)")
+    ap.add_argument("--blank-keep", type=float, default=0.0, help="Fraction of blank tiles kept (with --min-ink)")
     return ap.parse_args()
 
 
-def ensure_out_dirs(out_root: Path, splits: List[str]):
+def ensure_out_dirs(out_root: Path, splits: List[str], clear: bool):
     if out_root.exists():
         if not any(out_root.iterdir()):
             pass
-        elif args.clear:
+        elif clear:
             shutil.rmtree(out_root)
         else:
             raise SystemExit(f"{out_root} exists. Use --clear to overwrite.")
@@ -53,80 +135,448 @@ def yolo_to_xyxy(cx, cy, w, h, W, H):
     return x1, y1, x2, y2
 
 
-def clip_box_to_tile(box: Tuple[float, float, float, float], tile):
-    x1, y1, x2, y2 = box
-    tx1, ty1, tx2, ty2 = tile
-    cx1 = max(x1, tx1)
-    cy1 = max(y1, ty1)
-    cx2 = min(x2, tx2)
-    cy2 = min(y2, ty2)
-    return cx1, cy1, cx2, cy2
-
-
-def box_area(box):
-    x1, y1, x2, y2 = box
-    return max(0.0, x2 - x1) * max(0.0, y2 - y1)
+def load_labels(lbl, W: int, H: int) -> np.ndarray:
+    """
+    Return an (N, 5) float array of [cls, x1, y1, x2, y2] in pixels.
+
+    `lbl` is a label file path or (k, 5) [cls, cx, cy, w, h] rows already
+    taken from the label index.
+    """
+    if isinstance(lbl, np.ndarray):
+        arr = lbl
+    else:
+        rows = []
+        if lbl.exists():
+            with open(lbl, "r") as f:
+                for line in f:
+                    parts = line.strip().split()
+                    if len(parts) < 5:
+                        continue
+                    rows.append((int(parts[0]), *map(float, parts[1:5])))
+        arr = np.array(rows, dtype=np.float64).reshape(-1, 5)
+    if not len(arr):
+        return np.zeros((0, 5), dtype=np.float64)
+    x1, y1, x2, y2 = yolo_to_xyxy(arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4], W, H)
+    return np.stack([arr[:, 0], x1, y1, x2, y2], axis=1)
+
+
+def tile_grid(W: int, H: int, tile_w: int, tile_h: int, stride_w: int, stride_h: int) -> np.ndarray:
+    """Return a (T, 4) int array of [tx1, ty1, tx2, ty2] in row-major order."""
+    ty, tx = np.meshgrid(np.arange(0, H, stride_h), np.arange(0, W, stride_w), indexing="ij")
+    tx, ty = tx.ravel(), ty.ravel()
+    tiles = np.stack([tx, ty, np.minimum(tx + tile_w, W), np.minimum(ty + tile_h, H)], axis=1)
+    return tiles[(tiles[:, 2] > tiles[:, 0]) & (tiles[:, 3] > tiles[:, 1])]
+
+
+def remap_labels(labels: np.ndarray, tiles: np.ndarray, min_frac: float):
+    """
+    Clip every box against every tile at once.
+
+    Returns (keep, yolo) where keep is a (T, N) bool mask of boxes retained
+    in each tile and yolo is a (T, N, 4) array of tile-relative cx, cy, w, h.
+    """
+    x1, y1, x2, y2 = (labels[None, :, i] for i in range(1, 5))
+    tx1, ty1, tx2, ty2 = (tiles[:, i, None].astype(np.float64) for i in range(4))
+
+    cx1 = np.maximum(x1, tx1)
+    cy1 = np.maximum(y1, ty1)
+    cx2 = np.minimum(x2, tx2)
+    cy2 = np.minimum(y2, ty2)
+
+    inter_area = np.maximum(0.0, cx2 - cx1) * np.maximum(0.0, cy2 - cy1)
+    orig_area = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        keep = (orig_area > 0) & (inter_area > 0) & (inter_area / orig_area >= min_frac)
+
+    tb_w = tx2 - tx1
+    tb_h = ty2 - ty1
+    yolo = np.stack(
+        [
+            ((cx1 + cx2) / 2 - tx1) / tb_w,
+            ((cy1 + cy2) / 2 - ty1) / tb_h,
+            (cx2 - cx1) / tb_w,
+            (cy2 - cy1) / tb_h,
+        ],
+        axis=-1,
+    )
+    return keep, yolo
+
+
+def format_labels(classes: np.ndarray, yolo: np.ndarray) -> str:
+    return "".join(
+        f"{int(cls)} {cx:.6f} {cy:.6f} {bw:.6f} {bh:.6f}\n"
+        for cls, (cx, cy, bw, bh) in zip(classes, yolo.tolist())
+    )
+
+
+def save_tile(tile: Image.Image, out_img_path: Path, out_lbl_path: Path, label_text: str):
+    tile.save(out_img_path)
+    with open(out_lbl_path, "w") as f:
+        f.write(label_text)
+
+
+class TileWriter:
+    """Encode and write tiles on background threads with a bound on pending work."""
+
+    def __init__(self, threads: int = WRITE_THREADS, max_pending: int = MAX_PENDING_WRITES):
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.futures = []
+
+    def submit(self, *args):
+        self.slots.acquire()
+        future = self.pool.submit(save_tile, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for future in self.futures:
+            future.result()  # re-raise write errors
+
+
+class TileCollector:
+    """TileWriter stand-in for --shards: encodes tiles in memory for the parent to archive."""
+
+    def __init__(self):
+        self.samples = []
+
+    def submit(self, tile: Image.Image, out_img_path: Path, out_lbl_path: Path, label_text: str):
+        buf = io.BytesIO()
+        tile.save(buf, Image.registered_extensions()[out_img_path.suffix.lower()])
+        key = f"{out_img_path.parent.name}/{out_img_path.stem}"
+        self.samples.append((key, buf.getvalue(), out_img_path.suffix, label_text))
+
+    def close(self):
+        pass
+
+
+def sheet_cache_path(cache_dir: Path, img_path: Path) -> Path:
+    """Cache file for a sheet, keyed on path, size and mtime so edits invalidate it."""
+    st = img_path.stat()
+    key = hashlib.sha1(f"{img_path.resolve()}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+    return cache_dir / f"{img_path.stem}-{key}.npy"
 
 
-def process_image(img_path: Path, lbl_path: Path, out_img_dir: Path, out_lbl_dir: Path, tile_w: int, tile_h: int, stride_w: int, stride_h: int, min_frac: float, keep_empty: bool):
-    img = Image.open(img_path).convert("RGB")
+def _rgb_is_gray(img: Image.Image) -> bool:
     W, H = img.size
-
-    labels = []
-    if lbl_path.exists():
-        with open(lbl_path, "r") as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) < 5:
+    for y in range(0, H, DECODE_STRIP_ROWS):
+        strip = np.asarray(img.crop((0, y, W, min(y + DECODE_STRIP_ROWS, H))))
+        if not ((strip[..., 0] == strip[..., 1]).all() and (strip[..., 1] == strip[..., 2]).all()):
+            return False
+    return True
+
+
+def decode_sheet(img_path: Path, cache_dir: Path) -> Path:
+    """
+    Decode a sheet once into an (H, W) or (H, W, 3) uint8 .npy in cache_dir.
+
+    The source is decoded in its native mode (1 byte/px for line art) and
+    converted strip by strip straight into the memory-mapped output, so no
+    full-size RGB copy is ever made. Returns the cache path.
+    """
+    cache_path = sheet_cache_path(cache_dir, img_path)
+    if cache_path.exists():
+        return cache_path
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp")
+    with Image.open(img_path) as img:
+        img.load()
+        W, H = img.size
+        gray = img.mode in GRAY_MODES or (img.mode == "RGB" and _rgb_is_gray(img))
+        mode = "L" if gray else "RGB"
+        shape = (H, W) if gray else (H, W, 3)
+
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=shape)
+        for y in range(0, H, DECODE_STRIP_ROWS):
+            strip = img.crop((0, y, W, min(y + DECODE_STRIP_ROWS, H))).convert(mode)
+            out[y : y + strip.height] = np.asarray(strip)
+        out.flush()
+        del out
+
+    # Atomic publish: other workers never see a half-written cache
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def load_sheet(img_path: Path, cache_dir: Path) -> np.ndarray:
+    """Read-only memmap of a cached sheet (decoding it first if needed)."""
+    return np.load(decode_sheet(img_path, cache_dir), mmap_mode="r")
+
+
+class TileSelect(NamedTuple):
+    min_ink: float
+    dark_thresh: int
+    hard_neg_ratio: float
+    blank_keep: float
+
+
+def _gray_rows(source, y1: int, y2: int) -> np.ndarray:
+    """Rows y1:y2 of a sheet (PIL image or (H, W[, 3]) array) as a uint8 gray array."""
+    if isinstance(source, Image.Image):
+        return np.asarray(source.crop((0, y1, source.width, y2)).convert("L"))
+    rows = np.asarray(source[y1:y2])
+    if rows.ndim == 2:
+        return rows
+    return np.asarray(Image.fromarray(np.ascontiguousarray(rows)).convert("L"))
+
+
+def ink_integral(source, W: int, H: int, block_w: int, block_h: int, dark_thresh: int) -> np.ndarray:
+    """
+    Integral image of dark-pixel counts over (block_h x block_w) blocks.
+
+    Built from row strips, so only one strip of gray pixels is held at a
+    time. Entry [j, i] is the dark count of blocks [:j, :i].
+    """
+    nbx, nby = math.ceil(W / block_w), math.ceil(H / block_h)
+    counts = np.zeros((nby, nbx), dtype=np.int64)
+    strip_h = max(block_h, DECODE_STRIP_ROWS // block_h * block_h)
+    for y in range(0, H, strip_h):
+        dark = _gray_rows(source, y, min(y + strip_h, H)) < dark_thresh
+        rows = math.ceil(dark.shape[0] / block_h)
+        padded = np.zeros((rows * block_h, nbx * block_w), dtype=np.int32)
+        padded[: dark.shape[0], :W] = dark
+        counts[y // block_h : y // block_h + rows] = padded.reshape(rows, block_h, nbx, block_w).sum(axis=(1, 3))
+
+    integral = np.zeros((nby + 1, nbx + 1), dtype=np.int64)
+    integral[1:, 1:] = counts.cumsum(axis=0).cumsum(axis=1)
+    return integral
+
+
+def tile_ink(integral: np.ndarray, tiles: np.ndarray, block_w: int, block_h: int) -> np.ndarray:
+    """Ink fraction of every tile from the block integral image, O(1) per tile."""
+    bx1, by1 = tiles[:, 0] // block_w, tiles[:, 1] // block_h
+    # Tile ends are block multiples except where clipped to the sheet edge,
+    # and the padded blocks past the edge hold no ink
+    bx2, by2 = -(-tiles[:, 2] // block_w), -(-tiles[:, 3] // block_h)
+    dark = integral[by2, bx2] - integral[by1, bx2] - integral[by2, bx1] + integral[by1, bx1]
+    area = (tiles[:, 2] - tiles[:, 0]) * (tiles[:, 3] - tiles[:, 1])
+    return dark / area
+
+
+def tile_ink_direct(source, W: int, H: int, tiles: np.ndarray, dark_thresh: int) -> np.ndarray:
+    """
+    Ink fraction of every tile without a block integral, for tile/stride
+    settings whose common block is too small.
+
+    Each row strip's dark pixels are summed per distinct tile column range;
+    a running sum over those per-row counts then gives every tile's dark
+    count. Memory is one strip plus H x (distinct column ranges) counts.
+    """
+    spans, span_of = np.unique(tiles[:, [0, 2]], axis=0, return_inverse=True)
+    row_dark = np.zeros((H + 1, len(spans)), dtype=np.int64)
+    for y in range(0, H, DECODE_STRIP_ROWS):
+        dark = _gray_rows(source, y, min(y + DECODE_STRIP_ROWS, H)) < dark_thresh
+        cols = np.zeros((dark.shape[0], W + 1), dtype=np.int64)
+        np.cumsum(dark, axis=1, out=cols[:, 1:])
+        row_dark[y + 1 : y + 1 + dark.shape[0]] = cols[:, spans[:, 1]] - cols[:, spans[:, 0]]
+    np.cumsum(row_dark, axis=0, out=row_dark)
+
+    span_of = span_of.ravel()
+    dark = row_dark[tiles[:, 3], span_of] - row_dark[tiles[:, 1], span_of]
+    area = (tiles[:, 2] - tiles[:, 0]) * (tiles[:, 3] - tiles[:, 1])
+    return dark / area
+
+
+def plan_tiles(labels: np.ndarray, W: int, H: int, tile_w: int, tile_h: int, stride_w: int, stride_h: int, min_frac: float, keep_empty: bool, select: TileSelect = None, source=None, seed: int = 0):
+    """
+    Yield (tile_box, classes, yolo, ink) for every tile that should be emitted.
+
+    With `select`, unlabeled tiles are kept by ink density (read from
+    `source`); keep_empty then keeps all inked ones and leaves blanks to
+    select.blank_keep. ink is None without `select`.
+    """
+    tiles = tile_grid(W, H, tile_w, tile_h, stride_w, stride_h)
+    keep, yolo = remap_labels(labels, tiles, min_frac)
+
+    ink = None
+    if select is not None:
+        block_w = math.gcd(tile_w, stride_w)
+        block_h = math.gcd(tile_h, stride_h)
+        if min(block_w, block_h) >= MIN_INK_BLOCK:
+            integral = ink_integral(source, W, H, block_w, block_h, select.dark_thresh)
+            ink = tile_ink(integral, tiles, block_w, block_h)
+        else:
+            ink = tile_ink_direct(source, W, H, tiles, select.dark_thresh)
+        draws = np.random.default_rng(seed).random(len(tiles))
+
+    for t, tile_box in enumerate(tiles.tolist()):
+        kept = keep[t]
+        if not kept.any():
+            if select is None:
+                if not keep_empty:
                     continue
-                cls = int(parts[0])
-                cx, cy, bw, bh = map(float, parts[1:5])
-                x1, y1, x2, y2 = yolo_to_xyxy(cx, cy, bw, bh, W, H)
-                labels.append((cls, x1, y1, x2, y2))
-
-    tile_count = 0
-    for ty in range(0, H, stride_h):
-        for tx in range(0, W, stride_w):
-            tile_box = (tx, ty, min(tx + tile_w, W), min(ty + tile_h, H))
-            tb_w = tile_box[2] - tile_box[0]
-            tb_h = tile_box[3] - tile_box[1]
-            if tb_w <= 0 or tb_h <= 0:
+            elif ink[t] >= select.min_ink:
+                if not keep_empty and draws[t] >= select.hard_neg_ratio:
+                    continue
+            elif draws[t] >= select.blank_keep:
                 continue
+        yield tile_box, labels[kept, 0], yolo[t, kept], None if ink is None else float(ink[t])
 
-            new_labels = []
-            for cls, x1, y1, x2, y2 in labels:
-                clipped = clip_box_to_tile((x1, y1, x2, y2), tile_box)
-                inter_area = box_area(clipped)
-                orig_area = box_area((x1, y1, x2, y2))
-                if orig_area <= 0 or inter_area <= 0:
-                    continue
-                if inter_area / orig_area < min_frac:
-                    continue
 
-                cx = ((clipped[0] + clipped[2]) / 2 - tile_box[0]) / tb_w
-                cy = ((clipped[1] + clipped[3]) / 2 - tile_box[1]) / tb_h
-                bw = (clipped[2] - clipped[0]) / tb_w
-                bh = (clipped[3] - clipped[1]) / tb_h
-                new_labels.append((cls, cx, cy, bw, bh))
+def image_seed(img_path: Path) -> int:
+    """Stable per-image seed for tile sampling."""
+    return zlib.crc32(img_path.name.encode())
 
-            if not new_labels and not keep_empty:
-                continue
 
-            out_name = f"{img_path.stem}_x{tx}_y{ty}{img_path.suffix}"
-            out_img_path = out_img_dir / out_name
-            out_lbl_path = out_lbl_dir / f"{img_path.stem}_x{tx}_y{ty}.txt"
+def process_image(img_path: Path, lbl, out_img_dir: Path, out_lbl_dir: Path, tile_w: int, tile_h: int, stride_w: int, stride_h: int, min_frac: float, keep_empty: bool, select: TileSelect = None, writer: TileWriter = None, sheet_cache: Path = None):
+    if sheet_cache is not None:
+        sheet = load_sheet(img_path, sheet_cache)
+        source = sheet
+        H, W = sheet.shape[:2]
+
+        def crop(box):
+            x1, y1, x2, y2 = box
+            # Copies only this tile's pages out of the memmap
+            return Image.fromarray(np.ascontiguousarray(sheet[y1:y2, x1:x2]))
+    else:
+        img = Image.open(img_path).convert("RGB")
+        source = img
+        W, H = img.size
+        crop = img.crop
 
-            img.crop(tile_box).save(out_img_path)
-            with open(out_lbl_path, "w") as f:
-                for cls, cx, cy, bw, bh in new_labels:
-                    f.write(f"{cls} {cx:.6f} {cy:.6f} {bw:.6f} {bh:.6f}\n")
+    labels = load_labels(lbl, W, H)
+    plan = plan_tiles(labels, W, H, tile_w, tile_h, stride_w, stride_h, min_frac, keep_empty, select, source, image_seed(img_path))
 
-            tile_count += 1
+    tile_count = 0
+    for tile_box, classes, yolo, _ in plan:
+        tx, ty = tile_box[0], tile_box[1]
+        out_name = f"{img_path.stem}_x{tx}_y{ty}{img_path.suffix}"
+        out_img_path = out_img_dir / out_name
+        out_lbl_path = out_lbl_dir / f"{img_path.stem}_x{tx}_y{ty}.txt"
+        label_text = format_labels(classes, yolo)
+
+        tile = crop(tile_box)
+        if writer is None:
+            save_tile(tile, out_img_path, out_lbl_path, label_text)
+        else:
+            writer.submit(tile, out_img_path, out_lbl_path, label_text)
+
+        tile_count += 1
     return tile_count
 
 
+def tile_chunk(jobs, params, sheet_cache: Path = None, to_shards: bool = False):
+    """
+    Tile a list of (img_path, labels, out_img_dir, out_lbl_dir) jobs in one
+    worker. Returns (tile count, encoded samples for --shards, else []).
+    """
+    writer = TileCollector() if to_shards else TileWriter()
+    try:
+        count = sum(process_image(*job, *params, writer=writer, sheet_cache=sheet_cache) for job in jobs)
+    finally:
+        writer.close()
+    return count, writer.samples if to_shards else []
+
+
+def manifest_records(img_path: Path, lbl, split: str, root: Path, tile_w: int, tile_h: int, stride_w: int, stride_h: int, min_frac: float, keep_empty: bool, select: TileSelect = None, sheet_cache: Path = None) -> List[dict]:
+    """Tile records for one image; pixels are only read for ink-aware selection."""
+    source = None
+    if select is not None and sheet_cache is not None:
+        source = load_sheet(img_path, sheet_cache)
+        H, W = source.shape[:2]
+    else:
+        with Image.open(img_path) as img:
+            W, H = img.size
+            if select is not None:
+                source = img.convert("L")
+
+    labels = load_labels(lbl, W, H)
+    image = img_path.relative_to(root).as_posix()
+    plan = plan_tiles(labels, W, H, tile_w, tile_h, stride_w, stride_h, min_frac, keep_empty, select, source, image_seed(img_path))
+
+    records = []
+    for tile_box, classes, yolo, ink in plan:
+        rec = {
+            "split": split,
+            "image": image,
+            "box": tile_box,
+            "labels": [
+                [int(cls), round(cx, 6), round(cy, 6), round(bw, 6), round(bh, 6)]
+                for cls, (cx, cy, bw, bh) in zip(classes.tolist(), yolo.tolist())
+            ],
+        }
+        if ink is not None:
+            rec["ink"] = round(ink, 6)
+        records.append(rec)
+    return records
+
+
+def manifest_chunk(jobs, params, sheet_cache: Path = None) -> List[dict]:
+    """Build manifest records for a list of (img_path, labels, split, root) jobs."""
+    records = []
+    for job in jobs:
+        records.extend(manifest_records(*job, *params, sheet_cache=sheet_cache))
+    return records
+
+
+def write_manifest(path: Path, header: dict, records: List[dict]):
+    with open(path, "w") as f:
+        f.write(json.dumps(header) + "\n")
+        for rec in records:
+            f.write(json.dumps(rec, separators=(",", ":")) + "\n")
+
+
+class VirtualTiles:
+    """
+    Map-style view over a tile manifest; crops are cut from decoded source
+    images on demand. Decoded sources live in an LRU bounded by
+    `cache_images`, so iterating in manifest order (tiles are grouped by
+    source) decodes each sheet once.
+
+    With `sheet_cache`, sources are memory-mapped decode-once caches (see
+    decode_sheet) instead of in-memory arrays; grayscale sheets are returned
+    as zero-copy 3-channel broadcasts.
+    """
+
+    def __init__(self, manifest_path, split: str = None, cache_images: int = 8, sheet_cache=None):
+        manifest_path = Path(manifest_path)
+        with open(manifest_path, "r") as f:
+            self.header = json.loads(f.readline())
+            self.records = [rec for rec in map(json.loads, f) if split is None or rec["split"] == split]
+        self.root = Path(self.header["root"])
+        self.cache_images = cache_images
+        self.sheet_cache = Path(sheet_cache) if sheet_cache else None
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.records)
+
+    def _source(self, image: str) -> np.ndarray:
+        arr = self._cache.get(image)
+        if arr is not None:
+            self._cache.move_to_end(image)
+            return arr
+        if self.sheet_cache is not None:
+            arr = load_sheet(self.root / image, self.sheet_cache)
+        else:
+            with Image.open(self.root / image) as img:
+                arr = np.asarray(img.convert("RGB"))
+        self._cache[image] = arr
+        while len(self._cache) > self.cache_images:
+            self._cache.popitem(last=False)
+        return arr
+
+    def name(self, idx: int) -> str:
+        rec = self.records[idx]
+        return f"{Path(rec['image']).stem}_x{rec['box'][0]}_y{rec['box'][1]}"
+
+    def __getitem__(self, idx: int):
+        """Return (pixels, labels): an (h, w, 3) uint8 view and a (k, 5) float32 array."""
+        rec = self.records[idx]
+        x1, y1, x2, y2 = rec["box"]
+        pixels = self._source(rec["image"])[y1:y2, x1:x2]
+        if pixels.ndim == 2:
+            pixels = np.broadcast_to(pixels[..., None], pixels.shape + (3,))
+        labels = np.array(rec["labels"], dtype=np.float32).reshape(-1, 5)
+        return pixels, labels
+
+    def image(self, idx: int) -> Image.Image:
+        return Image.fromarray(np.ascontiguousarray(self[idx][0]))
+
+
 def main():
-    global args
     args = parse_args()
     root = Path(args.root)
     out_root = Path(args.out)
@@ -134,12 +584,19 @@ def main():
     tile_w, tile_h = args.tile
     stride_w, stride_h = args.stride if args.stride else args.tile
 
-    ensure_out_dirs(out_root, args.splits)
-
-    total_tiles = 0
+    if args.virtual:
+        out_root.mkdir(parents=True, exist_ok=True)
+    elif not args.shards:
+        ensure_out_dirs(out_root, args.splits, args.clear)
+
+    select = None
+    if args.min_ink is not None:
+        select = TileSelect(args.min_ink, args.dark_thresh, args.hard_neg_ratio, args.blank_keep)
+    params = (tile_w, tile_h, stride_w, stride_h, args.min_frac, args.keep_empty, select)
+    index = load_index(root, save=args.save_index)
+    jobs = []
     for split in args.splits:
         img_dir = root / "images" / split
-        lbl_dir = root / "labels" / split
         out_img_dir = out_root / "images" / split
         out_lbl_dir = out_root / "labels" / split
 
@@ -153,19 +610,94 @@ def main():
         print(f"[{split}] found {len(images)} images")
 
         for img_path in images:
-            lbl_path = lbl_dir / f"{img_path.stem}.txt"
-            total_tiles += process_image(
-                img_path,
-                lbl_path,
-                out_img_dir,
-                out_lbl_dir,
-                tile_w,
-                tile_h,
-                stride_w,
-                stride_h,
-                args.min_frac,
-                args.keep_empty,
-            )
+            # Label rows travel with the job, so workers never reopen label files
+            boxes = index.boxes(split, img_path.stem)
+            if args.virtual:
+                jobs.append((img_path, boxes, split, root))
+            else:
+                jobs.append((img_path, boxes, out_img_dir, out_lbl_dir))
+
+    chunks = [jobs[i : i + CHUNK_SIZE] for i in range(0, len(jobs), CHUNK_SIZE)]
+
+    sheet_cache = Path(args.sheet_cache) if args.sheet_cache else None
+    if sheet_cache is not None:
+        # Decode pass with its own (small) concurrency limit: only here does a
+        # whole sheet sit in memory, tiling workers just read the memmaps.
+        img_paths = [job[0] for job in jobs]
+        print(f"[CACHE] decoding {len(img_paths)} sheets into {sheet_cache}")
+        if args.decode_workers <= 1:
+            for img_path in img_paths:
+                decode_sheet(img_path, sheet_cache)
+        else:
+            with ProcessPoolExecutor(max_workers=args.decode_workers) as pool:
+                list(pool.map(decode_sheet, img_paths, [sheet_cache] * len(img_paths)))
+
+    if args.virtual:
+        # Header reads only (unless --min-ink needs pixels)
+        if args.workers <= 1:
+            per_chunk = [manifest_chunk(chunk, params, sheet_cache) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                per_chunk = list(pool.map(manifest_chunk, chunks, [params] * len(chunks), [sheet_cache] * len(chunks)))
+        records = [rec for chunk_records in per_chunk for rec in chunk_records]
+        header = {
+            "root": str(root.resolve()),
+            "tile": [tile_w, tile_h],
+            "stride": [stride_w, stride_h],
+            "min_frac": args.min_frac,
+            "keep_empty": args.keep_empty,
+            "select": select._asdict() if select else None,
+            "images": len(jobs),
+            "tiles": len(records),
+        }
+        manifest_path = out_root / MANIFEST_NAME
+        write_manifest(manifest_path, header, records)
+        print(f"[DONE] Wrote manifest of {len(records)} tiles to {manifest_path}")
+        return
+
+    # With --shards, workers return encoded tiles and only this process
+    # appends to the archive, so shards are written strictly sequentially
+    shard_writer = ShardWriter(args.shards, int(args.shard_bytes)) if args.shards else None
+    to_shards = shard_writer is not None
+
+    total_tiles = 0
+    try:
+        if args.workers <= 1:
+            results = (tile_chunk(chunk, params, sheet_cache, to_shards) for chunk in chunks)
+            for count, samples in results:
+                total_tiles += count
+                for sample in samples:
+                    shard_writer.write(*sample)
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                # Results are taken in submission order, so shards list tiles
+                # in sheet order whatever the worker timing; the window bounds
+                # how many finished chunks' tiles wait in memory
+                pending = deque()
+                remaining = iter(chunks)
+                done = 0
+                while True:
+                    while len(pending) < 2 * args.workers:
+                        chunk = next(remaining, None)
+                        if chunk is None:
+                            break
+                        pending.append((len(chunk), pool.submit(tile_chunk, chunk, params, sheet_cache, to_shards)))
+                    if not pending:
+                        break
+                    size, future = pending.popleft()
+                    count, samples = future.result()
+                    total_tiles += count
+                    for sample in samples:
+                        shard_writer.write(*sample)
+                    done += size
+                    print(f"[{done}/{len(jobs)}] images tiled")
+    finally:
+        if shard_writer is not None:
+            shard_writer.close()
+
+    if to_shards:
+        print(f"[DONE] Wrote {total_tiles} tiles to shards in {args.shards}")
+        return
 
     # Remove stale label caches if present
     for cache in out_root.glob("labels/*.cache"):
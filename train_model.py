@@ -1,62 +1,146 @@
+import argparse
 import os
+import socket
+import time
+
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.nn as nn
 import torch.optim as optim
-from torchvision import datasets, transforms, models
-from torch.utils.data import DataLoader
+from torchvision import datasets, transforms
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler
+
+from classifier import add_model_args, autocast, build_model, make_scaler, pick_device, prepare_batch, resolve_precision, unwrap
+from image_cache import CACHE_DIR, IMG_SIZE, CachedImageFolder, build_cache
 
 DATASET_DIR = "dataset/splits"
 BATCH = 16
 EPOCHS = 10
 LR = 1e-4
+LOADER_WORKERS = min(8, os.cpu_count() or 1)
+PREFETCH = 4  # batches queued per loader worker
+MODEL_OUT = "symbol_classifier.pth"
+CHECKPOINT_DIR = "checkpoints"
+PATIENCE = 3  # epochs without a val_acc gain before stopping (0 = never)
+BENCH_STEPS = 30  # timed steps per process count in --scaling-report
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Fine-tune ResNet-18 on the symbol splits.")
+    ap.add_argument("--epochs", type=int, default=EPOCHS, help="Training epochs")
+    ap.add_argument("--workers", type=int, default=LOADER_WORKERS, help="DataLoader worker processes, split across --procs (0 = in-process)")
+    ap.add_argument("--cache-dir", default=CACHE_DIR, help="Preprocessed uint8 image cache (see image_cache.py)")
+    ap.add_argument("--no-cache", action="store_true", help="Decode and resize the PNGs every epoch instead")
+    ap.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="Where last.pt (full training state) is written")
+    ap.add_argument("--save-every", type=int, default=1, help="Write last.pt every N epochs")
+    ap.add_argument(
+        "--resume",
+        nargs="?",
+        const="last",
+        default=None,
+        help="Continue from a checkpoint (default <checkpoint-dir>/last.pt)",
+    )
+    ap.add_argument("--patience", type=int, default=PATIENCE, help="Stop after this many epochs without val_acc gain (0 = off)")
+    ap.add_argument("--min-delta", type=float, default=0.0, help="Minimum val_acc gain (points) that counts as improvement")
+    ap.add_argument("--procs", type=int, default=1, help="Data-parallel CPU processes (torch.distributed, gloo)")
+    ap.add_argument(
+        "--lr-scale",
+        choices=["linear", "sqrt", "none"],
+        default="linear",
+        help="Scale LR with the effective batch BATCH x --procs",
+    )
+    ap.add_argument("--seed", type=int, default=0, help="Shuffling seed of the distributed sampler")
+    ap.add_argument(
+        "--scaling-report",
+        type=int,
+        nargs="*",
+        default=None,
+        help="Only time training steps with these process counts (default 1 2 4 8) and exit",
+    )
+    add_model_args(ap)
+    return ap.parse_args()
+
+
+def save_atomic(obj, path):
+    """torch.save via a temp file, so a crash mid-write never leaves a truncated checkpoint."""
+    tmp = f"{path}.tmp"
+    torch.save(obj, tmp)
+    os.replace(tmp, path)
+
+
+def save_checkpoint(path, epoch, model, optimizer, scaler, state, classes):
+    """Everything needed to continue training after `epoch` (1-based, completed)."""
+    save_atomic(
+        {
+            "epoch": epoch,
+            "model": unwrap(model).state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "scaler": scaler.state_dict(),
+            "rng": torch.get_rng_state(),
+            "cuda_rng": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+            "classes": classes,
+            **state,
+        },
+        path,
+    )
+
+
+def load_split(split, args, build=True):
+    """Dataset yielding uint8 (3, 224, 224) tensors; normalization happens per batch in prepare_batch."""
+    split_dir = os.path.join(DATASET_DIR, split)
+    if args.no_cache:
+        resize = transforms.Compose([transforms.Resize((IMG_SIZE, IMG_SIZE)), transforms.PILToTensor()])
+        return datasets.ImageFolder(split_dir, resize)
+    if build:
+        build_cache(split_dir, args.cache_dir, split, IMG_SIZE, workers=max(args.workers, 1))
+    return CachedImageFolder(args.cache_dir, split)
+
+
+def make_loader(ds, workers, device, shuffle=False, sampler=None):
+    extra = {"persistent_workers": True, "prefetch_factor": PREFETCH} if workers > 0 else {}
+    return DataLoader(
+        ds,
+        batch_size=BATCH,
+        shuffle=shuffle,
+        sampler=sampler,
+        num_workers=workers,
+        pin_memory=device == "cuda",
+        **extra,
+    )
+
+
+def scaled_lr(mode, world_size):
+    """LR for an effective batch of BATCH * world_size."""
+    return LR * {"linear": world_size, "sqrt": world_size**0.5, "none": 1}[mode]
+
+
+def launch(fn, world_size, *fn_args):
+    """Run fn(rank, world_size, *fn_args) in `world_size` local processes."""
+    with socket.socket() as sock:  # a free rendezvous port
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    mp.spawn(fn, args=(world_size, *fn_args), nprocs=world_size, join=True)
+
+
+def init_distributed(rank, world_size):
+    """Join the gloo group and give each rank an equal share of the cores."""
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
 
-IMAGENET_MEAN = [0.485, 0.456, 0.406]
-IMAGENET_STD = [0.229, 0.224, 0.225]
-
-device = (
-    "mps"
-    if torch.backends.mps.is_available()
-    else "cuda"
-    if torch.cuda.is_available()
-    else "cpu"
-)
-print("Using device:", device)
-
-transform = transforms.Compose(
-    [
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD),
-    ]
-)
-
-# Load datasets
-train_ds = datasets.ImageFolder(os.path.join(DATASET_DIR, "train"), transform)
-val_ds = datasets.ImageFolder(os.path.join(DATASET_DIR, "val"), transform)
-test_ds = datasets.ImageFolder(os.path.join(DATASET_DIR, "test"), transform)
-
-train_loader = DataLoader(train_ds, batch_size=BATCH, shuffle=True)
-val_loader = DataLoader(val_ds, batch_size=BATCH)
-test_loader = DataLoader(test_ds, batch_size=BATCH)
-
-# Load pretrained model
-model = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1)
-model.fc = nn.Linear(model.fc.in_features, len(train_ds.classes))
-model = model.to(device)
-
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=LR)
-
-
-def run_eval(loader, split_name):
+
+def run_eval(model, criterion, loader, split_name, args):
     model.eval()
     loss_sum = 0.0
     correct = 0
     total = 0
 
-    with torch.no_grad():
+    with torch.no_grad(), autocast(args.device, args.precision):
         for imgs, labels in loader:
-            imgs, labels = imgs.to(device), labels.to(device)
+            imgs, labels = prepare_batch(imgs, args.device, args.channels_last), labels.to(args.device)
             outputs = model(imgs)
             loss = criterion(outputs, labels)
             loss_sum += loss.item() * imgs.size(0)
@@ -70,37 +154,217 @@ def run_eval(loader, split_name):
     return avg_loss, acc
 
 
-# Training Loop
-for epoch in range(EPOCHS):
+def train(rank, world_size, args):
+    """
+    One training process. With world_size > 1 every rank trains on its
+    DistributedSampler shard and DDP all-reduces gradients; rank 0 alone
+    validates, checkpoints and decides on early stopping.
+    """
+    distributed = world_size > 1
+    if distributed:
+        init_distributed(rank, world_size)
+    is_main = rank == 0
+    device = args.device
+    workers = args.workers // world_size if distributed else args.workers
+
+    # Load datasets (the parent process already built the caches)
+    train_ds = load_split("train", args, build=False)
+    sampler = DistributedSampler(train_ds, world_size, rank, shuffle=True, seed=args.seed) if distributed else None
+    train_loader = make_loader(train_ds, workers, device, shuffle=sampler is None, sampler=sampler)
+    if is_main:
+        val_loader = make_loader(load_split("val", args, build=False), workers, device)
+        test_loader = make_loader(load_split("test", args, build=False), workers, device)
+
+    # Load pretrained model
+    model = build_model(
+        len(train_ds.classes), device, pretrained=True, channels_last=args.channels_last, compile=args.compile
+    )
+
+    lr = scaled_lr(args.lr_scale, world_size)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    scaler = make_scaler(args.precision)
+
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    last_path = os.path.join(args.checkpoint_dir, "last.pt")
+    # Early-stopping state, saved with every checkpoint
+    state = {"best_acc": -1.0, "best_epoch": 0, "bad_epochs": 0}
+    start_epoch = 0
+    if args.resume:
+        ckpt_path = last_path if args.resume == "last" else args.resume
+        # Loaded on CPU: the RNG states must stay CPU ByteTensors, and
+        # load_state_dict moves weights and optimizer state to the model's device
+        ckpt = torch.load(ckpt_path, map_location="cpu")
+        if ckpt["classes"] != train_ds.classes:
+            raise SystemExit(f"Checkpoint classes do not match {DATASET_DIR}/train: {ckpt_path}")
+        unwrap(model).load_state_dict(ckpt["model"])
+        optimizer.load_state_dict(ckpt["optimizer"])
+        scaler.load_state_dict(ckpt["scaler"])
+        torch.set_rng_state(ckpt["rng"])
+        if ckpt.get("cuda_rng") is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(ckpt["cuda_rng"])
+        state = {k: ckpt[k] for k in state}
+        start_epoch = ckpt["epoch"]
+        if is_main:
+            print(f"Resumed from {ckpt_path} after epoch {start_epoch} (best val_acc={state['best_acc']:.2f}% @ {state['best_epoch']})")
+
+    if distributed:
+        model = DistributedDataParallel(model)
+        if is_main:
+            print(f"{world_size} processes x batch {BATCH} (effective {BATCH * world_size}), lr={lr:g}")
+    # Rank 0 evaluates alone, so it must not go through DDP's collective forward
+    eval_model = model.module if distributed else model
+
+    # Training Loop
+    for epoch in range(start_epoch, args.epochs):
+        if args.patience and state["bad_epochs"] >= args.patience:
+            break
+        if sampler is not None:
+            sampler.set_epoch(epoch)
+        start = time.perf_counter()
+        model.train()
+        stats = torch.zeros(2, dtype=torch.float64)  # loss sum, samples
+
+        for imgs, labels in train_loader:
+            imgs, labels = prepare_batch(imgs, device, args.channels_last), labels.to(device, non_blocking=True)
+
+            optimizer.zero_grad()
+            with autocast(device, args.precision):
+                outputs = model(imgs)
+                loss = criterion(outputs, labels)
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
+
+            stats += torch.tensor([loss.item() * imgs.size(0), imgs.size(0)], dtype=torch.float64)
+
+        if distributed:
+            dist.all_reduce(stats)
+        train_loss = (stats[0] / stats[1].clamp(min=1)).item()
+        train_time = time.perf_counter() - start
+
+        stop = torch.zeros(1, dtype=torch.int32)
+        if is_main:
+            val_loss, val_acc = run_eval(eval_model, criterion, val_loader, "val", args)
+
+            print(
+                f"[Epoch {epoch+1}/{args.epochs}] "
+                f"train_loss={train_loss:.4f} "
+                f"val_loss={val_loss:.4f} "
+                f"val_acc={val_acc:.2f}% "
+                f"time={train_time:.1f}s ({stats[1].item() / train_time:.1f} img/s)"
+            )
+
+            if val_acc > state["best_acc"] + args.min_delta:
+                state.update(best_acc=val_acc, best_epoch=epoch + 1, bad_epochs=0)
+                save_atomic(unwrap(model).state_dict(), MODEL_OUT)
+                print(f"  new best val_acc → {MODEL_OUT}")
+            else:
+                state["bad_epochs"] += 1
+
+            stop[0] = bool(args.patience and state["bad_epochs"] >= args.patience)
+            if (epoch + 1) % args.save_every == 0 or stop.item() or epoch + 1 == args.epochs:
+                save_checkpoint(last_path, epoch + 1, model, optimizer, scaler, state, train_ds.classes)
+            if stop.item():
+                print(f"Early stopping: no val_acc gain for {args.patience} epochs")
+        if distributed:
+            dist.broadcast(stop, 0)
+        if stop.item():
+            break
+
+    if is_main:
+        print(f"Training complete! Best val_acc={state['best_acc']:.2f}% at epoch {state['best_epoch']}")
+
+        # Final test evaluation, on the best-on-val weights
+        if os.path.exists(MODEL_OUT):
+            unwrap(model).load_state_dict(torch.load(MODEL_OUT, map_location=device))
+        test_loss, test_acc = run_eval(eval_model, criterion, test_loader, "test", args)
+        print(f"[Test] loss={test_loss:.4f} acc={test_acc:.2f}%")
+        print(f"Saved model → {MODEL_OUT}")
+    if distributed:
+        dist.destroy_process_group()
+
+
+def bench(rank, world_size, args, results):
+    """Time BENCH_STEPS data-parallel training steps; rank 0 reports global images/s."""
+    init_distributed(rank, world_size)
+    train_ds = load_split("train", args, build=False)
+    sampler = DistributedSampler(train_ds, world_size, rank, shuffle=True, seed=args.seed)
+    loader = make_loader(train_ds, args.workers // world_size, args.device, sampler=sampler)
+    model = DistributedDataParallel(
+        build_model(len(train_ds.classes), args.device, channels_last=args.channels_last, compile=args.compile)
+    )
+    optimizer = optim.Adam(model.parameters(), lr=scaled_lr(args.lr_scale, world_size))
+    criterion = nn.CrossEntropyLoss()
     model.train()
-    running_loss = 0.0
 
-    for imgs, labels in train_loader:
-        imgs, labels = imgs.to(device), labels.to(device)
+    def batches():
+        epoch = 0
+        while True:
+            sampler.set_epoch(epoch)
+            yield from loader
+            epoch += 1
 
+    steps = 0
+    for imgs, labels in batches():
+        if steps == 2:  # warm-up done on every rank
+            dist.barrier()
+            start = time.perf_counter()
+        imgs, labels = prepare_batch(imgs, args.device, args.channels_last), labels.to(args.device)
         optimizer.zero_grad()
-        outputs = model(imgs)
-        loss = criterion(outputs, labels)
+        with autocast(args.device, args.precision):
+            loss = criterion(model(imgs), labels)
         loss.backward()
         optimizer.step()
+        steps += 1
+        if steps == BENCH_STEPS + 2:
+            break
+    dist.barrier()
+    if rank == 0:
+        results.put(BENCH_STEPS * BATCH * world_size / (time.perf_counter() - start))
+    dist.destroy_process_group()
 
-        running_loss += loss.item() * imgs.size(0)
 
-    train_loss = running_loss / len(train_ds)
-    val_loss, val_acc = run_eval(val_loader, "val")
+def scaling_report(args, counts):
+    """Global training images/s for each process count, with speedup and efficiency vs the first count."""
+    results = mp.get_context("spawn").SimpleQueue()
+    cores = os.cpu_count() or 1
+    print(f"Scaling report: batch {BATCH}/process, {BENCH_STEPS} timed steps, {cores} cores")
+    print(f"{'procs':>5s}{'threads':>9s}{'eff. batch':>12s}{'lr':>10s}{'img/s':>10s}{'speedup':>9s}{'eff.':>7s}")
+    first = None
+    for n in counts:
+        launch(bench, n, args, results)
+        rate = results.get()
+        first = first or (n, rate)
+        speedup = rate / first[1]
+        efficiency = speedup / (n / first[0])
+        print(
+            f"{n:5d}{max(1, cores // n):9d}{BATCH * n:12d}{scaled_lr(args.lr_scale, n):10.1e}"
+            f"{rate:10.1f}{speedup:8.2f}x{efficiency * 100:6.0f}%"
+        )
 
+
+def main():
+    args = parse_args()
+    # Data-parallel runs are CPU-only (gloo)
+    args.device = "cpu" if args.procs > 1 or args.scaling_report is not None else pick_device()
+    args.precision = resolve_precision(args.precision, args.device)
     print(
-        f"[Epoch {epoch+1}/{EPOCHS}] "
-        f"train_loss={train_loss:.4f} "
-        f"val_loss={val_loss:.4f} "
-        f"val_acc={val_acc:.2f}%"
+        "Using device:", args.device,
+        f"({args.precision}{', channels_last' if args.channels_last else ''}{', compiled' if args.compile else ''})",
     )
 
-print("Training complete!")
+    # Build/refresh the image caches once, before any training process starts
+    for split in ("train", "val", "test"):
+        load_split(split, args)
+
+    if args.scaling_report is not None:
+        scaling_report(args, args.scaling_report or [1, 2, 4, 8])
+    elif args.procs > 1:
+        launch(train, args.procs, args)
+    else:
+        train(0, 1, args)
 
-# Final test evaluation
-test_loss, test_acc = run_eval(test_loader, "test")
-print(f"[Test] loss={test_loss:.4f} acc={test_acc:.2f}%")
 
-torch.save(model.state_dict(), "symbol_classifier.pth")
-print("Saved model → symbol_classifier.pth")
+if __name__ == "__main__":
+    main()
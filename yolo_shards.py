@@ -0,0 +1,240 @@
+"""
+Sharded tar archives for YOLO datasets.
+
+Tens of thousands of tiny image/label files make listing, copying and
+zipping a dataset slow. A shard directory instead holds a few large,
+sequentially written tar files plus an index:
+
+    <dir>/shard-000000.tar      ~--max-bytes each (default 1 GB)
+    <dir>/shard-000001.tar
+    <dir>/index.json            key -> shard and byte offsets
+    <dir>/data.yaml             copied/written alongside when known
+
+Each sample is a key "<split>/<stem>" stored as two consecutive tar members,
+"<split>/<stem>.png" (original encoded bytes, any image suffix) and
+"<split>/<stem>.txt" (YOLO label lines). ShardReader streams samples in
+order, or seeks straight to one by key through the index.
+
+Usage (convert between the folder layout and shards):
+    python yolo_shards.py pack yolo_sld yolo_sld_shards --max-bytes 1e9
+    python yolo_shards.py unpack yolo_sld_shards yolo_sld_restored
+    python yolo_shards.py info yolo_sld_shards
+
+generator.py, tile_yolo_images.py, filter_yolo_classes.py and
+split_yolo_dataset.py write shards directly with --shards DIR.
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import tarfile
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+SHARD_BYTES = 1_000_000_000
+INDEX_NAME = "index.json"
+SHARD_PATTERN = "shard-{:06d}.tar"
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+SPLITS = ["train", "val", "test"]
+
+
+class Sample(NamedTuple):
+    key: str        # "<split>/<stem>"
+    ext: str        # image suffix, e.g. ".png"
+    image: bytes    # encoded image bytes
+    labels: str     # YOLO label text
+
+    @property
+    def split(self) -> str:
+        return self.key.split("/", 1)[0]
+
+
+def _tar_member(name: str, data: bytes) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = 0o644
+    return info
+
+
+class ShardWriter:
+    """
+    Append samples to a sequence of tar shards, starting a new shard once
+    the current one would exceed max_bytes. close() writes the index.
+    """
+
+    def __init__(self, out_dir, max_bytes: int = SHARD_BYTES):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.shards = []
+        self.samples = {}
+        self._tar = None
+        self._fileobj = None
+
+    def _open_next(self):
+        self._close_current()
+        name = SHARD_PATTERN.format(len(self.shards))
+        self.shards.append(name)
+        self._fileobj = open(self.out_dir / name, "wb")
+        self._tar = tarfile.open(fileobj=self._fileobj, mode="w", format=tarfile.GNU_FORMAT)
+
+    def _close_current(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._fileobj.close()
+            self._tar = self._fileobj = None
+
+    def write(self, key: str, image: bytes, ext: str, labels: str):
+        if key in self.samples:
+            raise ValueError(f"Duplicate shard key: {key}")
+        label_bytes = labels.encode()
+        # Each member costs a 512-byte header plus padding to 512 bytes
+        size = len(image) + len(label_bytes) + 4 * 512
+        if self._tar is None or (self._fileobj.tell() > 0 and self._fileobj.tell() + size > self.max_bytes):
+            self._open_next()
+
+        offsets = []
+        for name, data in ((f"{key}{ext}", image), (f"{key}.txt", label_bytes)):
+            info = _tar_member(name, data)
+            self._tar.addfile(info, io.BytesIO(data))
+            # Data ends the member, rounded up to the 512-byte block
+            end = self._fileobj.tell()
+            offsets.append(end - -(-len(data) // 512) * 512)
+        self.samples[key] = [len(self.shards) - 1, ext, offsets[0], len(image), offsets[1], len(label_bytes)]
+
+    def close(self):
+        self._close_current()
+        index = {"version": 1, "shards": self.shards, "samples": self.samples}
+        tmp = self.out_dir / (INDEX_NAME + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.out_dir / INDEX_NAME)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardReader:
+    """Sequential or by-key access to a shard directory written by ShardWriter."""
+
+    def __init__(self, shard_dir):
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / INDEX_NAME, "r") as f:
+            index = json.load(f)
+        self.shards = index["shards"]
+        self.samples = index["samples"]
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __contains__(self, key: str):
+        return key in self.samples
+
+    def keys(self):
+        return self.samples.keys()
+
+    def get(self, key: str) -> Sample:
+        shard, ext, img_off, img_size, lbl_off, lbl_size = self.samples[key]
+        with open(self.shard_dir / self.shards[shard], "rb") as f:
+            f.seek(img_off)
+            image = f.read(img_size)
+            f.seek(lbl_off)
+            labels = f.read(lbl_size).decode()
+        return Sample(key, ext, image, labels)
+
+    def __getitem__(self, key: str) -> Sample:
+        return self.get(key)
+
+    def __iter__(self) -> Iterator[Sample]:
+        """Stream every sample in write order, reading each shard front to back."""
+        for name in self.shards:
+            with tarfile.open(self.shard_dir / name, mode="r|") as tar:
+                pending = {}
+                for member in tar:
+                    key, ext = os.path.splitext(member.name)
+                    data = tar.extractfile(member).read()
+                    if ext == ".txt":
+                        image_ext, image = pending.pop(key)
+                        yield Sample(key, image_ext, image, data.decode())
+                    else:
+                        pending[key] = (ext, data)
+
+
+def iter_folder(root: Path, splits=SPLITS) -> Iterator[Sample]:
+    """Samples of a YOLO folder dataset (root/images/<split>, root/labels/<split>)."""
+    for split in splits:
+        img_dir = root / "images" / split
+        if not img_dir.exists():
+            continue
+        for img_path in sorted(p for p in img_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES):
+            lbl_path = root / "labels" / split / f"{img_path.stem}.txt"
+            labels = lbl_path.read_text() if lbl_path.exists() else ""
+            yield Sample(f"{split}/{img_path.stem}", img_path.suffix, img_path.read_bytes(), labels)
+
+
+def pack(root: Path, out_dir: Path, max_bytes: int = SHARD_BYTES) -> int:
+    with ShardWriter(out_dir, max_bytes) as writer:
+        for sample in iter_folder(root):
+            writer.write(sample.key, sample.image, sample.ext, sample.labels)
+        count = len(writer.samples)
+    if (root / "data.yaml").exists():
+        shutil.copy2(root / "data.yaml", out_dir / "data.yaml")
+    return count
+
+
+def unpack(shard_dir: Path, root: Path) -> int:
+    count = 0
+    made = set()
+    for sample in ShardReader(shard_dir):
+        split, stem = sample.key.split("/", 1)
+        if split not in made:
+            (root / "images" / split).mkdir(parents=True, exist_ok=True)
+            (root / "labels" / split).mkdir(parents=True, exist_ok=True)
+            made.add(split)
+        (root / "images" / split / f"{stem}{sample.ext}").write_bytes(sample.image)
+        (root / "labels" / split / f"{stem}.txt").write_text(sample.labels)
+        count += 1
+    if (shard_dir / "data.yaml").exists():
+        shutil.copy2(shard_dir / "data.yaml", root / "data.yaml")
+    return count
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert YOLO datasets to and from tar shards.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pack", help="Folder dataset -> shards")
+    p.add_argument("root", help="Dataset root containing images/ and labels/")
+    p.add_argument("out", help="Output shard directory")
+    p.add_argument("--max-bytes", type=float, default=SHARD_BYTES, help="Target shard size in bytes")
+    u = sub.add_parser("unpack", help="Shards -> folder dataset")
+    u.add_argument("shards", help="Shard directory")
+    u.add_argument("root", help="Output dataset root")
+    i = sub.add_parser("info", help="Summarize a shard directory")
+    i.add_argument("shards", help="Shard directory")
+    args = ap.parse_args()
+
+    if args.cmd == "pack":
+        count = pack(Path(args.root), Path(args.out), int(args.max_bytes))
+        print(f"[DONE] Packed {count} samples → {args.out}")
+    elif args.cmd == "unpack":
+        count = unpack(Path(args.shards), Path(args.root))
+        print(f"[DONE] Unpacked {count} samples → {args.root}")
+    else:
+        reader = ShardReader(args.shards)
+        per_split = {}
+        for key in reader.keys():
+            split = key.split("/", 1)[0]
+            per_split[split] = per_split.get(split, 0) + 1
+        size = sum((Path(args.shards) / name).stat().st_size for name in reader.shards)
+        print(f"{len(reader)} samples in {len(reader.shards)} shards ({size / 1e9:.2f} GB)")
+        for split, count in sorted(per_split.items()):
+            print(f"  {split:6s} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Zero-copy dataset views: derived YOLO datasets whose images are links back
+to a source dataset, plus a manifest recording where they came from.
+
+filter_yolo_classes.py and split_yolo_dataset.py use this with --link:
+    copy      full copy (shutil.copy2), the old behaviour
+    hardlink  os.link; same filesystem only, no extra disk
+    symlink   absolute symlink; works across filesystems, breaks if the source moves
+    reflink   copy-on-write clone (FICLONE: btrfs, XFS, ...); independent file, shared blocks
+    auto      first of reflink, hardlink, symlink, copy that works here
+
+Only label files are written for real. The view's manifest (view.json)
+names the source root, the tool and parameters that produced it, and
+every image's source path, so a view can be audited or rebuilt.
+
+Usage (check what a view points at):
+    python yolo_views.py yolo_sld_2
+    python yolo_views.py yolo_sld_2 --materialize   # replace links with real copies
+"""
+
+import argparse
+import errno
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+MANIFEST_NAME = "view.json"
+LINK_MODES = ["copy", "hardlink", "symlink", "reflink", "auto"]
+AUTO_ORDER = ["reflink", "hardlink", "symlink", "copy"]
+FICLONE = 0x40049409  # linux/fs.h _IOW(0x94, 9, int)
+# Errors that mean "this mode is not available for this file/filesystem"
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL}
+
+
+def _reflink(src: Path, dst: Path):
+    import fcntl  # POSIX only; reflinks are a Linux ioctl anyway
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            dst.unlink()
+            raise
+    shutil.copystat(src, dst)
+
+
+def _place(src: Path, dst: Path, mode: str):
+    if mode == "copy":
+        shutil.copy2(src, dst)
+    elif mode == "hardlink":
+        os.link(src, dst)
+    elif mode == "symlink":
+        os.symlink(src.resolve(), dst)
+    elif mode == "reflink":
+        _reflink(src, dst)
+    else:
+        raise ValueError(f"Unknown link mode: {mode}")
+
+
+class Linker:
+    """
+    Places source images into a view with one link mode, remembering what
+    it did for the manifest. In auto mode a file falls back to the next
+    mode only when the failure means "not supported here" (FALLBACK_ERRNOS,
+    e.g. reflink on ext4, hardlink across devices); any other error, such
+    as a missing source or a full disk, is raised. A mode that has never
+    worked is not retried for later files; one that has keeps being tried
+    first. place() may be called from several threads.
+    """
+
+    def __init__(self, mode: str = "copy"):
+        if mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode: {mode}")
+        self.mode = mode
+        self.candidates = list(AUTO_ORDER) if mode == "auto" else [mode]
+        self.entries = []
+        self._worked = set()
+        self._lock = threading.Lock()
+
+    def place(self, src: Path, dst: Path) -> str:
+        # Checked up front: a symlink to a missing file would "succeed"
+        if not src.is_file():
+            raise FileNotFoundError(errno.ENOENT, "Source image not found", str(src))
+        if dst.exists() or dst.is_symlink():
+            dst.unlink()
+        candidates = list(self.candidates)
+        for i, mode in enumerate(candidates):
+            try:
+                _place(src, dst, mode)
+                break
+            except OSError as exc:
+                if exc.errno not in FALLBACK_ERRNOS or i == len(candidates) - 1:
+                    raise
+                with self._lock:
+                    if mode not in self._worked and mode in self.candidates and len(self.candidates) > 1:
+                        self.candidates.remove(mode)
+        with self._lock:
+            self._worked.add(mode)
+            self.entries.append((dst, src, mode))
+        return mode
+
+    def counts(self):
+        out = {}
+        for _, _, mode in self.entries:
+            out[mode] = out.get(mode, 0) + 1
+        return out
+
+
+def write_manifest(view_root: Path, source_root: Path, tool: str, params: dict, linker: Linker):
+    """Write <view_root>/view.json describing the view and each image's source."""
+    source_root = Path(os.path.abspath(source_root))
+    images = [
+        {
+            "path": Path(os.path.relpath(dst, view_root)).as_posix(),
+            "source": Path(os.path.relpath(os.path.abspath(src), source_root)).as_posix(),
+            "mode": mode,
+        }
+        for dst, src, mode in sorted(linker.entries)
+    ]
+
+    manifest = {
+        "version": 1,
+        "source": str(source_root),
+        "tool": tool,
+        "params": params,
+        "link": linker.mode,
+        "counts": linker.counts(),
+        "images": images,
+    }
+    tmp = view_root / (MANIFEST_NAME + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, view_root / MANIFEST_NAME)
+
+
+def materialize(view_root: Path) -> int:
+    """Replace symlinked/hardlinked/reflinked images of a view with independent copies."""
+    with open(view_root / MANIFEST_NAME, "r") as f:
+        manifest = json.load(f)
+    source = Path(manifest["source"])
+    count = 0
+    for entry in manifest["images"]:
+        if entry["mode"] == "copy":
+            continue
+        dst = view_root / entry["path"]
+        tmp = dst.with_name(dst.name + ".tmp")
+        shutil.copy2(source / entry["source"], tmp)
+        os.replace(tmp, dst)
+        entry["mode"] = "copy"
+        count += 1
+    manifest["counts"] = {"copy": len(manifest["images"])}
+    with open(view_root / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=1)
+    return count
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or materialize a zero-copy YOLO dataset view.")
+    ap.add_argument("view", help="View root containing view.json")
+    ap.add_argument("--materialize", action="store_true", help="Replace links with real copies")
+    args = ap.parse_args()
+
+    view_root = Path(args.view)
+    if args.materialize:
+        count = materialize(view_root)
+        print(f"[DONE] Materialized {count} images in {view_root}")
+        return
+
+    with open(view_root / MANIFEST_NAME, "r") as f:
+        manifest = json.load(f)
+    missing = [e["source"] for e in manifest["images"] if not (Path(manifest["source"]) / e["source"]).exists()]
+    print(f"View of {manifest['source']} by {manifest['tool']} ({manifest['link']})")
+    print(f"Images: {len(manifest['images'])} {manifest['counts']}")
+    if missing:
+        print(f"[WARN] {len(missing)} source images are missing, e.g. {missing[0]}")
+
+
+if __name__ == "__main__":
+    main()